@@ -0,0 +1,174 @@
+import hashlib
+import os
+import random
+from array import array
+
+from scoring import normalize_score, positive_probabilities
+
+# --- PER-TICKER AGGREGATION ---
+# run_analysis.py used to keep every comment string in a list per ticker it mentioned,
+# so a comment naming five tickers was held five times and a $GME pile-on put tens of
+# thousands of comments into one ticker_mention_comments row. Instead:
+#   - each distinct comment gets one index in an interned table, keyed by a 16-byte
+#     digest so its text can be dropped once it has been scored;
+#   - tickers keep an array of those indices (4 bytes a mention) and a running sum of
+#     positive probabilities instead of a list of scores;
+#   - only a fixed-size reservoir sample of each ticker's comments keeps its text, and
+#     that sample is what gets saved for display.
+# Comments are scored every batch_size distinct texts, so pending text is bounded too.
+
+# Comments kept (and saved) per ticker for display
+COMMENT_SAMPLE_SIZE = int(os.environ.get('COMMENT_SAMPLE_SIZE', 20))
+# Distinct comments held as text before they are scored in one predict_proba call
+SCORE_BATCH_SIZE = int(os.environ.get('SCORE_BATCH_SIZE', 5000))
+
+
+def comment_digest(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+class ReservoirSample:
+    """A uniform random sample of at most size items from a stream (Algorithm R)."""
+
+    __slots__ = ('size', 'items', 'seen', 'rng')
+
+    def __init__(self, size, rng=random):
+        self.size = size
+        self.items = []
+        self.seen = 0
+        self.rng = rng
+
+    def add(self, item):
+        """Offers item to the sample; returns the item left out of it.
+
+        That's None while the sample is filling, the item it replaced, or item itself.
+        """
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+            return None
+        slot = self.rng.randrange(self.seen)
+        if slot >= self.size:
+            return item
+        replaced, self.items[slot] = self.items[slot], item
+        return replaced
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class TickerStats:
+    __slots__ = ('comment_ids', 'probability_sum', 'sample')
+
+    def __init__(self, sample_size, rng):
+        self.comment_ids = array('I')
+        self.probability_sum = 0.0
+        self.sample = ReservoirSample(sample_size, rng)
+
+    @property
+    def mention_count(self):
+        return len(self.comment_ids)
+
+
+class MentionAggregator:
+    """Mention counts, mean sentiment and a comment sample per ticker, in bounded memory.
+
+    add() each comment with the tickers it mentions, then rows() for write_snapshot.
+    Comments repeated across tickers or posts are scored once; every mention still
+    counts towards its ticker's mean, as before.
+    """
+
+    def __init__(self, scorer, sample_size=COMMENT_SAMPLE_SIZE, batch_size=SCORE_BATCH_SIZE, seed=None):
+        self.scorer = scorer
+        self.sample_size = sample_size
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+        self.comment_index = {}  # digest -> comment index
+        self.probabilities = array('d')  # by comment index, for every scored comment
+        # Text by comment index, only while it awaits scoring or sits in some sample
+        self.texts = {}
+        self.sample_refs = {}
+        # (comment index, tickers) mentions whose comment isn't scored yet
+        self.pending = []
+        self.tickers = {}
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def intern(self, text):
+        """Returns text's index in the comment table, adding it if it's new."""
+        digest = comment_digest(text)
+        index = self.comment_index.get(digest)
+        if index is None:
+            index = self.comment_index[digest] = len(self.comment_index)
+            self.texts[index] = text
+        return index
+
+    def add(self, text, tickers):
+        """Records one comment mentioning each of tickers."""
+        if not tickers:
+            return
+        index = self.intern(text)
+        for ticker in tickers:
+            stats = self.tickers.get(ticker)
+            if stats is None:
+                stats = self.tickers[ticker] = TickerStats(self.sample_size, self.rng)
+            stats.comment_ids.append(index)
+            left_out = stats.sample.add(index)
+            if left_out != index:
+                self._retain(index, text)
+                if left_out is not None:
+                    self._release(left_out)
+        if index < len(self.probabilities):
+            probability = self.probabilities[index]
+            for ticker in tickers:
+                self.tickers[ticker].probability_sum += probability
+        else:
+            self.pending.append((index, tickers))
+            if len(self.comment_index) - len(self.probabilities) >= self.batch_size:
+                self.score_pending()
+
+    def _retain(self, index, text):
+        self.sample_refs[index] = self.sample_refs.get(index, 0) + 1
+        self.texts[index] = text
+
+    def _release(self, index):
+        refs = self.sample_refs[index] - 1
+        if refs:
+            self.sample_refs[index] = refs
+            return
+        del self.sample_refs[index]
+        if index < len(self.probabilities):
+            del self.texts[index]
+
+    def score_pending(self):
+        """Scores every comment added since the last call and folds it into the sums."""
+        first = len(self.probabilities)
+        last = len(self.comment_index)
+        if first == last:
+            return
+        # Indices are handed out in order, so the unscored comments are exactly first..last
+        self.probabilities.extend(positive_probabilities([self.texts[i] for i in range(first, last)],
+                                                         self.scorer).tolist())
+        for index, tickers in self.pending:
+            probability = self.probabilities[index]
+            for ticker in tickers:
+                self.tickers[ticker].probability_sum += probability
+        self.pending = []
+        for index in range(first, last):
+            if index not in self.sample_refs:
+                del self.texts[index]
+
+    def rows(self):
+        """Snapshot rows of (ticker, mention_count, sentiment_score, sentiment_label, comments)."""
+        self.score_pending()
+        rows = []
+        for ticker, stats in self.tickers.items():
+            sentiment_score, sentiment_label = normalize_score(stats.probability_sum / stats.mention_count)
+            # Sample in the order the comments were first seen
+            comments = [self.texts[index] for index in sorted(set(stats.sample))]
+            rows.append((ticker, stats.mention_count, sentiment_score, sentiment_label, comments))
+        return rows
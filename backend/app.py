@@ -3,90 +3,61 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-import praw
-import joblib
-import pandas as pd
 #import config # Your API keys
 
 
 from flask import Flask, jsonify, send_from_directory, request, session
 from flask_cors import CORS
 import sqlite3
+import csv
 import datetime
+import functools
 import os
+import time
 from werkzeug.security import generate_password_hash, check_password_hash
-from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-
-# --- 1. LOAD THE TRAINED MODEL AND VECTORIZER ---
-print("Loading model and vectorizer...")
-model = joblib.load('sentiment_model.pkl')
-vectorizer = joblib.load('tfidf_vectorizer.pkl')
-print("Model and vectorizer loaded successfully.")
-
-# Import the text cleaning function from your other script
-# Corrected the filename from sentiment_analysis to sentiment_analyzer
-from sentiment_analysis import clean_text
+from flask_login import LoginManager, login_user, login_required, logout_user, current_user
+
+# --- 1. THE TRAINED MODEL AND VECTORIZER (LOADED ON FIRST USE) ---
+# No route scores text (/api/analyze serves saved snapshots), so joblib, sklearn and
+# nltk stay out of the API process unless something calls get_scorer(). praw and pandas
+# are only needed by run_analysis.py, which the job scheduler runs as its own process.
+@functools.lru_cache(maxsize=None)
+def get_scorer():
+    """Returns the sentiment scorer (see scoring.load_scorer), loading it on first use."""
+    from scoring import load_scorer
+    print("Loading model and vectorizer...")
+    scorer = load_scorer('sentiment_model.pkl', 'tfidf_vectorizer.pkl', 'sentiment_model.bin', reload=True)
+    print("Model and vectorizer loaded successfully.")
+    return scorer
+
+from db import Database
+from response_cache import SnapshotCache
+from ttl_cache import TTLCache
+from rollups import bucket_start, pick_resolution
+from jobs import JobScheduler, QueueFull, run_script
+from snapshot_events import SnapshotBroadcaster, TooManySubscribers
+import metrics
 
 # --- DATABASE SETUP ---
-DATABASE_FILE = 'sentiment_history.db'
+DATABASE_FILE = os.environ.get('DATABASE_FILE', 'sentiment_history.db')
+# Shared by every route: a bounded pool of WAL connections instead of a connect() per request
+db = Database(DATABASE_FILE)
 
 def init_db():
-    """Initializes the database and creates the table if it doesn't exist."""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sentiment_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            ticker TEXT NOT NULL,
-            sentiment_score REAL NOT NULL,
-            mention_count INTEGER NOT NULL,
-            timestamp DATETIME NOT NULL
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    """Creates the database if needed and applies any pending schema migrations."""
+    db.bootstrap()
     print("Database initialized successfully.")
 
-# Create users table if not exists
-with sqlite3.connect(DATABASE_FILE) as conn:
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL
-        )
-    """)
-
-# Create user_favorites table if not exists
-with sqlite3.connect(DATABASE_FILE) as conn:
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS user_favorites (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            ticker TEXT NOT NULL,
-            UNIQUE(user_id, ticker)
-        )
-    """)
-
-# Create user_watchlist table if not exists
-with sqlite3.connect(DATABASE_FILE) as conn:
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS user_watchlist (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            ticker TEXT NOT NULL,
-            UNIQUE(user_id, ticker)
-        )
-    """)
+init_db()
 
 # --- UTILITY FUNCTION TO LOAD TICKERS ---
 def load_tickers_from_csv(filename):
     """Loads stock tickers from a CSV file into a Python set."""
     try:
-        df = pd.read_csv(filename)
-        # Ensure the column name 'Symbol' matches your CSV file.
-        tickers = set(df['Symbol'].unique())
+        # csv instead of pandas: this is one column of ~500 rows
+        with open(filename, newline='') as f:
+            # Ensure the column name 'Symbol' matches your CSV file.
+            tickers = {row['Symbol'] for row in csv.DictReader(f)}
         print(f"Successfully loaded {len(tickers)} tickers from {filename}.")
         return tickers
     except FileNotFoundError:
@@ -109,40 +80,129 @@ CORS(app, supports_credentials=True)  # Enable CORS with credentials for cross-d
 login_manager = LoginManager()
 login_manager.init_app(app)
 
-class User(UserMixin):
+# --- REQUEST METRICS ---
+# Latency per route, served by /metrics. With METRICS_ENABLED=0 the hooks aren't installed.
+REQUEST_SECONDS = metrics.histogram('http_request_seconds', 'Request latency by route, method and status.',
+                                    ('endpoint', 'method', 'status'))
+if metrics.ENABLED:
+    @app.before_request
+    def start_request_timer():
+        request.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started = getattr(request, 'metrics_started', None)
+        if started is not None:
+            REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                    (request.endpoint or 'unmatched', request.method, response.status_code))
+        return response
+
+class User:
+    """A logged-in user, as Flask-Login expects one (what UserMixin provides, without its __dict__)."""
+    __slots__ = ('id', 'username', 'email', 'password_hash')
+    is_active = True
+    is_authenticated = True
+    is_anonymous = False
+
     def __init__(self, id, username, email, password_hash):
         self.id = id
         self.username = username
         self.email = email
         self.password_hash = password_hash
 
+    def get_id(self):
+        return str(self.id)
+
+    def __eq__(self, other):
+        if isinstance(other, User):
+            return self.id == other.id
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.id)
+
+# --- PER-USER CACHES ---
+# Every @login_required request loads its user, and the favorites/watchlist pages each
+# make several such calls, so users and their ticker lists are cached for a short TTL.
+# The routes below that change a list, and logout, drop the affected entries.
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', 60))
+user_cache = TTLCache(maxsize=int(os.environ.get('USER_CACHE_SIZE', 1024)), ttl=USER_CACHE_TTL)
+# Keyed on (table, user_id); values are tuples of tickers
+user_lists_cache = TTLCache(maxsize=int(os.environ.get('USER_CACHE_SIZE', 1024)) * 2, ttl=USER_CACHE_TTL)
+# Fixed queries per list table, so no table name is ever formatted into SQL
+USER_LIST_QUERIES = {
+    'user_favorites': "SELECT ticker FROM user_favorites WHERE user_id=?",
+    'user_watchlist': "SELECT ticker FROM user_watchlist WHERE user_id=?",
+}
+USER_LIST_TABLES = tuple(USER_LIST_QUERIES)
+
 @login_manager.user_loader
 def load_user(user_id):
-    conn = sqlite3.connect(DATABASE_FILE)
-    c = conn.cursor()
-    c.execute("SELECT id, username, email, password_hash FROM users WHERE id=?", (user_id,))
-    row = c.fetchone()
-    conn.close()
-    if row:
-        return User(*row)
-    return None
+    def load():
+        row = db.fetch_one("SELECT id, username, email, password_hash FROM users WHERE id=?", (user_id,))
+        return User(*row) if row else None
+    return user_cache.get_or_load(str(user_id), load)
+
+def user_tickers(table, user_id):
+    """The tickers in the user's favorites or watchlist (table is one of USER_LIST_TABLES)."""
+    query = USER_LIST_QUERIES.get(table)
+    if query is None:
+        raise ValueError(f"Unknown user list table: {table!r}")
+    return list(user_lists_cache.get_or_load((table, user_id), lambda: tuple(
+        row[0] for row in db.fetch_all(query, (user_id,)))))
+
+# --- RESPONSE CACHE ---
+# Snapshot data only changes once per analysis run, so each GET below is built once per
+# snapshot and then served from memory, with an ETag so browsers can revalidate for free.
+CACHE_MAX_AGE = int(os.environ.get('CACHE_MAX_AGE', 60))
+response_cache = SnapshotCache(maxsize=int(os.environ.get('RESPONSE_CACHE_SIZE', 512)))
+
+# Bumped by every snapshot write, including a replay rewriting one in place (see snapshot_writer.py)
+SNAPSHOT_VERSION_QUERY = 'SELECT generation, (SELECT MAX(timestamp) FROM snapshots) FROM snapshot_generation'
+
+def latest_snapshot_version():
+    """(snapshot generation, latest snapshot timestamp or None)."""
+    return tuple(db.fetch_one(SNAPSHOT_VERSION_QUERY))
+
+def snapshot_cached(view):
+    """Caches a JSON view's body per snapshot generation and query string; errors aren't cached."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        snapshot = db.fetch_one('SELECT generation FROM snapshot_generation')[0]
+        uncached = []
+        def build():
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                uncached.append(response)
+                return None
+            return response.get_data()
+        body, etag = response_cache.get_or_build(snapshot, request.full_path, build)
+        if uncached:
+            return uncached[0]
+        response = app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = CACHE_MAX_AGE
+        return response.make_conditional(request)
+    return wrapper
 
 # --- 3. CREATE THE API ENDPOINT ---
 @app.route('/api/analyze', methods=['GET'])
+@snapshot_cached
 def analyze_sentiment():
     print("Received API request to /api/analyze (DB mode)")
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    # Get the latest timestamp in the table
-    cursor.execute('SELECT MAX(timestamp) FROM ticker_mentions')
-    latest_ts = cursor.fetchone()[0]
+    # Get the latest snapshot timestamp
+    latest_ts = latest_snapshot_timestamp()
     if not latest_ts:
-        conn.close()
         return jsonify({})
-    # Get all tickers for the latest timestamp
-    cursor.execute('SELECT ticker, mention_count, sentiment_score, sentiment_label FROM ticker_mentions WHERE timestamp = ?', (latest_ts,))
-    rows = cursor.fetchall()
-    conn.close()
+    return jsonify(load_snapshot_tickers(latest_ts))
+
+def latest_snapshot_timestamp():
+    return db.fetch_one('SELECT MAX(timestamp) FROM snapshots')[0]
+
+def load_snapshot_tickers(timestamp):
+    """{ticker: {mentions, sentiment, score}} for one snapshot, as /api/analyze serves it."""
+    rows = db.fetch_all('SELECT ticker, mention_count, sentiment_score, sentiment_label FROM ticker_mentions WHERE timestamp = ?', (timestamp,))
     results = {}
     for ticker, mention_count, sentiment_score, sentiment_label in rows:
         results[ticker] = {
@@ -150,25 +210,217 @@ def analyze_sentiment():
             "sentiment": sentiment_label,
             "score": round(sentiment_score, 2)
         }
-    return jsonify(results)
+    return results
+
+# --- SNAPSHOT STREAM ---
+# Pushes each new snapshot to open dashboards (see snapshot_events.py) instead of having them poll.
+snapshot_stream = SnapshotBroadcaster(latest_snapshot_version, load_snapshot_tickers)
+
+@app.route('/api/stream', methods=['GET'])
+def stream_snapshots():
+    """Server-Sent Events: a "snapshot" event with the latest data, then a "delta" per new snapshot.
+
+    Deltas carry {"timestamp", "previous", "changed": {ticker: {...}}, "removed": [...]}.
+    Reconnecting clients send Last-Event-ID and only receive what they missed.
+    """
+    try:
+        stream = snapshot_stream.subscribe(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+    except TooManySubscribers as e:
+        return jsonify({'error': f'Too many open streams ({e}). Poll /api/analyze instead.'}), 503
+    response = app.response_class(stream, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx-style proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Chart label format per history resolution
+HISTORY_LABEL_FORMATS = {
+    'raw': '%b %d, %H:%M',
+    'hour': '%b %d, %H:%M',
+    'day': '%b %d',
+    'week': '%b %d',
+}
+# Most tickers one batch history request may ask for
+MAX_HISTORY_TICKERS = int(os.environ.get('MAX_HISTORY_TICKERS', 50))
+
+def get_history_params():
+    """Reads ?from=, ?to= and ?resolution=; returns (resolution, low, high, error)."""
+    start = request.args.get('from', None, type=int)
+    end = request.args.get('to', None, type=int)
+    resolution = request.args.get('resolution', 'raw' if start is None and end is None else 'auto')
+    if resolution == 'auto':
+        resolution = pick_resolution(start or 0, end if end is not None else int(time.time()))
+    if resolution not in HISTORY_LABEL_FORMATS:
+        return None, None, None, 'resolution must be one of raw, hour, day, week or auto'
+    low = start if start is not None else 0
+    high = end if end is not None else 2 ** 63 - 1
+    return resolution, low, high, None
+
+def fetch_history(ticker_filter, filter_params, resolution, low, high):
+    """(ticker, timestamp, score, mentions) rows for every ticker matched by ticker_filter, in one query.
+
+    ticker_filter is SQL for the ticker column to match, e.g. "= ?" or "IN (SELECT ...)".
+    """
+    if resolution == 'raw':
+        return db.fetch_all(f'''
+            SELECT ticker, timestamp, sentiment_score, mention_count FROM ticker_mentions
+            WHERE ticker {ticker_filter} AND timestamp BETWEEN ? AND ?
+            ORDER BY ticker, timestamp ASC
+        ''', (*filter_params, low, high))
+    # Include the bucket that contains `from`, so a range never starts mid-bucket empty
+    return db.fetch_all(f'''
+        SELECT ticker, bucket, score_sum / sample_count, mention_sum FROM sentiment_rollups
+        WHERE resolution = ? AND ticker {ticker_filter} AND bucket BETWEEN ? AND ?
+        ORDER BY ticker, bucket ASC
+    ''', (resolution, *filter_params, bucket_start(low, resolution), high))
+
+def format_label(ts, resolution):
+    try:
+        return datetime.datetime.fromtimestamp(ts).strftime(HISTORY_LABEL_FORMATS[resolution])
+    except Exception:
+        return str(ts)
 
 @app.route('/api/history/<ticker>', methods=['GET'])
+@snapshot_cached
 def get_history(ticker):
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT timestamp, sentiment_score FROM ticker_mentions WHERE ticker = ? ORDER BY timestamp ASC', (ticker.upper(),))
-    history = cursor.fetchall()
-    conn.close()
+    """Sentiment history for one ticker.
+
+    Optional ?from= and ?to= (unix seconds) bound the range, and ?resolution= is one of
+    raw, hour, day, week or auto (default when a range is given). Rollups are read for
+    anything coarser than raw, so long ranges stay a few hundred rows.
+    """
+    resolution, low, high, error = get_history_params()
+    if error:
+        return jsonify({'error': error}), 400
     labels = []
     scores = []
-    for ts, score in history:
-        try:
-            dt = datetime.datetime.fromtimestamp(ts)
-            labels.append(dt.strftime('%b %d, %H:%M'))
-        except Exception:
-            labels.append(str(ts))
+    mentions = []
+    for _, ts, score, mention_count in fetch_history('= ?', (ticker.upper(),), resolution, low, high):
+        labels.append(format_label(ts, resolution))
         scores.append(round(score, 2))
-    return jsonify({"labels": labels, "scores": scores})
+        mentions.append(mention_count)
+    return jsonify({"labels": labels, "scores": scores, "mentions": mentions, "resolution": resolution})
+
+def batch_history_response(ticker_filter, filter_params):
+    """Columnar history for many tickers: one shared timestamp axis, one series per ticker.
+
+    {"resolution", "timestamps": [...], "labels": [...], "series": {ticker: {"scores", "mentions"}}},
+    where series values line up with timestamps and are null where a ticker has no row.
+    Tickers with no history in the range are left out.
+    Takes the same ?from=, ?to= and ?resolution= as /api/history/<ticker>.
+    """
+    resolution, low, high, error = get_history_params()
+    if error:
+        return jsonify({'error': error}), 400
+    rows = fetch_history(ticker_filter, filter_params, resolution, low, high)
+    timestamps = sorted({ts for _, ts, _, _ in rows})
+    position = {ts: i for i, ts in enumerate(timestamps)}
+    series = {}
+    for ticker, ts, score, mention_count in rows:
+        entry = series.get(ticker)
+        if entry is None:
+            entry = series[ticker] = {'scores': [None] * len(timestamps), 'mentions': [None] * len(timestamps)}
+        i = position[ts]
+        entry['scores'][i] = round(score, 2)
+        entry['mentions'][i] = mention_count
+    return jsonify({'resolution': resolution, 'timestamps': timestamps,
+                    'labels': [format_label(ts, resolution) for ts in timestamps], 'series': series})
+
+@app.route('/api/history', methods=['GET'])
+@snapshot_cached
+def get_batch_history():
+    """History for ?tickers=GME,AMC,... (at most MAX_HISTORY_TICKERS) in one request and one query."""
+    tickers = list(dict.fromkeys(t.strip().upper() for t in request.args.get('tickers', '').split(',') if t.strip()))
+    if not tickers:
+        return jsonify({'error': 'tickers must be a comma-separated list of tickers'}), 400
+    if len(tickers) > MAX_HISTORY_TICKERS:
+        return jsonify({'error': f'at most {MAX_HISTORY_TICKERS} tickers per request'}), 400
+    return batch_history_response(f"IN ({','.join('?' * len(tickers))})", tickers)
+
+# --- LEADERBOARD ENDPOINTS ---
+# Each ranking is one SQL query over ticker_mentions, so the movers/improved/trending
+# pages need a single request instead of one /api/history call per ticker.
+# ?window= sums, like the history rollups, add mention_count across snapshots, so they
+# assume every snapshot covers its own stretch of comments: one per worker.py window,
+# or one per run_analysis.py --incremental run. (A full run re-reads the same hot
+# threads, so comments still in them are counted again by the next run.) Movers and
+# improved compare consecutive snapshots, i.e. changes over that cadence.
+def get_leaderboard_params():
+    """Reads ?limit= (default 5) and ?window= (hours) from the query string.
+
+    Without a window, each ticker in the latest snapshot is compared against its
+    previous snapshot. The returned offset is in seconds, back from the latest snapshot.
+    """
+    limit = request.args.get('limit', 5, type=int)
+    window = request.args.get('window', None, type=float)
+    if limit is None or not 1 <= limit <= 100:
+        return None, None, 'limit must be an integer between 1 and 100'
+    if window is not None and window <= 0:
+        return None, None, 'window must be a positive number of hours'
+    offset = int(window * 3600) if window is not None else 1
+    return limit, offset, None
+
+SCORE_CHANGE_QUERY = '''
+    WITH latest AS (SELECT MAX(timestamp) AS ts FROM snapshots)
+    SELECT ticker, mention_count, sentiment_label, score, score - prev_score AS change FROM (
+        SELECT cur.ticker, cur.mention_count, cur.sentiment_label, ROUND(cur.sentiment_score, 2) AS score,
+            (SELECT ROUND(p.sentiment_score, 2) FROM ticker_mentions p
+             WHERE p.ticker = cur.ticker AND p.timestamp <= latest.ts - ?
+             ORDER BY p.timestamp DESC LIMIT 1) AS prev_score
+        FROM ticker_mentions cur JOIN latest ON cur.timestamp = latest.ts
+    )
+    WHERE prev_score IS NOT NULL {filter}
+    ORDER BY {order} DESC
+    LIMIT ?
+'''
+
+def leaderboard_rows(rows):
+    return [
+        {"ticker": ticker, "mentions": mentions, "sentiment": label, "score": score, "change": round(change, 2)}
+        for ticker, mentions, label, score, change in rows
+    ]
+
+@app.route('/api/movers', methods=['GET'])
+@snapshot_cached
+def get_movers():
+    """Tickers from the latest snapshot with the largest absolute score change."""
+    limit, offset, error = get_leaderboard_params()
+    if error:
+        return jsonify({'error': error}), 400
+    rows = db.fetch_all(SCORE_CHANGE_QUERY.format(filter='', order='ABS(change)'), (offset, limit))
+    return jsonify({'movers': leaderboard_rows(rows)})
+
+@app.route('/api/improved', methods=['GET'])
+@snapshot_cached
+def get_improved():
+    """Tickers from the latest snapshot whose score went up the most."""
+    limit, offset, error = get_leaderboard_params()
+    if error:
+        return jsonify({'error': error}), 400
+    rows = db.fetch_all(SCORE_CHANGE_QUERY.format(filter='AND change > 0', order='change'), (offset, limit))
+    return jsonify({'improved': leaderboard_rows(rows)})
+
+@app.route('/api/trending', methods=['GET'])
+@snapshot_cached
+def get_trending():
+    """Most mentioned tickers in the latest snapshot, or summed over ?window= hours."""
+    limit, offset, error = get_leaderboard_params()
+    if error:
+        return jsonify({'error': error}), 400
+    # With a single MAX() aggregate, SQLite takes the bare columns from the latest row
+    rows = db.fetch_all('''
+        SELECT ticker, SUM(mention_count) AS mentions, sentiment_label, sentiment_score, MAX(timestamp)
+        FROM ticker_mentions
+        WHERE timestamp > (SELECT MAX(timestamp) FROM snapshots) - ?
+        GROUP BY ticker
+        ORDER BY mentions DESC
+        LIMIT ?
+    ''', (offset, limit))
+    trending = [
+        {"ticker": ticker, "mentions": mentions, "sentiment": label, "score": round(score, 2)}
+        for ticker, mentions, label, score, _ in rows
+    ]
+    return jsonify({'trending': trending})
 
 @app.route('/api/register', methods=['POST'])
 def register():
@@ -180,8 +432,7 @@ def register():
         return jsonify({'error': 'Missing fields'}), 400
     password_hash = generate_password_hash(password)
     try:
-        with sqlite3.connect(DATABASE_FILE) as conn:
-            conn.execute("INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)", (username, email, password_hash))
+        db.execute("INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)", (username, email, password_hash))
         return jsonify({'message': 'User registered successfully'})
     except sqlite3.IntegrityError:
         return jsonify({'error': 'Username or email already exists'}), 409
@@ -193,20 +444,21 @@ def login():
     password = data.get('password')
     if not username or not password:
         return jsonify({'error': 'Missing fields'}), 400
-    with sqlite3.connect(DATABASE_FILE) as conn:
-        c = conn.cursor()
-        c.execute("SELECT id, username, email, password_hash FROM users WHERE username=?", (username,))
-        row = c.fetchone()
+    row = db.fetch_one("SELECT id, username, email, password_hash FROM users WHERE username=?", (username,))
     if row and check_password_hash(row[3], password):
         user = User(*row)
         login_user(user)
+        user_cache.put(str(user.id), user)
         return jsonify({'message': 'Login successful', 'username': user.username})
     return jsonify({'error': 'Invalid credentials'}), 401
 
 @app.route('/api/logout', methods=['POST'])
 @login_required
 def logout():
+    user_id = current_user.id
     logout_user()
+    user_cache.invalidate(str(user_id))
+    user_lists_cache.invalidate(*((table, user_id) for table in USER_LIST_TABLES))
     return jsonify({'message': 'Logged out'})
 
 @app.route('/api/user', methods=['GET'])
@@ -221,11 +473,11 @@ def add_favorite():
     ticker = data.get('ticker')
     if not ticker:
         return jsonify({'error': 'Missing ticker'}), 400
-    with sqlite3.connect(DATABASE_FILE) as conn:
-        try:
-            conn.execute("INSERT OR IGNORE INTO user_favorites (user_id, ticker) VALUES (?, ?)", (current_user.id, ticker.upper()))
-        except Exception as e:
-            return jsonify({'error': str(e)}), 500
+    try:
+        db.execute("INSERT OR IGNORE INTO user_favorites (user_id, ticker) VALUES (?, ?)", (current_user.id, ticker.upper()))
+        user_lists_cache.invalidate(('user_favorites', current_user.id))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
     return jsonify({'message': 'Ticker favorited'})
 
 @app.route('/api/favorite', methods=['DELETE'])
@@ -235,28 +487,33 @@ def remove_favorite():
     ticker = data.get('ticker')
     if not ticker:
         return jsonify({'error': 'Missing ticker'}), 400
-    with sqlite3.connect(DATABASE_FILE) as conn:
-        conn.execute("DELETE FROM user_favorites WHERE user_id=? AND ticker=?", (current_user.id, ticker.upper()))
+    db.execute("DELETE FROM user_favorites WHERE user_id=? AND ticker=?", (current_user.id, ticker.upper()))
+    user_lists_cache.invalidate(('user_favorites', current_user.id))
     return jsonify({'message': 'Ticker unfavorited'})
 
 @app.route('/api/favorites', methods=['GET'])
 @login_required
 def get_favorites():
-    with sqlite3.connect(DATABASE_FILE) as conn:
-        c = conn.cursor()
-        c.execute("SELECT ticker FROM user_favorites WHERE user_id=?", (current_user.id,))
-        tickers = [row[0] for row in c.fetchall()]
-    return jsonify({'favorites': tickers})
+    return jsonify({'favorites': user_tickers('user_favorites', current_user.id)})
+
+@app.route('/api/favorites/history', methods=['GET'])
+@login_required
+def get_favorites_history():
+    """Batch history (see /api/history) for every ticker the user has favorited."""
+    return batch_history_response('IN (SELECT ticker FROM user_favorites WHERE user_id = ?)', (current_user.id,))
 
 @app.route('/api/watchlist', methods=['GET'])
 @login_required
 def get_watchlist():
-    with sqlite3.connect(DATABASE_FILE) as conn:
-        c = conn.cursor()
-        c.execute("SELECT ticker FROM user_watchlist WHERE user_id=?", (current_user.id,))
-        tickers = [row[0] for row in c.fetchall()]
+    tickers = user_tickers('user_watchlist', current_user.id)
     return jsonify({'watchlist': tickers})
 
+@app.route('/api/watchlist/history', methods=['GET'])
+@login_required
+def get_watchlist_history():
+    """Batch history (see /api/history) for every ticker on the user's watchlist."""
+    return batch_history_response('IN (SELECT ticker FROM user_watchlist WHERE user_id = ?)', (current_user.id,))
+
 @app.route('/api/watchlist/add', methods=['POST'])
 @login_required
 def add_watchlist():
@@ -264,15 +521,13 @@ def add_watchlist():
     ticker = data.get('ticker')
     if not ticker:
         return jsonify({'error': 'Missing ticker'}), 400
-    with sqlite3.connect(DATABASE_FILE) as conn:
-        try:
-            conn.execute("INSERT OR IGNORE INTO user_watchlist (user_id, ticker) VALUES (?, ?)", (current_user.id, ticker.upper()))
-        except Exception as e:
-            return jsonify({'error': str(e)}), 500
-        # Return updated watchlist
-        c = conn.cursor()
-        c.execute("SELECT ticker FROM user_watchlist WHERE user_id=?", (current_user.id,))
-        tickers = [row[0] for row in c.fetchall()]
+    try:
+        db.execute("INSERT OR IGNORE INTO user_watchlist (user_id, ticker) VALUES (?, ?)", (current_user.id, ticker.upper()))
+        user_lists_cache.invalidate(('user_watchlist', current_user.id))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    # Return updated watchlist
+    tickers = user_tickers('user_watchlist', current_user.id)
     return jsonify({'success': True, 'watchlist': tickers})
 
 @app.route('/api/watchlist/remove', methods=['POST'])
@@ -282,24 +537,89 @@ def remove_watchlist():
     ticker = data.get('ticker')
     if not ticker:
         return jsonify({'error': 'Missing ticker'}), 400
-    with sqlite3.connect(DATABASE_FILE) as conn:
-        conn.execute("DELETE FROM user_watchlist WHERE user_id=? AND ticker=?", (current_user.id, ticker.upper()))
-        # Return updated watchlist
-        c = conn.cursor()
-        c.execute("SELECT ticker FROM user_watchlist WHERE user_id=?", (current_user.id,))
-        tickers = [row[0] for row in c.fetchall()]
+    db.execute("DELETE FROM user_watchlist WHERE user_id=? AND ticker=?", (current_user.id, ticker.upper()))
+    user_lists_cache.invalidate(('user_watchlist', current_user.id))
+    # Return updated watchlist
+    tickers = user_tickers('user_watchlist', current_user.id)
     return jsonify({'success': True, 'watchlist': tickers})
 
-# --- CRON/HTTP TRIGGER ENDPOINT FOR ANALYSIS ---
+# --- ANALYSIS JOBS ---
+# See jobs.py. Job records live in the database's jobs table, so every gunicorn worker
+# attaches triggers to the same active job and answers /api/jobs from the same history;
+# a lock file beside the database lets only one worker run a job at a time. Set
+# ANALYSIS_INTERVAL_MINUTES to also run the analysis on a timer instead of (or
+# alongside) an external cron; another lock file keeps that to one schedule.
+analysis_jobs = JobScheduler(run_script(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'run_analysis.py'),
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analysis.log'),
+    cwd=os.path.dirname(os.path.abspath(__file__)),
+), db, f"{DATABASE_FILE}.analysis.lock", on_finish=lambda job: snapshot_stream.poke())
+analysis_jobs.start()
+if os.environ.get('ANALYSIS_INTERVAL_MINUTES'):
+    analysis_jobs.schedule_every(float(os.environ['ANALYSIS_INTERVAL_MINUTES']) * 60,
+                                 lock_path=f"{DATABASE_FILE}.schedule.lock")
+
 @app.route('/api/trigger-analysis', methods=['POST', 'GET'])
 def trigger_analysis():
-    import subprocess
-    import sys
-    # Run the script in the background and log output to a file
-    log_path = os.path.join(os.path.dirname(__file__), 'analysis.log')
-    with open(log_path, 'a') as log_file:
-        subprocess.Popen([sys.executable, 'run_analysis.py'], stdout=log_file, stderr=log_file)
-    return {'success': True, 'message': 'Analysis started in background. Check analysis.log for output.'}
+    """Queues an analysis run, or attaches to the one already queued or running.
+
+    ?incremental=1 runs run_analysis.py --incremental, which is tracked as its own job.
+    """
+    incremental = request.args.get('incremental') == '1'
+    args = ['--incremental'] if incremental else []
+    try:
+        job, created = analysis_jobs.submit('analysis-incremental' if incremental else 'analysis', args)
+    except QueueFull as e:
+        return jsonify({'success': False, 'error': f'Analysis queue is full ({e}). Try again later.'}), 503
+    message = 'Analysis queued.' if created else 'Analysis already in progress; attached to the existing job.'
+    return jsonify({'success': True, 'message': message, 'job_id': job.id, 'status': job.status,
+                    'created': created}), 202 if created else 200
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    return jsonify([job.to_dict() for job in analysis_jobs.recent(limit)])
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+# --- METRICS ENDPOINT ---
+def last_run_values(field):
+    summary = metrics.read_run_summary()
+    if summary is None or summary.get(field) is None:
+        return None
+    value = summary[field]
+    return float(value == 'succeeded') if field == 'status' else value
+
+metrics.callback('response_cache_hits_total', 'Snapshot cache hits.', lambda: response_cache.hits, kind='counter')
+metrics.callback('response_cache_misses_total', 'Snapshot cache misses.', lambda: response_cache.misses,
+                 kind='counter')
+metrics.callback('user_cache_hits_total', 'Session user and ticker-list cache hits.',
+                 lambda: user_cache.hits + user_lists_cache.hits, kind='counter')
+metrics.callback('user_cache_misses_total', 'Session user and ticker-list cache misses.',
+                 lambda: user_cache.misses + user_lists_cache.misses, kind='counter')
+metrics.callback('job_queue_length', 'Jobs waiting to run.', analysis_jobs.queue_length)
+metrics.callback('analysis_last_run_finished_timestamp', 'When the last analysis run ended (unix time).',
+                 lambda: last_run_values('finished_at'))
+metrics.callback('analysis_last_run_seconds', 'Duration of the last analysis run.',
+                 lambda: last_run_values('seconds'))
+metrics.callback('analysis_last_run_success', '1 if the last analysis run succeeded.',
+                 lambda: last_run_values('status'))
+metrics.callback('analysis_last_run_comments', 'Comments processed by the last analysis run.',
+                 lambda: last_run_values('comments'))
+metrics.callback('analysis_last_run_tickers', 'Tickers found by the last analysis run.',
+                 lambda: last_run_values('tickers'))
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text format; 404 when METRICS_ENABLED=0."""
+    if not metrics.ENABLED:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return app.response_class(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 # Serve index.html at root
 @app.route('/')
@@ -314,5 +634,4 @@ def serve_static(path):
 
 # This part allows you to run the Flask app directly
 if __name__ == '__main__':
-    init_db() # Initialize the database when the app starts
     app.run(host='0.0.0.0', debug=True, port=5001)
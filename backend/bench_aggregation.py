@@ -0,0 +1,109 @@
+"""Compares peak memory and saved comment payload of the old stock_data lists vs MentionAggregator.
+
+Usage: python bench_aggregation.py [--comments 200000] [--hot-share 0.5] [--sample-size 20] [--seed 42]
+
+Builds a synthetic corpus where --hot-share of comments pile onto a few tickers (the
+$GME day case), then runs both aggregations end to end (extract, score, build
+snapshot rows) under tracemalloc. Also checks that both give every ticker the same
+mention count and sentiment score.
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+from aggregation import MentionAggregator
+from bench_ticker_extraction import synthetic_corpus
+from numpy_scorer import NUMPY_MODEL_PATH, NumpySentimentModel
+from scoring import normalize_score, positive_probabilities
+from ticker_extraction import BLACKLIST, TickerExtractor, load_tickers
+
+HOT_TICKERS = ['GME', 'NVDA', 'AMC']
+
+
+def skewed_corpus(n, tickers, hot_share, seed):
+    """synthetic_corpus, with hot_share of the comments also naming a hot ticker (some copy-pasted)."""
+    rng = random.Random(seed)
+    corpus = synthetic_corpus(n, tickers, seed)
+    for i in range(n):
+        if rng.random() < hot_share:
+            # Roughly one in five hot comments is a repeat of an earlier one
+            if i and rng.random() < 0.2:
+                corpus[i] = corpus[rng.randrange(i)]
+            else:
+                corpus[i] = f"{corpus[i]} ${rng.choice(HOT_TICKERS)}"
+    return corpus
+
+
+def list_rows(corpus, extractor, scorer):
+    """The stock_data loop and save_to_db from run_analysis.py before MentionAggregator."""
+    stock_data = {}
+    for comment_text in corpus:
+        for ticker in extractor.extract(comment_text):
+            if ticker not in stock_data:
+                stock_data[ticker] = {"mention_count": 0, "comments": []}
+            stock_data[ticker]["mention_count"] += 1
+            stock_data[ticker]["comments"].append(comment_text)
+    corpus_index = {}
+    ticker_indices = {ticker: [corpus_index.setdefault(c, len(corpus_index)) for c in info["comments"]]
+                      for ticker, info in stock_data.items()}
+    probabilities = positive_probabilities(list(corpus_index), scorer)
+    rows = []
+    for ticker, info in stock_data.items():
+        score, label = normalize_score(float(probabilities[ticker_indices[ticker]].mean()))
+        rows.append((ticker, info["mention_count"], score, label, info["comments"]))
+    return rows
+
+
+def aggregator_rows(corpus, extractor, scorer, sample_size, seed):
+    aggregator = MentionAggregator(scorer, sample_size=sample_size, seed=seed)
+    for comment_text in corpus:
+        aggregator.add(comment_text, extractor.extract(comment_text))
+    return aggregator.rows()
+
+
+def measure(fn, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    rows = fn(*args)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    payload = sum(len(json.dumps(comments)) for *_, comments in rows)
+    return rows, elapsed, peak, payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--comments', type=int, default=200000)
+    parser.add_argument('--hot-share', type=float, default=0.5, help='share of comments naming a hot ticker')
+    parser.add_argument('--sample-size', type=int, default=20, help='comments kept per ticker')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    tickers = load_tickers()
+    extractor = TickerExtractor(tickers, BLACKLIST)
+    scorer = NumpySentimentModel.load(NUMPY_MODEL_PATH)
+    print(f"Generating {args.comments} synthetic comments...")
+    corpus = skewed_corpus(args.comments, tickers, args.hot_share, args.seed)
+
+    results = {}
+    for name, fn, fn_args in (('lists', list_rows, ()),
+                              ('aggregator', aggregator_rows, (args.sample_size, args.seed))):
+        rows, elapsed, peak, payload = measure(fn, corpus, extractor, scorer, *fn_args)
+        results[name] = rows
+        print(f"{name:<11} {elapsed:7.2f}s  peak {peak / 2**20:8.1f} MB  "
+              f"comment JSON {payload / 2**20:8.1f} MB  largest row {max(len(r[4]) for r in rows)} comments")
+
+    expected = {row[0]: row[1:3] for row in results['lists']}
+    actual = {row[0]: row[1:3] for row in results['aggregator']}
+    mismatched = [t for t in expected if t not in actual or actual[t][0] != expected[t][0]
+                  or abs(actual[t][1] - expected[t][1]) > 1e-9]
+    if mismatched or len(actual) != len(expected):
+        raise SystemExit(f"{len(mismatched)} tickers differ between the two aggregations, e.g. {mismatched[:5]}")
+    print(f"All {len(expected)} tickers have the same mention count and score.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Benchmarks the raw comment archive: size, write/read speed, read memory and parallel replay.
+
+Usage: python bench_archive.py [--comments 200000] [--segments 24] [--workers 1 4]
+
+Writes --comments synthetic comments as --segments archived runs, checks every column
+reads back unchanged, compares the archive's size with the same comments as JSON
+lines, measures peak traced memory while streaming the body column of every segment,
+then replays all segments into a fresh database with each --workers count.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from bench_ticker_extraction import synthetic_corpus
+from comment_archive import ArchiveWriter, list_segments, read_chunks
+from fake_reddit import FakeComment
+from replay import replay
+from ticker_extraction import BLACKLIST, SUBREDDIT_NAMES, load_tickers
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATHS = tuple(os.path.join(BASE_DIR, name)
+                    for name in ('sentiment_model.pkl', 'tfidf_vectorizer.pkl', 'sentiment_model.bin'))
+
+
+def synthetic_runs(n, segments, seed):
+    """[(snapshot timestamp, [FakeComment])], one hourly run per segment."""
+    rng = random.Random(seed)
+    corpus = synthetic_corpus(n, load_tickers(), seed)
+    start = 1700000000
+    per_run = -(-n // segments)
+    runs = []
+    for run in range(segments):
+        timestamp = start + run * 3600
+        comments = [FakeComment(f"c{i}", corpus[i], timestamp - rng.uniform(0, 3600), f"p{i // 40}",
+                                rng.choice(SUBREDDIT_NAMES))
+                    for i in range(run * per_run, min(n, (run + 1) * per_run))]
+        runs.append((timestamp, comments))
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--comments', type=int, default=200000)
+    parser.add_argument('--segments', type=int, default=24)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    runs = synthetic_runs(args.comments, args.segments, args.seed)
+    with tempfile.TemporaryDirectory() as workdir:
+        archive_dir = os.path.join(workdir, 'archive')
+        started = time.perf_counter()
+        for timestamp, comments in runs:
+            writer = ArchiveWriter(archive_dir)
+            for comment in comments:
+                writer.append(comment)
+            writer.commit(timestamp)
+        write_seconds = time.perf_counter() - started
+        segments = list_segments(archive_dir)
+        archive_bytes = sum(os.path.getsize(path) for _, path in segments)
+        json_bytes = sum(len(json.dumps({'id': c.id, 'post_id': c.link_id[3:],
+                                         'subreddit': c.subreddit.display_name,
+                                         'created_utc': c.created_utc, 'body': c.body})) + 1
+                         for _, comments in runs for c in comments)
+        print(f"Wrote {args.comments} comments as {len(segments)} segments in {write_seconds:.2f}s: "
+              f"{archive_bytes / 2**20:.1f} MB vs {json_bytes / 2**20:.1f} MB as JSON lines "
+              f"({json_bytes / archive_bytes:.1f}x smaller).")
+
+        for (_, comments), (_, path) in zip(runs, segments):
+            read = [row for chunk in read_chunks(path)
+                    for row in zip(chunk['id'], chunk['post_id'], chunk['subreddit'], chunk['created_utc'],
+                                   chunk['body'])]
+            expected = [(c.id, c.link_id[3:], c.subreddit.display_name, c.created_utc, c.body) for c in comments]
+            if read != expected:
+                raise SystemExit(f"{path} didn't read back what was written!")
+        print("Every column of every segment reads back unchanged.")
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        bodies = sum(len(chunk['body']) for _, path in segments for chunk in read_chunks(path, ('body',)))
+        read_seconds = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"Streamed {bodies} bodies in {read_seconds:.2f}s "
+              f"({bodies / read_seconds:,.0f}/s), peak {peak / 2**20:.1f} MB traced.")
+
+        tickers = load_tickers()
+        for workers in args.workers:
+            db_path = os.path.join(workdir, f'replay-{workers}.db')
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                replay(segments, db_path, tickers, BLACKLIST, MODEL_PATHS, workers=workers)
+            elapsed = time.perf_counter() - started
+            print(f"Replayed {len(segments)} runs with {workers} worker(s) in {elapsed:.2f}s "
+                  f"({args.comments / elapsed:,.0f} comments/s).")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Benchmarks serial vs concurrent Reddit ingestion against a fake, fixture-backed client.
+
+Usage: python bench_ingestion.py [--fixture recorded.json] [--latency 0.05] [--workers 1 4 8 16]
+"""
+import argparse
+import random
+import time
+
+from bench_ticker_extraction import load_sentences
+from fake_reddit import FakeReddit
+from ingestion import RedditIngestor, TokenBucket
+from ticker_extraction import SUBREDDIT_NAMES
+
+def synthetic_fixture(posts_per_subreddit=50, comments_per_post=40, seed=42):
+    """A fixture shaped like a real run, with comment text drawn from data.csv."""
+    rng = random.Random(seed)
+    sentences = load_sentences()
+    now = time.time()
+    subreddits = {}
+    for name in SUBREDDIT_NAMES:
+        posts = []
+        for p in range(posts_per_subreddit):
+            post_id = f"{name}_{p}"
+            posts.append({
+                'id': post_id,
+                'title': rng.choice(sentences),
+                'created_utc': now - rng.uniform(0, 86400),
+                'comments': [
+                    {'id': f"{post_id}_{c}", 'body': rng.choice(sentences), 'created_utc': now - rng.uniform(0, 3600)}
+                    for c in range(rng.randint(comments_per_post // 2, comments_per_post * 3 // 2))
+                ],
+            })
+        subreddits[name] = posts
+    return {'subreddits': subreddits}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fixture', help='JSON recorded with fake_reddit.record_fixture')
+    parser.add_argument('--latency', type=float, default=0.05, help='simulated seconds per request')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    if args.fixture:
+        fake = FakeReddit.from_file(args.fixture, args.latency)
+    else:
+        fake = FakeReddit(synthetic_fixture(), args.latency)
+    names = list(fake.fixture['subreddits'])
+
+    baseline = None
+    for workers in args.workers:
+        # Unlimited bucket: this measures overlap, not Reddit's quota
+        ingestor = RedditIngestor(lambda: fake, max_workers=workers, bucket=TokenBucket(rate=1e9, capacity=1e9))
+        start = time.perf_counter()
+        ids = sorted(c.id for c in ingestor.iter_comments(names))
+        elapsed = time.perf_counter() - start
+        if baseline is None:
+            baseline = (ids, elapsed)
+        elif ids != baseline[0]:
+            raise SystemExit(f"{workers} workers returned different comments than {args.workers[0]}!")
+        print(f"{workers:>3} workers: {len(ids)} comments in {elapsed:.2f}s "
+              f"({baseline[1] / elapsed:.1f}x vs {args.workers[0]} worker)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Measures per-worker memory for the pickled vs memory-mapped model as workers are added.
+
+Usage: python bench_model_memory.py [--workers 1 2 4 8]
+
+Starts N worker processes that each load the model and score a batch, keeps them
+all alive together, and reads /proc/<pid>/smaps_rollup (Linux only). RSS counts
+shared pages in full in every process; PSS splits them between the processes that
+map them, so total PSS is what the workers really cost together. "private" is the
+memory a worker added by loading the model, counting only pages nobody else shares.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+WORKER = """
+import json, sys
+import numpy
+def rollup():
+    fields = dict()
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return fields
+from bench_ticker_extraction import load_sentences
+from sentiment_analysis import clean_texts
+texts = clean_texts(load_sentences()[:256])
+before = rollup()
+if {mode!r} == 'pickle':
+    from scoring import SklearnScorer, load_model
+    scorer = SklearnScorer(*load_model('sentiment_model.pkl', 'tfidf_vectorizer.pkl'))
+else:
+    from numpy_scorer import NumpySentimentModel
+    scorer = NumpySentimentModel.load('sentiment_model.bin')
+scorer.predict_positive(texts)
+after = rollup()
+private = lambda r: r.get('Private_Clean', 0) + r.get('Private_Dirty', 0)
+print(json.dumps({{'private_kb': private(after) - private(before)}}), flush=True)
+sys.stdin.readline()
+"""
+
+
+def rollup(pid):
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return fields
+
+
+def measure(mode, workers):
+    code = WORKER.format(mode=mode)
+    processes = [subprocess.Popen([sys.executable, '-W', 'ignore', '-c', code], cwd=BASE_DIR, text=True,
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE) for _ in range(workers)]
+    try:
+        reports = [json.loads(process.stdout.readline()) for process in processes]
+        # Everyone has loaded the model and is still alive, so shared pages are split N ways
+        rollups = [rollup(process.pid) for process in processes]
+    finally:
+        for process in processes:
+            process.stdin.close()
+            process.wait()
+    mb = lambda kb: kb / 1024
+    return {
+        'rss': mb(sum(r['Rss'] for r in rollups) / workers),
+        'pss': mb(sum(r['Pss'] for r in rollups) / workers),
+        'total_pss': mb(sum(r['Pss'] for r in rollups)),
+        'private': mb(sum(r['private_kb'] for r in reports) / workers),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        raise SystemExit("Needs Linux's /proc/<pid>/smaps_rollup.")
+
+    print(f"{'model':>7} {'workers':>7} {'RSS/worker':>11} {'PSS/worker':>11} {'total PSS':>10} {'model private/worker':>21}")
+    for mode in ('pickle', 'mmap'):
+        for workers in args.workers:
+            result = measure(mode, workers)
+            print(f"{mode:>7} {workers:>7} {result['rss']:>8.1f} MB {result['pss']:>8.1f} MB "
+                  f"{result['total_pss']:>7.1f} MB {result['private']:>18.2f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Checks the NumPy scorer against sklearn and compares their speed across batch sizes.
+
+Usage: python bench_scoring.py [--batch-sizes 1 16 256 4096] [--repeat 20]
+
+Exits non-zero if any probability differs from sklearn's predict_proba by more than
+TOLERANCE, so it doubles as the parity check for a freshly exported model.
+"""
+import argparse
+import os
+import time
+
+import joblib
+import numpy as np
+
+from bench_ticker_extraction import load_sentences
+from numpy_scorer import NUMPY_MODEL_PATH, NumpySentimentModel
+from scoring import SklearnScorer
+from sentiment_analysis import clean_texts
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TOLERANCE = 1e-9
+
+
+def best_of(repeat, fn, *args):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 16, 256, 4096])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--numpy-model', default=NUMPY_MODEL_PATH)
+    args = parser.parse_args()
+
+    sklearn_scorer = SklearnScorer(joblib.load(os.path.join(BASE_DIR, 'sentiment_model.pkl')),
+                                   joblib.load(os.path.join(BASE_DIR, 'tfidf_vectorizer.pkl')))
+    numpy_scorer = NumpySentimentModel.load(args.numpy_model)
+    # Empty and out-of-vocabulary texts exercise the intercept-only path
+    corpus = clean_texts(load_sentences()) + ['', 'zzzz qqqq']
+
+    expected = sklearn_scorer.predict_positive(corpus)
+    actual = numpy_scorer.predict_positive(corpus)
+    max_diff = float(np.max(np.abs(expected - actual)))
+    print(f"{len(corpus)} texts, max |numpy - sklearn| = {max_diff:.2e}")
+    if max_diff > TOLERANCE:
+        raise SystemExit(f"NumPy scorer differs from sklearn by more than {TOLERANCE}!")
+
+    for size in args.batch_sizes:
+        batch = (corpus * (size // len(corpus) + 1))[:size]
+        sklearn_time = best_of(args.repeat, sklearn_scorer.predict_positive, batch)
+        numpy_time = best_of(args.repeat, numpy_scorer.predict_positive, batch)
+        print(f"batch {size:>5}: sklearn {sklearn_time * 1e3:8.3f} ms, numpy {numpy_time * 1e3:8.3f} ms "
+              f"({sklearn_time / numpy_time:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Profiles the API's cold start: wall time, peak memory and an `-X importtime` breakdown.
+
+Usage: python bench_startup.py [--module app] [--runs 5] [--top 15] [--max-seconds 1.5]
+
+Each run imports the module in a fresh interpreter, with DATABASE_FILE pointed at a
+temporary file: `import app` creates and migrates its database, and measuring that
+must not touch the real sentiment_history.db. Exits non-zero if the median
+import takes longer than --max-seconds, or if any of the heavy packages the API
+doesn't need at startup (HEAVY_MODULES) got imported, so it can guard against
+regressions in CI or a deploy script.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Only needed by run_analysis.py / training, never by `import app`
+HEAVY_MODULES = ['praw', 'pandas', 'sklearn', 'scipy', 'joblib', 'nltk']
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{"seconds": elapsed, "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  "heavy": heavy}}))
+"""
+
+
+def run_probe(module, cwd, env):
+    code = PROBE.format(module=module, heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, '-c', code], cwd=cwd, env=env, capture_output=True, text=True,
+                            check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def import_profile(module, cwd, env):
+    """Import time in seconds per top-level package, parsed from -X importtime.
+
+    Each module's self time is charged to its top-level package, so e.g. everything
+    sklearn imports internally shows up as one sklearn line and nothing is counted twice.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=cwd, env=env, capture_output=True, text=True, check=True)
+    totals = {}
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        totals[package] = totals.get(package, 0) + int(self_us) / 1e6
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def probe_env(workdir, db_name):
+    return dict(os.environ, DATABASE_FILE=os.path.join(workdir, db_name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='packages to show in the import profile')
+    parser.add_argument('--max-seconds', type=float, default=None, help='fail if the median import is slower')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # A fresh database per run, so every probe pays for creating and migrating it
+        probes = [run_probe(args.module, BASE_DIR, probe_env(workdir, f'startup-{run}.db'))
+                  for run in range(args.runs)]
+        profile = import_profile(args.module, BASE_DIR, probe_env(workdir, 'profile.db'))
+    seconds = [probe['seconds'] for probe in probes]
+    median = statistics.median(seconds)
+    print(f"import {args.module}: median {median * 1000:.0f} ms, min {min(seconds) * 1000:.0f} ms "
+          f"over {args.runs} runs, peak RSS {max(p['max_rss_kb'] for p in probes) / 1024:.0f} MB")
+
+    print("\nSlowest packages (-X importtime, self time summed per top-level package):")
+    for package, total in profile[:args.top]:
+        print(f"  {total * 1000:8.1f} ms  {package}")
+
+    failures = []
+    heavy = sorted(set().union(*(probe['heavy'] for probe in probes)))
+    if heavy:
+        failures.append(f"heavy modules imported at startup: {', '.join(heavy)}")
+    if args.max_seconds is not None and median > args.max_seconds:
+        failures.append(f"median import took {median:.2f}s, over the {args.max_seconds:.2f}s budget")
+    for failure in failures:
+        print(f"\nFAIL: {failure}")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
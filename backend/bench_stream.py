@@ -0,0 +1,187 @@
+"""Simulates hundreds of /api/stream subscribers against a local server.
+
+Usage:
+    python bench_stream.py [--clients 500] [--server gevent|werkzeug] [--snapshots 3]
+
+Starts the app on a temporary database (gunicorn's gevent worker, as in the
+Dockerfile, or Werkzeug's threaded dev server for comparison), opens --clients
+event streams from a single thread with non-blocking sockets, then saves new
+snapshots and measures how long each one takes to reach every client. Also checks
+that every client received the right delta and reports the server's thread count
+and RSS while all streams are open.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import selectors
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from snapshot_writer import write_snapshot
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TICKERS = [f"T{i:03d}" for i in range(200)]
+
+
+def snapshot_rows(round_number):
+    """Rows for a snapshot where the first round_number * 10 tickers changed since the previous round."""
+    return [(ticker, 10 + (round_number if i < round_number * 10 else 0), 0.5, 'HOLD', ['synthetic comment'])
+            for i, ticker in enumerate(TICKERS)]
+
+
+def start_server(kind, port, env, clients):
+    if kind == 'gevent':
+        command = [sys.executable, '-m', 'gunicorn', '-k', 'gevent', '--worker-connections', str(clients + 100),
+                   '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', 'app:app']
+    else:
+        command = [sys.executable, '-c', 'from werkzeug.serving import run_simple; import app; '
+                   f'run_simple("127.0.0.1", {port}, app.app, threaded=True)']
+    process = subprocess.Popen(command, cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise SystemExit(f"The {kind} server didn't start on port {port}.")
+
+
+def server_stats(pid):
+    """(threads, RSS in MB) summed over the server process and its children."""
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            pids += [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+    threads = rss_kb = 0
+    for process_id in pids:
+        with open(f'/proc/{process_id}/status') as f:
+            for line in f:
+                if line.startswith('Threads:'):
+                    threads += int(line.split()[1])
+                elif line.startswith('VmRSS:'):
+                    rss_kb += int(line.split()[1])
+    return threads, rss_kb / 1024
+
+
+class Client:
+    """One event stream, parsed incrementally."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = b''
+        self.status = None
+        self.events = []  # (arrival time, event name, data)
+
+    def feed(self, data, now):
+        self.buffer += data
+        if self.status is None:
+            if b'\r\n\r\n' not in self.buffer:
+                return
+            headers, self.buffer = self.buffer.split(b'\r\n\r\n', 1)
+            self.status = headers.split(b'\r\n', 1)[0].decode('ascii')
+            if ' 200 ' not in self.status:
+                raise SystemExit(f"Stream request failed: {self.status}")
+        while b'\n\n' in self.buffer:
+            message, self.buffer = self.buffer.split(b'\n\n', 1)
+            fields = dict(line.split(': ', 1) for line in message.decode('utf-8').split('\n')
+                          if ': ' in line and not line.startswith(':'))
+            if 'event' in fields:
+                self.events.append((now, fields['event'], json.loads(fields['data'])))
+
+
+def open_clients(port, count, selector):
+    clients = []
+    request = "GET /api/stream HTTP/1.0\r\nHost: 127.0.0.1\r\nAccept: text/event-stream\r\n\r\n".encode('ascii')
+    for _ in range(count):
+        sock = socket.create_connection(('127.0.0.1', port))
+        sock.sendall(request)
+        sock.setblocking(False)
+        client = Client(sock)
+        selector.register(sock, selectors.EVENT_READ, client)
+        clients.append(client)
+    return clients
+
+
+def pump(selector, until, timeout):
+    """Reads from every socket until until() is true or timeout passes; returns whether it became true."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if until():
+            return True
+        for key, _ in selector.select(timeout=0.05):
+            client = key.data
+            try:
+                data = client.sock.recv(65536)
+            except BlockingIOError:
+                continue
+            if not data:
+                selector.unregister(client.sock)
+                continue
+            client.feed(data, time.monotonic())
+    return until()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--server', choices=['gevent', 'werkzeug'], default='gevent')
+    parser.add_argument('--snapshots', type=int, default=3, help='new snapshots to push')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--poll', type=float, default=0.2, help='STREAM_POLL_SECONDS for the server')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'stream.db')
+        timestamp = int(time.time())
+        with contextlib.redirect_stdout(io.StringIO()):
+            write_snapshot(db_path, snapshot_rows(0), timestamp)
+        env = dict(os.environ, DATABASE_FILE=db_path, STREAM_POLL_SECONDS=str(args.poll),
+                   STREAM_MAX_CLIENTS=str(args.clients + 100), RUN_SUMMARY_PATH=os.path.join(workdir, 'last_run.json'))
+        server = start_server(args.server, args.port, env, args.clients)
+        selector = selectors.DefaultSelector()
+        try:
+            started = time.monotonic()
+            clients = open_clients(args.port, args.clients, selector)
+            if not pump(selector, lambda: all(client.events for client in clients), 60):
+                raise SystemExit(f"Only {sum(bool(c.events) for c in clients)}/{args.clients} clients connected.")
+            print(f"{args.clients} clients got the initial snapshot in {time.monotonic() - started:.2f}s.")
+            threads, rss = server_stats(server.pid)
+            print(f"Server ({args.server}) with every stream open: {threads} threads, {rss:.0f} MB RSS.")
+
+            for round_number in range(1, args.snapshots + 1):
+                expected = len(clients[0].events) + 1
+                timestamp += 3600
+                write_snapshot(db_path, snapshot_rows(round_number), timestamp)
+                written = time.monotonic()
+                if not pump(selector, lambda: all(len(c.events) >= expected for c in clients), 30):
+                    raise SystemExit(f"Only {sum(len(c.events) >= expected for c in clients)}/{args.clients} "
+                                     f"clients received snapshot {round_number}.")
+                latencies = sorted(c.events[-1][0] - written for c in clients)
+                wrong = [c for c in clients if c.events[-1][1] != 'delta'
+                         or c.events[-1][2]['timestamp'] != timestamp
+                         or len(c.events[-1][2]['changed']) != round_number * 10]
+                print(f"Snapshot {round_number}: delta reached all clients in "
+                      f"p50 {latencies[len(latencies) // 2] * 1000:.0f} ms, "
+                      f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.0f} ms, "
+                      f"max {latencies[-1] * 1000:.0f} ms (poll interval {args.poll * 1000:.0f} ms); "
+                      f"{len(wrong)} wrong payloads.")
+                if wrong:
+                    sys.exit(1)
+        finally:
+            for key in list(selector.get_map().values()):
+                key.fileobj.close()
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
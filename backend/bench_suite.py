@@ -0,0 +1,271 @@
+"""End-to-end benchmark suite: every pipeline stage timed on a synthetic Reddit corpus.
+
+Usage:
+    python bench_suite.py [--comments 50000] [--days 30] [--output results.json]
+    python bench_suite.py --save-baseline bench_baseline.json
+    python bench_suite.py --baseline bench_baseline.json [--threshold 1.25]
+
+Stages: ticker extraction (as run_analysis.py builds stock_data), clean_text,
+vectorize + predict (NumPy and sklearn scorers), save_to_db (batched and streaming), and the Flask
+endpoints through the test client against a database holding --days of hourly
+snapshots. Each stage reports its best time over --repeat runs (--api-repeat for endpoints). With --baseline,
+any stage slower than baseline x --threshold is flagged and the exit status is 1.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_ticker_extraction import synthetic_corpus, timed
+from ticker_extraction import BLACKLIST, load_tickers
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_THRESHOLD = 1.25
+
+
+def best_of(repeat, fn, *args):
+    """(result of the last run, best wall time in seconds)."""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        result, elapsed = timed(fn, *args)
+        best = min(best, elapsed)
+    return result, best
+
+
+def record(results, stage, seconds, items):
+    results[stage] = {'seconds': seconds, 'items': items, 'us_per_item': seconds / max(items, 1) * 1e6}
+    print(f"{stage:<28} {seconds * 1000:10.2f} ms  {results[stage]['us_per_item']:10.2f} us/item  ({items} items)")
+
+
+# --- PIPELINE STAGES ---
+
+def build_stock_data(extractor, corpus):
+    """Per-ticker comment lists, as run_analysis.py built them before MentionAggregator.
+
+    Kept here so extraction, cleaning and prediction can be timed as separate stages.
+    """
+    stock_data = {}
+    for comment_text in corpus:
+        for ticker in extractor.extract(comment_text):
+            if ticker not in stock_data:
+                stock_data[ticker] = {"mention_count": 0, "comments": []}
+            stock_data[ticker]["mention_count"] += 1
+            stock_data[ticker]["comments"].append(comment_text)
+    return stock_data
+
+
+def snapshot_rows(stock_data, scores):
+    """Rows as MentionAggregator saves them: a COMMENT_SAMPLE_SIZE sample of comments per ticker."""
+    from aggregation import COMMENT_SAMPLE_SIZE
+    from scoring import normalize_score
+    return [(ticker, info["mention_count"], *normalize_score(float(scores[ticker].mean())),
+             info["comments"][:COMMENT_SAMPLE_SIZE])
+            for ticker, info in stock_data.items() if info["comments"]]
+
+
+def bench_pipeline(results, corpus, repeat, workdir):
+    from numpy_scorer import NUMPY_MODEL_PATH, NumpySentimentModel
+    from scoring import SklearnScorer, load_model
+    from sentiment_analysis import TextCleaner
+    from snapshot_writer import write_snapshot
+    from ticker_extraction import TickerExtractor
+
+    extractor = TickerExtractor(load_tickers(), BLACKLIST)
+    stock_data, seconds = best_of(repeat, build_stock_data, extractor, corpus)
+    record(results, 'extract_tickers', seconds, len(corpus))
+
+    # Every unique mentioned comment once, the way MentionAggregator scores them
+    corpus_index = {}
+    ticker_indices = {ticker: [corpus_index.setdefault(c, len(corpus_index)) for c in info["comments"]]
+                      for ticker, info in stock_data.items()}
+    texts = list(corpus_index)
+    # A fresh cleaner per run, so the stem memo is as cold as at the start of a real run
+    cleaned, seconds = best_of(repeat, lambda: TextCleaner().clean_batch(texts))
+    record(results, 'clean_text', seconds, len(texts))
+
+    scorers = {'numpy': NumpySentimentModel.load(NUMPY_MODEL_PATH),
+               'sklearn': SklearnScorer(*load_model(os.path.join(BASE_DIR, 'sentiment_model.pkl'),
+                                                    os.path.join(BASE_DIR, 'tfidf_vectorizer.pkl')))}
+    for name, scorer in scorers.items():
+        probabilities, seconds = best_of(repeat, scorer.predict_positive, cleaned)
+        record(results, f'vectorize_predict_{name}', seconds, len(cleaned))
+
+    scores = {ticker: probabilities[indices] for ticker, indices in ticker_indices.items()}
+    rows = snapshot_rows(stock_data, scores)
+    db_path = os.path.join(workdir, 'pipeline.db')
+    with contextlib.redirect_stdout(io.StringIO()):
+        write_snapshot(db_path, [], 0)  # migrations aren't part of a save
+        timestamps = iter(range(1, 2 * repeat + 1))
+        _, batched = best_of(repeat, lambda: write_snapshot(db_path, rows, next(timestamps)))
+        _, streamed = best_of(repeat, lambda: write_snapshot(db_path, iter(rows), next(timestamps), stream=True))
+    record(results, 'save_to_db', batched, len(rows))
+    record(results, 'save_to_db_stream', streamed, len(rows))
+
+
+# --- API ---
+
+def seed_history(db_path, tickers, days, seed):
+    """Hourly snapshots for the last `days` days, one row per ticker per snapshot."""
+    from db import connect
+    from migrations import migrate
+    from rollups import rebuild_rollups
+
+    rng = random.Random(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        migrate(db_path)
+    conn = connect(db_path)
+    end = int(time.time()) // 3600 * 3600
+    timestamps = range(end - days * 86400 + 3600, end + 1, 3600)
+    with conn:
+        for ts in timestamps:
+            rows = [(ticker, rng.randint(1, 200), rng.random(), rng.choice(('BUY', 'HOLD', 'SELL')), ts)
+                    for ticker in tickers]
+            conn.executemany("""
+                INSERT INTO ticker_mentions (ticker, mention_count, sentiment_score, sentiment_label, timestamp)
+                VALUES (?, ?, ?, ?, ?)
+            """, rows)
+            conn.execute("INSERT INTO snapshots (timestamp, ticker_count) VALUES (?, ?)", (ts, len(rows)))
+        conn.execute("""
+            INSERT INTO ticker_mention_comments (mention_id, comments)
+            SELECT id, '["synthetic comment"]' FROM ticker_mentions
+        """)
+        rebuild_rollups(conn)
+    conn.close()
+    return len(timestamps)
+
+
+def bench_api(results, tickers, days, repeat, seed, workdir):
+    db_path = os.path.join(workdir, 'api.db')
+    snapshots = seed_history(db_path, tickers, days, seed)
+    print(f"Seeded {snapshots} snapshots x {len(tickers)} tickers.")
+    os.environ['DATABASE_FILE'] = db_path
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as app_module
+    client = app_module.app.test_client()
+    ticker = tickers[0]
+    week_ago = int(time.time()) - 7 * 86400
+    endpoints = {
+        'analyze': '/api/analyze',
+        'history_raw': f'/api/history/{ticker}',
+        'history_week_hourly': f'/api/history/{ticker}?from={week_ago}&resolution=hour',
+        'history_all_auto': f'/api/history/{ticker}?from=0',
+        'history_batch_30': f"/api/history?tickers={','.join(tickers[:30])}&from={week_ago}&resolution=hour",
+        'trending': '/api/trending?limit=5',
+        'movers': '/api/movers?limit=5',
+        'improved': '/api/improved?limit=5',
+        'movers_24h': '/api/movers?limit=5&window=24',
+    }
+
+    def get_uncached(url):
+        app_module.response_cache.clear()
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+
+    def get_cached(url):
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, url in endpoints.items():
+            _, uncached = best_of(repeat, get_uncached, url)
+            _, cached = best_of(repeat, get_cached, url)
+            results[f'api_{name}'] = {'seconds': uncached, 'items': 1, 'us_per_item': uncached * 1e6}
+            results[f'api_{name}_cached'] = {'seconds': cached, 'items': 1, 'us_per_item': cached * 1e6}
+    for name in endpoints:
+        print(f"{'api_' + name:<28} {results['api_' + name]['seconds'] * 1000:10.2f} ms  "
+              f"(cached {results['api_' + name + '_cached']['seconds'] * 1000:.2f} ms)")
+
+
+# --- REPORTING ---
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Prints current vs baseline per stage; returns the stages slower than threshold x baseline."""
+    regressions = []
+    print(f"\n{'stage':<28} {'baseline':>11} {'current':>11} {'ratio':>7}")
+    for stage, current in results.items():
+        previous = baseline['results'].get(stage)
+        if previous is None:
+            print(f"{stage:<28} {'-':>11} {current['us_per_item']:>8.2f} us   (new)")
+            continue
+        ratio = current['us_per_item'] / previous['us_per_item']
+        flag = '  REGRESSION' if ratio > threshold else ''
+        print(f"{stage:<28} {previous['us_per_item']:>8.2f} us {current['us_per_item']:>8.2f} us {ratio:>6.2f}x{flag}")
+        if ratio > threshold:
+            regressions.append(stage)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--comments', type=int, default=50000, help='synthetic comments for the pipeline stages')
+    parser.add_argument('--days', type=int, default=30, help='days of hourly snapshots for the API stage')
+    parser.add_argument('--api-tickers', type=int, default=100, help='tickers per seeded snapshot')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--api-repeat', type=int, default=20, help='requests per endpoint (each takes ~ms)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skip-api', action='store_true')
+    parser.add_argument('--output', metavar='JSON', help='write results here')
+    parser.add_argument('--save-baseline', metavar='JSON', help='write results here as the new baseline')
+    parser.add_argument('--baseline', metavar='JSON', help='compare against this saved baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='flag stages slower than baseline x this (per item)')
+    args = parser.parse_args()
+
+    tickers = load_tickers()
+    print(f"Generating {args.comments} synthetic comments...")
+    corpus = synthetic_corpus(args.comments, tickers, args.seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        bench_pipeline(results, corpus, args.repeat, workdir)
+        if not args.skip_api:
+            bench_api(results, sorted(tickers)[:args.api_tickers], args.days, args.api_repeat, args.seed, workdir)
+
+    report = {
+        'meta': {
+            'created_at': int(time.time()),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'comments': args.comments,
+            'days': args.days,
+            'api_tickers': args.api_tickers,
+            'repeat': args.repeat,
+            'api_repeat': args.api_repeat,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"Wrote {path}.")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) regressed by more than {args.threshold:.2f}x: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\nNo regressions.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Benchmarks TickerExtractor against the old split/strip/set-lookup loop.
+
+Usage: python bench_ticker_extraction.py [--comments 1000000] [--seed 42]
+"""
+import argparse
+import csv
+import gc
+import os
+import random
+import time
+
+from ticker_extraction import BLACKLIST, TickerExtractor, load_tickers
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_sentences():
+    with open(os.path.join(BASE_DIR, 'data.csv'), encoding='latin-1', newline='') as f:
+        reader = csv.reader(f)
+        next(reader)
+        return [row[0] for row in reader]
+
+
+def synthetic_corpus(n, tickers, seed=42):
+    """Reddit-ish comments: sentences from data.csv with tickers and cashtags mixed in."""
+    rng = random.Random(seed)
+    sentences = load_sentences()
+    ticker_list = sorted(tickers)
+    decorations = ['{}', '${}', '{}!', '{}?', '{}.', '${}!!', '{},']
+    corpus = []
+    for _ in range(n):
+        words = rng.choice(sentences).split()
+        for _ in range(rng.choice((0, 1, 1, 2, 3))):
+            mention = rng.choice(decorations).format(rng.choice(ticker_list))
+            words.insert(rng.randrange(len(words) + 1), mention)
+        corpus.append(' '.join(words))
+    return corpus
+
+
+def legacy_extract(texts, tickers, blacklist):
+    """The loop run_analysis.py and scraper.py used before TickerExtractor."""
+    results = []
+    for comment_text in texts:
+        hits = []
+        words = comment_text.upper().split()
+        for word in words:
+            cleaned_word = word.strip('.,?!-$')
+            if cleaned_word in tickers and cleaned_word not in blacklist:
+                hits.append(cleaned_word)
+        results.append(hits)
+    return results
+
+
+def timed(fn, *args):
+    # Like timeit, keep the garbage collector out of the measurement
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        result = fn(*args)
+        return result, time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--comments', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    tickers = load_tickers()
+    # Real subreddits mention blacklisted tickers as cashtags too (e.g. $IT)
+    tickers |= {'IT', 'ON', 'NOW', 'ALL'}
+    print(f"Generating {args.comments} synthetic comments...")
+    corpus = synthetic_corpus(args.comments, tickers, args.seed)
+
+    legacy, legacy_time = timed(legacy_extract, corpus, tickers, BLACKLIST)
+    extractor, compile_time = timed(TickerExtractor, tickers, BLACKLIST)
+    compiled, compiled_time = timed(extractor.extract_batch, corpus)
+    deduped, dedupe_time = timed(extractor.extract_batch, corpus, True)
+    cashtag_extractor = TickerExtractor(tickers, BLACKLIST, cashtags=True)
+    cashtagged, cashtag_time = timed(cashtag_extractor.extract_batch, corpus)
+
+    if compiled != legacy:
+        raise SystemExit("Mismatch between TickerExtractor and the legacy loop!")
+    mentions = sum(len(hits) for hits in compiled)
+    print(f"Mentions found: {mentions} ({sum(len(h) for h in deduped)} after per-comment dedupe, "
+          f"{sum(len(h) for h in cashtagged)} with cashtags)")
+    print(f"Legacy loop:       {legacy_time:.2f}s")
+    print(f"TickerExtractor:   {compiled_time:.2f}s (+{compile_time * 1000:.1f}ms compile)")
+    print(f"  with dedupe:     {dedupe_time:.2f}s")
+    print(f"  with cashtags:   {cashtag_time:.2f}s")
+    print(f"Speedup:           {legacy_time / compiled_time:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""Append-only, compressed, columnar archive of the raw comments each analysis run scraped.
+
+Without it a run's input was gone once its snapshot was saved, so history couldn't be
+re-scored after retraining the model and slow runs couldn't be reproduced offline.
+run_analysis.py now writes one segment per run into ARCHIVE_DIR, named after the
+snapshot it produced, and `run_analysis.py --replay` re-scores segments from disk.
+
+Segment layout: MAGIC, a little-endian uint32 header length and a JSON header (format
+version and column types), then chunks of up to CHUNK_ROWS comments. Each chunk is
+b'CHNK' and a uint32 row count, then for every column in header order a uint32
+compressed size, a uint32 raw size and the zlib-compressed column:
+    'str' columns: the rows' UTF-8 byte lengths as uint32s, then the bytes back to back
+    'f8' columns:  the float64 values
+Readers decompress one chunk at a time and only the columns they ask for, so memory
+stays constant however large a segment grows. A segment is written as a .partial file
+and renamed when its run saves its snapshot, so a crashed run never leaves a segment.
+"""
+import json
+import os
+import struct
+import time
+import zlib
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ARCHIVE_DIR = os.environ.get('COMMENT_ARCHIVE_DIR', os.path.join(BASE_DIR, 'archive'))
+ARCHIVE_ENABLED = os.environ.get('COMMENT_ARCHIVE', '1') != '0'
+MAGIC = b'BULLAIC\x00'
+FORMAT_VERSION = 1
+CHUNK_MAGIC = b'CHNK'
+CHUNK_ROWS = 4096
+COMPRESSION_LEVEL = 6
+
+COLUMNS = (('id', 'str'), ('post_id', 'str'), ('subreddit', 'str'), ('created_utc', 'f8'), ('body', 'str'))
+SEGMENT_PREFIX = 'comments-'
+SEGMENT_SUFFIX = '.cca'
+
+
+def encode_column(kind, values):
+    if kind == 'f8':
+        return np.asarray(values, dtype='<f8').tobytes()
+    encoded = [value.encode('utf-8') for value in values]
+    lengths = np.fromiter(map(len, encoded), dtype='<u4', count=len(encoded))
+    return lengths.tobytes() + b''.join(encoded)
+
+
+def decode_column(kind, raw, rows):
+    if kind == 'f8':
+        return np.frombuffer(raw, dtype='<f8', count=rows).tolist()
+    lengths = np.frombuffer(raw, dtype='<u4', count=rows).tolist()
+    values = []
+    position = rows * 4
+    for length in lengths:
+        values.append(raw[position:position + length].decode('utf-8'))
+        position += length
+    return values
+
+
+def comment_fields(comment):
+    """(id, post_id, subreddit, created_utc, body) of a PRAW or fake_reddit comment."""
+    link_id = getattr(comment, 'link_id', None) or ''
+    subreddit = getattr(comment, 'subreddit', None)
+    return (comment.id, link_id[3:] if link_id.startswith('t3_') else link_id,
+            getattr(subreddit, 'display_name', None) or '', float(comment.created_utc or 0.0), comment.body)
+
+
+class ArchiveWriter:
+    """Buffers one run's comments and writes them to a segment CHUNK_ROWS at a time."""
+
+    def __init__(self, archive_dir=ARCHIVE_DIR, chunk_rows=CHUNK_ROWS, level=COMPRESSION_LEVEL):
+        os.makedirs(archive_dir, exist_ok=True)
+        self.archive_dir = archive_dir
+        self.chunk_rows = chunk_rows
+        self.level = level
+        self.rows = 0
+        self.bytes_written = 0
+        self.buffer = [[] for _ in COLUMNS]
+        self.partial_path = os.path.join(archive_dir, f"run-{os.getpid()}-{time.time_ns()}.partial")
+        self.file = open(self.partial_path, 'wb')
+        header = json.dumps({'version': FORMAT_VERSION, 'columns': [list(column) for column in COLUMNS],
+                             'created_at': time.time()}).encode('utf-8')
+        self._write(MAGIC + struct.pack('<I', len(header)) + header)
+
+    def _write(self, data):
+        self.file.write(data)
+        self.bytes_written += len(data)
+
+    def append(self, comment):
+        for values, value in zip(self.buffer, comment_fields(comment)):
+            values.append(value)
+        if len(self.buffer[0]) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        rows = len(self.buffer[0])
+        if not rows:
+            return
+        parts = [CHUNK_MAGIC + struct.pack('<I', rows)]
+        for (_, kind), values in zip(COLUMNS, self.buffer):
+            raw = encode_column(kind, values)
+            compressed = zlib.compress(raw, self.level)
+            parts.append(struct.pack('<II', len(compressed), len(raw)))
+            parts.append(compressed)
+        self._write(b''.join(parts))
+        self.rows += rows
+        self.buffer = [[] for _ in COLUMNS]
+
+    def commit(self, timestamp):
+        """Finishes the segment as the input of the snapshot saved at timestamp; returns its path."""
+        self.flush()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        path = segment_path(self.archive_dir, timestamp)
+        os.replace(self.partial_path, path)
+        return path
+
+    def discard(self):
+        self.file.close()
+        try:
+            os.remove(self.partial_path)
+        except FileNotFoundError:
+            pass
+
+
+def segment_path(archive_dir, timestamp):
+    return os.path.join(archive_dir, f"{SEGMENT_PREFIX}{int(timestamp)}{SEGMENT_SUFFIX}")
+
+
+def list_segments(archive_dir=ARCHIVE_DIR, since=None, until=None):
+    """[(snapshot timestamp, path)] of the finished segments, oldest first, within [since, until]."""
+    if not os.path.isdir(archive_dir):
+        return []
+    segments = []
+    for name in os.listdir(archive_dir):
+        if not (name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)):
+            continue
+        try:
+            timestamp = int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+        except ValueError:
+            continue
+        if (since is None or timestamp >= since) and (until is None or timestamp <= until):
+            segments.append((timestamp, os.path.join(archive_dir, name)))
+    return sorted(segments)
+
+
+def read_chunks(path, columns=None):
+    """Yields {column: list of values} for each chunk of a segment, decoding only columns.
+
+    columns defaults to all of them. Raises ValueError for a file that isn't a segment
+    or is cut short.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a comment archive segment")
+        header = json.loads(f.read(struct.unpack('<I', f.read(4))[0]))
+        if header['version'] != FORMAT_VERSION:
+            raise ValueError(f"{path} has format version {header['version']}, expected {FORMAT_VERSION}")
+        schema = [tuple(column) for column in header['columns']]
+        wanted = set(columns) if columns is not None else {name for name, _ in schema}
+        missing = wanted - {name for name, _ in schema}
+        if missing:
+            raise ValueError(f"{path} has no column(s) {', '.join(sorted(missing))}")
+        while True:
+            head = f.read(8)
+            if not head:
+                return
+            if len(head) < 8 or head[:4] != CHUNK_MAGIC:
+                raise ValueError(f"{path} is truncated or corrupt at byte {f.tell() - len(head)}")
+            rows = struct.unpack('<I', head[4:])[0]
+            chunk = {}
+            for name, kind in schema:
+                sizes = f.read(8)
+                if len(sizes) < 8:
+                    raise ValueError(f"{path} is truncated in its {name} column")
+                compressed_size, raw_size = struct.unpack('<II', sizes)
+                if name not in wanted:
+                    f.seek(compressed_size, os.SEEK_CUR)
+                    continue
+                try:
+                    raw = zlib.decompress(f.read(compressed_size))
+                except zlib.error as e:
+                    raise ValueError(f"{path} has a corrupt {name} column: {e}") from e
+                if len(raw) != raw_size:
+                    raise ValueError(f"{path} has a corrupt {name} column")
+                chunk[name] = decode_column(kind, raw, rows)
+            yield chunk
+
@@ -0,0 +1,163 @@
+import functools
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+
+from metrics import histogram
+from migrations import migrate
+
+# --- SHARED SQLITE ACCESS LAYER ---
+# WAL lets the Flask readers keep serving while run_analysis.py writes a snapshot,
+# and busy_timeout makes a blocked writer wait instead of raising "database is locked".
+BUSY_TIMEOUT_MS = 5000
+# Statements kept compiled per connection; the routes only use a few dozen distinct queries
+STATEMENT_CACHE_SIZE = 256
+# Connections each Database keeps open and hands out; a caller past the limit waits
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+
+QUERY_SECONDS = histogram('sqlite_query_seconds', 'SQLite statements run through Database, by operation and table.',
+                          ('op', 'statement'))
+_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|JOIN)\s+(\w+)', re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def describe_sql(sql):
+    """A low-cardinality metrics label for a query: its first keyword and first table."""
+    keyword = sql.split(None, 1)[0].lower() if sql.strip() else ''
+    table = _TABLE.search(sql)
+    return f"{keyword} {table.group(1)}" if table else keyword
+
+
+def connect(db_path, check_same_thread=True):
+    """Opens a new connection with the pragmas every reader and writer should use."""
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000, cached_statements=STATEMENT_CACHE_SIZE,
+                           check_same_thread=check_same_thread)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # NORMAL is durable across application crashes in WAL mode and skips an fsync per commit
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    return conn
+
+
+def blocking_call():
+    """A function that runs fn(*args) off the event loop when gevent has patched threading.
+
+    Under gunicorn's gevent worker every request is a greenlet on one OS thread, so a
+    query (or a busy_timeout wait for the write lock) would stall every other request
+    and open /api/stream client. gevent's threadpool runs it on a real thread instead
+    while the calling greenlet yields. Without gevent, calls just run in place.
+    """
+    monkey = sys.modules.get('gevent.monkey')
+    if monkey is not None and monkey.is_module_patched('threading'):
+        import gevent
+        return gevent.get_hub().threadpool.apply
+    return lambda fn, args: fn(*args)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class Database:
+    """A bounded pool of WAL connections, each checked out for one call and then returned.
+
+    Connections are opened lazily up to pool_size and reused (most recently returned
+    first), so sqlite3's compiled statement cache stays warm and the fetch/execute
+    helpers below only pay for parsing a query the first time. The pool is a queue
+    rather than a thread-local because gevent makes threading.local per greenlet,
+    which would open (and leak until GC) a connection for every request.
+    """
+
+    def __init__(self, db_path, pool_size=POOL_SIZE, pool_timeout=POOL_TIMEOUT):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._open_lock = threading.Lock()
+        self._bootstrapped = False
+        self._bootstrap_lock = threading.Lock()
+
+    def bootstrap(self):
+        """Applies pending migrations once per process."""
+        with self._bootstrap_lock:
+            if not self._bootstrapped:
+                migrate(self.db_path)
+                self._bootstrapped = True
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._open_lock:
+            can_open = self._opened < self.pool_size
+            if can_open:
+                self._opened += 1
+        if not can_open:
+            try:
+                return self._idle.get(timeout=self.pool_timeout)
+            except queue.Empty:
+                raise PoolTimeout(f"no free connection to {self.db_path} after {self.pool_timeout}s") from None
+        try:
+            self.bootstrap()
+            # Returned connections may be picked up by another thread next
+            return connect(self.db_path, check_same_thread=False)
+        except Exception:
+            with self._open_lock:
+                self._opened -= 1
+            raise
+
+    @contextmanager
+    def connection(self):
+        """Checks a connection out of the pool for the duration of the block."""
+        conn = self._checkout()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def _run(self, fn, *args):
+        with self.connection() as conn:
+            return blocking_call()(fn, (conn, *args))
+
+    def fetch_all(self, sql, params=()):
+        with QUERY_SECONDS.time(('fetch_all', describe_sql(sql))):
+            return self._run(lambda conn: conn.execute(sql, params).fetchall())
+
+    def fetch_one(self, sql, params=()):
+        with QUERY_SECONDS.time(('fetch_one', describe_sql(sql))):
+            return self._run(lambda conn: conn.execute(sql, params).fetchone())
+
+    def execute(self, sql, params=()):
+        """Runs a single write in its own transaction."""
+        def write(conn):
+            with conn:
+                return conn.execute(sql, params)
+        with QUERY_SECONDS.time(('execute', describe_sql(sql))):
+            return self._run(write)
+
+    def transaction(self, fn):
+        """Runs fn(conn) as one commit, rolling back on error, and returns its result."""
+        def run(conn):
+            with conn:
+                return fn(conn)
+        return self._run(run)
+
+    def close(self):
+        """Closes the pool's idle connections (e.g. before forking or at shutdown)."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+            with self._open_lock:
+                self._opened -= 1
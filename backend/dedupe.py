@@ -0,0 +1,211 @@
+import hashlib
+import os
+import re
+import zlib
+from collections import deque
+from itertools import chain
+
+import numpy as np
+
+from metrics import counter
+
+# --- DUPLICATE AND BOT-SPAM FILTER ---
+# Bots and meme threads post the same comment over and over. Without this filter every
+# copy is cleaned, vectorized and scored, and counted as another mention. The filter is
+# there to keep those counts honest, not to save time: bench_dedupe.py puts it at about
+# 40 us per comment, more than the NumPy scorer spends on the copies it drops, so a run
+# pays a little extra for it. Comments are normalized to lowercase word tokens (no
+# stopwords or stemming), then:
+#   - exact duplicates are caught by a digest of the token string, before any MinHash
+#     work, so only comments that survive this check are MinHashed;
+#   - near-duplicates (a word swapped, an emoji or signature added) by MinHash signatures
+#     over word shingles, bucketed LSH-style in bands so each comment is only compared
+#     with the few earlier ones sharing a band, then kept if the estimated Jaccard
+#     similarity of their shingles is below the threshold.
+# A near-duplicate must also mention the same tickers, so "bought more $GME" and
+# "bought more $AMC" both count. Only the most recent max_tracked distinct comments are
+# remembered, which bounds memory in the long-running worker.
+
+DEDUPE_ENABLED = os.environ.get('DEDUPE', '1') != '0'
+# Estimated shingle Jaccard similarity at which a comment counts as a near-duplicate (0 disables)
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get('DEDUPE_NEAR_THRESHOLD', 0.8))
+MINHASH_PERMUTATIONS = int(os.environ.get('DEDUPE_PERMUTATIONS', 64))
+# 16 bands of 4 rows: pairs above ~0.5 similarity almost always share a band
+LSH_BANDS = int(os.environ.get('DEDUPE_BANDS', 16))
+SHINGLE_SIZE = 3
+# Shorter comments ("GME to the moon") are only dropped as exact duplicates
+MIN_NEAR_DUPLICATE_TOKENS = int(os.environ.get('DEDUPE_MIN_TOKENS', 6))
+MAX_TRACKED = int(os.environ.get('DEDUPE_MAX_TRACKED', 100000))
+# Comments checked per check_batch call in run_analysis.py
+DEDUPE_BATCH_SIZE = 1000
+# Comments whose shingle x permutation hashes are materialized at once (~20 shingles each)
+SIGNATURE_CHUNK = 256
+
+TOKEN_RE = re.compile(r"[a-z0-9$']+")
+# Odd 64-bit multipliers that combine a shingle's token hashes into one value
+SHINGLE_MIX = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0x27D4EB2F165667C5],
+                       dtype=np.uint64)
+
+DROPPED = counter('comments_deduplicated_total', 'Comments dropped before scoring as duplicates, by kind.', ('kind',))
+
+
+def normalize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class CommentDeduper:
+    """Remembers recent comments and reports whether a new one repeats one of them.
+
+    check() returns None for a new comment (which is remembered), or 'exact' / 'near'
+    for a duplicate; check_batch() does the same for many comments and is much cheaper
+    per comment. Counts of each kind accumulate until take_counts().
+    """
+
+    def __init__(self, near_threshold=NEAR_DUPLICATE_THRESHOLD, permutations=MINHASH_PERMUTATIONS,
+                 bands=LSH_BANDS, shingle_size=SHINGLE_SIZE, min_tokens=MIN_NEAR_DUPLICATE_TOKENS,
+                 max_tracked=MAX_TRACKED, seed=1):
+        if permutations % bands:
+            raise ValueError(f"permutations ({permutations}) must be a multiple of bands ({bands})")
+        if not 1 <= shingle_size <= len(SHINGLE_MIX):
+            raise ValueError(f"shingle_size must be between 1 and {len(SHINGLE_MIX)}")
+        self.near_threshold = near_threshold
+        self.permutations = permutations
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self.min_tokens = max(min_tokens, shingle_size)
+        self.max_tracked = max_tracked
+        # One multiply-add hash per permutation, wrapping mod 2**64; the top 32 bits are kept
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(0, 1 << 63, permutations, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.b = rng.integers(0, 1 << 63, permutations, dtype=np.uint64)
+        # Folds each band's rows into one int, a cheaper dict key than the band's bytes
+        self.band_mix = rng.integers(0, 1 << 63, permutations // bands, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.exact_ids = {}  # token digest -> comment id
+        self.buckets = [{} for _ in range(bands)]  # band key -> comment id, per band
+        self.signatures = {}  # comment id -> (signature, tickers)
+        self.tracked = deque()  # (comment id, digest, band keys), oldest first
+        self.next_id = 0
+        self.exact = 0
+        self.near = 0
+
+    def minhash(self, token_lists):
+        """MinHash signatures (uint32 per permutation) of each token list's word shingles.
+
+        Every list needs at least shingle_size tokens. All lists are hashed in one pass,
+        so a batch costs a few NumPy calls rather than a few per comment.
+        """
+        lengths = np.fromiter(map(len, token_lists), dtype=np.int64, count=len(token_lists))
+        # crc32 each distinct token once; comments share most of their words
+        tokens = list(chain.from_iterable(token_lists))
+        vocabulary = dict.fromkeys(tokens)
+        for token in vocabulary:
+            vocabulary[token] = zlib.crc32(token.encode('utf-8'))
+        hashes = np.fromiter(map(vocabulary.__getitem__, tokens), dtype=np.uint64, count=len(tokens))
+        # Start of every shingle that lies within one comment
+        counts = lengths - self.shingle_size + 1
+        shingle_offsets = np.cumsum(counts) - counts
+        within = np.arange(counts.sum()) - np.repeat(shingle_offsets, counts)
+        starts = np.repeat(np.cumsum(lengths) - lengths, counts) + within
+        # Each shingle hashes to a mix of its tokens' hashes, without building the strings
+        shingles = hashes[starts] * SHINGLE_MIX[0]
+        for offset in range(1, self.shingle_size):
+            shingles ^= hashes[starts + offset] * SHINGLE_MIX[offset]
+        result = np.empty((len(token_lists), self.permutations), dtype=np.uint32)
+        for first in range(0, len(token_lists), SIGNATURE_CHUNK):
+            last = min(first + SIGNATURE_CHUNK, len(token_lists))
+            low = shingle_offsets[first]
+            high = shingle_offsets[last - 1] + counts[last - 1]
+            hashed = shingles[low:high, None] * self.a + self.b
+            # The minimum's top bits are the minimum of the top bits, so shift once at the end
+            minimums = np.minimum.reduceat(hashed, shingle_offsets[first:last] - low, axis=0)
+            result[first:last] = minimums >> np.uint64(32)
+        return result
+
+    def check(self, text, tickers=()):
+        return self.check_batch([text], [tickers])[0]
+
+    def check_batch(self, texts, tickers_list):
+        """check() for each comment in turn (so copies within the batch are caught too)."""
+        tokenized = [normalize(text) for text in texts]
+        digests = [hashlib.blake2b(' '.join(tokens).encode('utf-8'), digest_size=16).digest() for tokens in tokenized]
+        # Only comments the exact check can't settle need MinHash: the first copy in the
+        # batch of each text not already remembered, if it is long enough
+        rows = {}
+        if self.near_threshold:
+            for tokens, digest in zip(tokenized, digests):
+                if len(tokens) >= self.min_tokens and digest not in self.exact_ids and digest not in rows:
+                    rows[digest] = tokens
+        if rows:
+            signatures = self.minhash(list(rows.values()))
+            band_keys = self._band_keys(signatures)
+            rows = {digest: row for row, digest in enumerate(rows)}
+        verdicts = []
+        for tokens, digest, tickers in zip(tokenized, digests, tickers_list):
+            if digest in self.exact_ids:
+                self.exact += 1
+                DROPPED.inc(labels=('exact',))
+                verdicts.append('exact')
+                continue
+            if not self.near_threshold or len(tokens) < self.min_tokens:
+                self._remember(digest)
+                verdicts.append(None)
+                continue
+            row = rows.get(digest)
+            if row is None:
+                # Remembered when the batch started but forgotten since to stay under max_tracked
+                signature = self.minhash([tokens])[0]
+                keys = self._band_keys(signature[None])[0]
+            else:
+                signature, keys = signatures[row], band_keys[row]
+            tickers = frozenset(tickers)
+            if self._near_match(signature, tickers, keys):
+                self.near += 1
+                DROPPED.inc(labels=('near',))
+                verdicts.append('near')
+                continue
+            self._remember(digest, keys, signature, tickers)
+            verdicts.append(None)
+        return verdicts
+
+    def _band_keys(self, signatures):
+        return (signatures.reshape(len(signatures), self.bands, -1) * self.band_mix).sum(
+            axis=2, dtype=np.uint64).tolist()
+
+    def _near_match(self, signature, tickers, band_keys):
+        candidates = set(map(dict.get, self.buckets, band_keys))
+        candidates.discard(None)
+        for candidate in candidates:
+            other, other_tickers = self.signatures[candidate]
+            if other_tickers != tickers:
+                continue
+            if np.count_nonzero(other == signature) >= self.near_threshold * self.permutations:
+                return True
+        return False
+
+    def _remember(self, digest, band_keys=(), signature=None, tickers=None):
+        comment_id = self.next_id
+        self.next_id += 1
+        self.exact_ids[digest] = comment_id
+        if signature is not None:
+            self.signatures[comment_id] = (signature, tickers)
+            for buckets, key in zip(self.buckets, band_keys):
+                # Newest wins: a recent copy is the likeliest to be copied again
+                buckets[key] = comment_id
+        self.tracked.append((comment_id, digest, band_keys))
+        if len(self.tracked) > self.max_tracked:
+            self._forget()
+
+    def _forget(self):
+        comment_id, digest, band_keys = self.tracked.popleft()
+        if self.exact_ids.get(digest) == comment_id:
+            del self.exact_ids[digest]
+        self.signatures.pop(comment_id, None)
+        for buckets, key in zip(self.buckets, band_keys):
+            if buckets.get(key) == comment_id:
+                del buckets[key]
+
+    def take_counts(self):
+        """Returns (exact, near) duplicates dropped since the last call and resets them."""
+        counts = (self.exact, self.near)
+        self.exact = self.near = 0
+        return counts
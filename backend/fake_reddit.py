@@ -0,0 +1,131 @@
+"""A local stand-in for the parts of PRAW the analysis uses, served from recorded fixtures.
+
+Fixture format (JSON):
+    {"subreddits": {"stocks": [{"id": "abc", "title": "...", "created_utc": 1.0,
+                                "comments": [{"id": "c1", "body": "...", "created_utc": 1.0}]}]}}
+
+record_fixture() captures that format from a real praw.Reddit client.
+"""
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+
+class FakeComment:
+    def __init__(self, id, body, created_utc=0.0, submission_id=None, subreddit=None):
+        self.id = id
+        self.body = body
+        self.created_utc = created_utc
+        self.link_id = f"t3_{submission_id}" if submission_id else None
+        self.subreddit = SimpleNamespace(display_name=subreddit) if subreddit else None
+
+
+class FakeCommentForest:
+    def __init__(self, comments):
+        self._comments = comments
+
+    def replace_more(self, limit=32):
+        return []
+
+    def list(self):
+        return list(self._comments)
+
+
+class FakeSubmission:
+    def __init__(self, reddit, id, title='', created_utc=0.0, comments=(), subreddit=None):
+        self._reddit = reddit
+        self.id = id
+        self.title = title
+        self.created_utc = created_utc
+        self.num_comments = len(comments)
+        self.subreddit = SimpleNamespace(display_name=subreddit) if subreddit else None
+        self._comments = [
+            FakeComment(c['id'], c['body'], c.get('created_utc', 0.0), id, subreddit) for c in comments
+        ]
+        self._forest = None
+
+    @property
+    def comments(self):
+        # Like PRAW, the first access is the network round-trip that loads the post
+        if self._forest is None:
+            self._reddit._simulate_request()
+            self._forest = FakeCommentForest(self._comments)
+        return self._forest
+
+
+class FakeSubreddit:
+    def __init__(self, reddit, name, posts):
+        self._reddit = reddit
+        self.display_name = name
+        self._posts = posts
+
+    def _listing(self, limit):
+        self._reddit._simulate_request()
+        for post in self._posts[:limit]:
+            yield FakeSubmission(self._reddit, subreddit=self.display_name, **post)
+
+    def new(self, limit=100):
+        return self._listing(limit)
+
+    def hot(self, limit=100):
+        return self._listing(limit)
+
+
+class FakeReddit:
+    """Serves fixture data with an optional per-request latency to mimic the network.
+
+    Safe to share between threads: every call builds fresh objects from the fixture.
+    """
+
+    def __init__(self, fixture, latency=0.0):
+        self.fixture = fixture
+        self.latency = latency
+        self.auth = SimpleNamespace(limits={})
+        self.requests = 0
+        self._requests_lock = threading.Lock()
+        self._posts_by_id = {
+            post['id']: (name, post)
+            for name, posts in fixture['subreddits'].items()
+            for post in posts
+        }
+
+    @classmethod
+    def from_file(cls, path, latency=0.0):
+        with open(path) as f:
+            return cls(json.load(f), latency)
+
+    def _simulate_request(self):
+        with self._requests_lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def subreddit(self, name):
+        return FakeSubreddit(self, name, self.fixture['subreddits'].get(name, []))
+
+    def submission(self, id):
+        name, post = self._posts_by_id[id]
+        return FakeSubmission(self, subreddit=name, **post)
+
+
+def record_fixture(reddit, subreddit_names, path, post_limit=50):
+    """Saves what a real praw.Reddit client returns so runs can be replayed offline."""
+    fixture = {'subreddits': {}}
+    for name in subreddit_names:
+        posts = []
+        for post in reddit.subreddit(name).new(limit=post_limit):
+            post.comments.replace_more(limit=0)
+            posts.append({
+                'id': post.id,
+                'title': post.title,
+                'created_utc': post.created_utc,
+                'comments': [
+                    {'id': c.id, 'body': c.body, 'created_utc': c.created_utc}
+                    for c in post.comments.list()
+                ],
+            })
+        fixture['subreddits'][name] = posts
+    with open(path, 'w') as f:
+        json.dump(fixture, f)
+    return fixture
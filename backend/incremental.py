@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+
+from db import connect
+from migrations import migrate
+
+# --- INCREMENTAL SCRAPING STATE ---
+# Without this, every run re-downloads the newest posts and counts their comments again.
+# We remember which comments were already counted and, per post, how many comments it
+# had and the newest comment's created_utc (its high-water mark).
+
+DEFAULT_WINDOW_HOURS = float(os.environ.get('INCREMENTAL_WINDOW_HOURS', 24))
+# Hard cap on remembered comment ids; the oldest are dropped first
+DEFAULT_MAX_SEEN = int(os.environ.get('INCREMENTAL_MAX_SEEN', 200000))
+
+
+class IncrementalState:
+    """Decides which posts to fetch and which comments are new, then persists what was seen.
+
+    Posts and comments older than the window are skipped, which also bounds the seen-id
+    store: anything older than the window expires because it would be skipped anyway.
+    Nothing is written until commit(), so a run that fails before saving its snapshot
+    will see the same comments again next time.
+    """
+
+    def __init__(self, db_path, window_hours=DEFAULT_WINDOW_HOURS, max_seen=DEFAULT_MAX_SEEN):
+        self.db_path = db_path
+        self.max_seen = max_seen
+        self.now = time.time()
+        self.cutoff = self.now - window_hours * 3600
+        self.lock = threading.Lock()
+        self.skipped_posts = 0
+        self.skipped_comments = 0
+        self._new_seen = {}
+        self._post_updates = {}
+        self._fetched = set()
+
+        migrate(db_path)
+        conn = connect(db_path)
+        try:
+            self.seen = {row[0] for row in conn.execute(
+                "SELECT id FROM seen_comments WHERE created_utc >= ?", (self.cutoff,))}
+            self.posts = {
+                post_id: (num_comments, last_comment_utc)
+                for post_id, num_comments, last_comment_utc in conn.execute(
+                    "SELECT post_id, num_comments, last_comment_utc FROM post_watermarks WHERE created_utc >= ?",
+                    (self.cutoff,))
+            }
+        finally:
+            conn.close()
+
+    def should_fetch(self, post, subreddit_name=None):
+        """False for posts older than the window or whose comment count hasn't grown."""
+        if post.created_utc < self.cutoff:
+            with self.lock:
+                self.skipped_posts += 1
+            return False
+        num_comments = getattr(post, 'num_comments', None)
+        mark = self.posts.get(post.id)
+        with self.lock:
+            if mark is not None and num_comments is not None and mark[0] is not None and num_comments <= mark[0]:
+                self.skipped_posts += 1
+                return False
+            last_comment_utc = mark[1] if mark else 0
+            self._post_updates[post.id] = [subreddit_name, post.created_utc, num_comments, last_comment_utc]
+        return True
+
+    def filter_new(self, post_id, comments):
+        """Returns only comments that are inside the window and weren't counted before."""
+        mark = self.posts.get(post_id)
+        high_water = mark[1] if mark else 0
+        seen = self.seen
+        cutoff = self.cutoff
+        new = []
+        newest = high_water
+        for comment in comments:
+            created = comment.created_utc
+            if created > newest:
+                newest = created
+            # Anything newer than the post's high-water mark can't have been seen yet
+            if created < cutoff or (created <= high_water and comment.id in seen):
+                continue
+            new.append(comment)
+        with self.lock:
+            self.skipped_comments += len(comments) - len(new)
+            for comment in new:
+                self._new_seen[comment.id] = (post_id, comment.created_utc)
+            self._fetched.add(post_id)
+            update = self._post_updates.get(post_id)
+            if update is not None:
+                update[3] = newest
+        return new
+
+    def commit(self):
+        """Persists seen ids and post high-water marks, then expires old entries."""
+        conn = connect(self.db_path)
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO seen_comments (id, post_id, created_utc) VALUES (?, ?, ?)",
+                    [(cid, post_id, created) for cid, (post_id, created) in self._new_seen.items()])
+                conn.executemany("""
+                    INSERT INTO post_watermarks (post_id, subreddit, created_utc, num_comments, last_comment_utc, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (post_id) DO UPDATE SET
+                        num_comments = excluded.num_comments,
+                        last_comment_utc = MAX(last_comment_utc, excluded.last_comment_utc),
+                        updated_at = excluded.updated_at
+                """, [(post_id, sub, created, num, last, int(self.now))
+                      for post_id, (sub, created, num, last) in self._post_updates.items()
+                      # A post whose fetch failed keeps its old mark so it's retried next run
+                      if post_id in self._fetched])
+                conn.execute("DELETE FROM seen_comments WHERE created_utc < ?", (self.cutoff,))
+                conn.execute("DELETE FROM post_watermarks WHERE created_utc < ?", (self.cutoff,))
+                overflow = conn.execute("SELECT COUNT(*) FROM seen_comments").fetchone()[0] - self.max_seen
+                if overflow > 0:
+                    conn.execute("""
+                        DELETE FROM seen_comments WHERE id IN (
+                            SELECT id FROM seen_comments ORDER BY created_utc ASC LIMIT ?
+                        )
+                    """, (overflow,))
+        finally:
+            conn.close()
+        print(f"Incremental: {len(self._new_seen)} new comments, skipped "
+              f"{self.skipped_posts} posts and {self.skipped_comments} comments.")
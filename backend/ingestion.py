@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import ITEMS, counter, histogram
+
+# --- CONCURRENT REDDIT INGESTION ---
+# Fetching a post's comments is one blocking round-trip, so a run over 6 subreddits
+# x 50 posts used to be ~300 serial requests. The ingestor overlaps them across a
+# thread pool while a shared token bucket keeps us inside Reddit's rate limit.
+
+DEFAULT_WORKERS = int(os.environ.get('INGEST_WORKERS', 8))
+# Reddit allows 100 requests per minute per OAuth client, averaged over 10 minutes
+DEFAULT_REQUESTS_PER_SECOND = float(os.environ.get('REDDIT_REQUESTS_PER_SECOND', 100 / 60))
+DEFAULT_BURST = int(os.environ.get('REDDIT_REQUEST_BURST', 60))
+
+REQUEST_SECONDS = histogram('reddit_request_seconds', 'Reddit API round-trips, by request kind.', ('kind',))
+REQUESTS = counter('reddit_requests_total', 'Reddit API requests, by kind and outcome.', ('kind', 'outcome'))
+RATE_LIMIT_WAIT = counter('reddit_rate_limit_wait_seconds_total', 'Time spent waiting on the token bucket.')
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, at most `capacity` banked.
+
+    observe() retunes the rate from the limits Reddit reports in its response
+    headers (exposed by PRAW as reddit.auth.limits), so we slow down as the
+    remaining quota runs low instead of getting throttled.
+    """
+
+    def __init__(self, rate=DEFAULT_REQUESTS_PER_SECOND, capacity=DEFAULT_BURST, min_rate=0.1):
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Blocks until a token is available, then takes it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_for = (1 - self.tokens) / self.rate
+            time.sleep(wait_for)
+            RATE_LIMIT_WAIT.inc(wait_for)
+
+    def observe(self, limits):
+        """Adjusts the rate from a PRAW limits dict ({'remaining', 'reset_timestamp', ...})."""
+        remaining = limits.get('remaining') if limits else None
+        reset_timestamp = limits.get('reset_timestamp') if limits else None
+        if remaining is None or reset_timestamp is None:
+            return
+        reset_in = reset_timestamp - time.time()
+        if reset_in <= 0:
+            return
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.min_rate, remaining / reset_in)
+            self.tokens = min(self.tokens, remaining)
+
+
+class RedditIngestor:
+    """Streams comments from many subreddits, fetching posts concurrently.
+
+    reddit_factory is called once per worker thread to build that thread's client,
+    since PRAW instances are not thread-safe. Pass a factory returning a
+    fake_reddit.FakeReddit to run against recorded fixtures with no network.
+    With an incremental.IncrementalState, unchanged posts aren't fetched at all
+    and only comments not counted by an earlier run are yielded.
+    """
+
+    def __init__(self, reddit_factory, max_workers=DEFAULT_WORKERS, bucket=None, post_limit=50, listing='new',
+                 state=None):
+        self.reddit_factory = reddit_factory
+        self.state = state
+        self.max_workers = max_workers
+        self.bucket = bucket or TokenBucket()
+        self.post_limit = post_limit
+        self.listing = listing
+        self._local = threading.local()
+
+    @property
+    def reddit(self):
+        reddit = getattr(self._local, 'reddit', None)
+        if reddit is None:
+            reddit = self._local.reddit = self.reddit_factory()
+        return reddit
+
+    def _observe_limits(self, reddit):
+        auth = getattr(reddit, 'auth', None)
+        if auth is not None:
+            self.bucket.observe(getattr(auth, 'limits', None))
+
+    def list_posts(self, subreddit_name):
+        """Returns the post ids of a subreddit's listing (one request per 100 posts)."""
+        print(f"Processing subreddit: {subreddit_name}")
+        reddit = self.reddit
+        self.bucket.acquire()
+        listing = getattr(reddit.subreddit(subreddit_name), self.listing)
+        state = self.state
+        # The listing is fetched lazily, so the request happens inside the comprehension
+        with REQUEST_SECONDS.time(('listing',)):
+            try:
+                post_ids = [post.id for post in listing(limit=self.post_limit)
+                            if state is None or state.should_fetch(post, subreddit_name)]
+            except Exception:
+                REQUESTS.inc(labels=('listing', 'error'))
+                raise
+        REQUESTS.inc(labels=('listing', 'ok'))
+        self._observe_limits(reddit)
+        return post_ids
+
+    def load_comments(self, post_id):
+        """Fetches every loaded comment of a post, skipping MoreComments stubs."""
+        reddit = self.reddit
+        self.bucket.acquire()
+        try:
+            with REQUEST_SECONDS.time(('comments',)):
+                post = reddit.submission(id=post_id)
+                post.comments.replace_more(limit=0)
+                comments = post.comments.list()
+        except Exception as e:
+            REQUESTS.inc(labels=('comments', 'error'))
+            print(f"Error fetching comments for post {post_id}: {e}")
+            return []
+        REQUESTS.inc(labels=('comments', 'ok'))
+        self._observe_limits(reddit)
+        ITEMS.inc(len(comments), ('comments_fetched',))
+        if self.state is not None:
+            comments = self.state.filter_new(post_id, comments)
+        return comments
+
+    def iter_comments(self, subreddit_names):
+        """Yields comments as soon as each post's fetch finishes, in completion order."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            listings = {pool.submit(self.list_posts, name) for name in subreddit_names}
+            pending = set(listings)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in listings:
+                        for post_id in future.result():
+                            pending.add(pool.submit(self.load_comments, post_id))
+                    else:
+                        yield from future.result()
@@ -0,0 +1,358 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+from metrics import STAGE_SECONDS, counter, histogram
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locks, so run a single app process there
+    fcntl = None
+
+# --- ANALYSIS JOB SCHEDULER ---
+# /api/trigger-analysis used to Popen a fresh run_analysis.py on every hit, so cron
+# retries or a few refreshes ran overlapping scrapes that fought over Reddit quota and
+# the SQLite write lock. Jobs now go through one scheduler per app process: a trigger
+# for a job that is already queued or running attaches to it (single-flight), the
+# queue is bounded, runs happen one at a time, and each job records how long its
+# stages took.
+#
+# gunicorn runs several app processes, so the job records live in the database's jobs
+# table rather than in memory: a trigger attaches to the active job whichever worker
+# it lands on, and /api/jobs/<id> answers from any worker. Each process polls the table
+# for queued jobs and runs one only while it holds an flock beside the database, so
+# only one job runs at a time; a job still marked running when the lock is free lost
+# its process and is marked failed. A schedule with a lock_path only fires in the one
+# process that holds that lock, and passes to another process if its holder exits.
+
+DEFAULT_MAX_QUEUE = int(os.environ.get('JOB_QUEUE_SIZE', 4))
+# Finished jobs kept for /api/jobs/<id>
+DEFAULT_HISTORY = int(os.environ.get('JOB_HISTORY_SIZE', 100))
+# How often each process checks the jobs table for work queued by another process
+JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', 2))
+LOG_TAIL_LINES = 20
+
+# run_analysis.py prints one of these lines as each stage finishes: "##stage <name> <seconds>"
+STAGE_MARKER = '##stage '
+
+JOB_SECONDS = histogram('job_run_seconds', 'Wall time of finished jobs, by key and status.', ('key', 'status'))
+JOB_QUEUED_SECONDS = histogram('job_queued_seconds', 'Time jobs waited in the queue before starting.', ('key',))
+JOB_TRIGGERS = counter('job_triggers_total', 'Job submissions, by key and result.', ('key', 'result'))
+
+
+@contextmanager
+def report_stage(name):
+    """Times a block of a job script and reports it to the scheduler through stdout."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(seconds, (name,))
+        print(f"{STAGE_MARKER}{name} {seconds:.3f}", flush=True)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class FileLock:
+    """A non-blocking exclusive flock on path, held until release() or the process exits."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def acquire(self):
+        """Takes the lock unless another process holds it; returns whether this one does."""
+        if self.file is not None:
+            return True
+        f = open(self.path, 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                return False
+        self.file = f
+        return True
+
+    def release(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class Job:
+    def __init__(self, key, args):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.args = list(args)
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.stages = []
+        self.triggers = 1
+        self.returncode = None
+        self.error = None
+        self.log_tail = deque(maxlen=LOG_TAIL_LINES)
+        # Called by the runner when there is progress worth saving (e.g. a finished stage)
+        self.on_progress = None
+
+    @classmethod
+    def from_row(cls, row):
+        job = cls.__new__(cls)
+        (job.id, job.key, args, job.status, job.created_at, job.started_at, job.finished_at, stages,
+         job.triggers, job.returncode, job.error, log_tail) = row
+        job.args = json.loads(args)
+        job.stages = [tuple(stage) for stage in json.loads(stages)]
+        job.log_tail = deque(json.loads(log_tail), maxlen=LOG_TAIL_LINES)
+        job.on_progress = None
+        return job
+
+    def to_dict(self):
+        now = time.time()
+        queued_until = self.started_at or now
+        return {
+            'id': self.id,
+            'key': self.key,
+            'args': self.args,
+            'status': self.status,
+            'created_at': round(self.created_at, 3),
+            'started_at': self.started_at and round(self.started_at, 3),
+            'finished_at': self.finished_at and round(self.finished_at, 3),
+            'queued_seconds': round(queued_until - self.created_at, 3),
+            'run_seconds': self.started_at and round((self.finished_at or now) - self.started_at, 3),
+            'stages': [{'name': name, 'seconds': seconds} for name, seconds in self.stages],
+            'triggers': self.triggers,
+            'returncode': self.returncode,
+            'error': self.error,
+            'log_tail': list(self.log_tail),
+        }
+
+
+JOB_COLUMNS = ('id, key, args, status, created_at, started_at, finished_at, stages, triggers, returncode, '
+               'error, log_tail')
+
+
+class JobScheduler:
+    """Runs jobs one at a time, across every process sharing db (a db.Database).
+
+    runner(job) does the work and raises on failure; it may append (name, seconds)
+    pairs to job.stages as it goes. Jobs with the same key are deduplicated while
+    one is queued or running, so submit() returns the existing job instead.
+    on_finish(job), if given, is called in the process that ran the job after it ends.
+    Each process polls the jobs table every poll_interval seconds for queued jobs,
+    and runs one only while it holds the flock on lock_path.
+    """
+
+    def __init__(self, runner, db, lock_path, max_queue=DEFAULT_MAX_QUEUE, history=DEFAULT_HISTORY,
+                 on_finish=None, poll_interval=JOB_POLL_SECONDS):
+        self.runner = runner
+        self.db = db
+        self.run_lock = FileLock(lock_path)
+        self.on_finish = on_finish
+        self.max_queue = max_queue
+        self.history = history
+        self.poll_interval = poll_interval
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.thread_lock = threading.Lock()
+        self.schedules = []
+
+    def _ensure_thread(self):
+        with self.thread_lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='job-scheduler', daemon=True)
+                self.thread.start()
+
+    def start(self):
+        """Starts this process's scheduler thread, so it also runs jobs other processes queued."""
+        self._ensure_thread()
+
+    def submit(self, key='analysis', args=()):
+        """Returns (job, created). Raises QueueFull if a new job can't be queued."""
+        def submit(conn):
+            # IMMEDIATE so two processes can't both miss the active job and queue another
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE key = ? AND status IN ('queued', 'running')",
+                               (key,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET triggers = triggers + 1 WHERE id = ?", (row[0],))
+                job = Job.from_row(row)
+                job.triggers += 1
+                return job, 'attached'
+            queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= self.max_queue:
+                return queued, 'rejected'
+            job = Job(key, args)
+            conn.execute(f"INSERT INTO jobs ({JOB_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                         (job.id, job.key, json.dumps(job.args), job.status, job.created_at, None, None, '[]',
+                          job.triggers, None, None, '[]'))
+            conn.execute("""
+                DELETE FROM jobs WHERE status NOT IN ('queued', 'running')
+                AND id NOT IN (SELECT id FROM jobs ORDER BY created_at DESC LIMIT ?)
+            """, (self.history,))
+            return job, 'queued'
+
+        job, result = self.db.transaction(submit)
+        JOB_TRIGGERS.inc(labels=(key, result))
+        if result == 'rejected':
+            raise QueueFull(f"{job} jobs already queued")
+        if result == 'queued':
+            self._ensure_thread()
+            self.wakeup.set()
+        return job, result == 'queued'
+
+    def get(self, job_id):
+        row = self.db.fetch_one(f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,))
+        return row and Job.from_row(row)
+
+    def recent(self, limit=20):
+        rows = self.db.fetch_all(f"SELECT {JOB_COLUMNS} FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))
+        return [Job.from_row(row) for row in rows]
+
+    def queue_length(self):
+        return self.db.fetch_one("SELECT COUNT(*) FROM jobs WHERE status = 'queued'")[0]
+
+    def _claim(self):
+        """Marks the oldest queued job as running in this process and returns it, holding run_lock."""
+        if not self.run_lock.acquire():
+            return None
+
+        def claim(conn):
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            # run_lock is held for the whole of every run, so if it was free, a job still
+            # marked running lost its process partway through
+            conn.execute("""
+                UPDATE jobs SET status = 'failed', finished_at = ?, error = 'The process running it exited'
+                WHERE status = 'running'
+            """, (now,))
+            row = conn.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                               ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET status = 'running', started_at = ?, owner = ? WHERE id = ?",
+                         (now, self.owner, row[0]))
+            job = Job.from_row(row)
+            job.status = 'running'
+            job.started_at = now
+            return job
+
+        try:
+            job = self.db.transaction(claim)
+        except Exception:
+            self.run_lock.release()
+            raise
+        if job is None:
+            self.run_lock.release()
+        return job
+
+    def _save(self, job):
+        # triggers is left alone: other processes bump it while the job runs
+        self.db.execute("""
+            UPDATE jobs SET status = ?, started_at = ?, finished_at = ?, stages = ?, returncode = ?, error = ?,
+            log_tail = ? WHERE id = ?
+        """, (job.status, job.started_at, job.finished_at, json.dumps(job.stages), job.returncode, job.error,
+              json.dumps(list(job.log_tail)), job.id))
+
+    def _run(self):
+        while True:
+            try:
+                job = self._claim()
+            except Exception as e:
+                print(f"Could not claim a job: {e}")
+                job = None
+            if job is None:
+                self.wakeup.wait(self.poll_interval)
+                self.wakeup.clear()
+                continue
+            JOB_QUEUED_SECONDS.observe(job.started_at - job.created_at, (job.key,))
+            job.on_progress = self._save
+            try:
+                self.runner(job)
+                status = 'succeeded'
+            except Exception as e:
+                job.error = str(e)
+                status = 'failed'
+            try:
+                self._finish(job, status)
+            finally:
+                self.run_lock.release()
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished_at = time.time()
+        self._save(job)
+        JOB_SECONDS.observe(job.finished_at - job.started_at, (job.key, status))
+        if self.on_finish is not None:
+            try:
+                self.on_finish(job)
+            except Exception as e:
+                print(f"on_finish failed for job {job.id}: {e}")
+        print(f"Job {job.id} ({job.key}) {status} in {job.finished_at - job.started_at:.1f}s.")
+
+    def schedule_every(self, interval_seconds, key='analysis', args=(), lock_path=None):
+        """Submits the job every interval_seconds; a still-running previous run absorbs the tick.
+
+        With lock_path, ticks are only submitted by the process holding that lock.
+        """
+        stop = threading.Event()
+        leader = FileLock(lock_path) if lock_path else None
+
+        def loop():
+            while not stop.wait(interval_seconds):
+                if leader is not None and not leader.acquire():
+                    continue
+                try:
+                    self.submit(key, args)
+                except QueueFull as e:
+                    print(f"Skipped scheduled {key} job: {e}")
+                except Exception as e:
+                    print(f"Could not submit scheduled {key} job: {e}")
+
+        thread = threading.Thread(target=loop, name=f'job-schedule-{key}', daemon=True)
+        thread.start()
+        self.schedules.append(stop)
+        return stop
+
+
+def run_script(script, log_path, cwd=None):
+    """Builds a runner that executes a Python script with the job's args.
+
+    Output is appended to log_path under a per-job header, and STAGE_MARKER lines
+    are parsed into job.stages. A non-zero exit status fails the job.
+    """
+    def runner(job):
+        command = [sys.executable, '-u', script, *job.args]
+        with open(log_path, 'a') as log_file:
+            log_file.write(f"=== job {job.id} ({' '.join(command[2:])}) started {time.ctime(job.started_at)} ===\n")
+            log_file.flush()
+            process = subprocess.Popen(command, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       text=True, bufsize=1)
+            for line in process.stdout:
+                log_file.write(line)
+                if line.startswith(STAGE_MARKER):
+                    name, _, seconds = line[len(STAGE_MARKER):].rstrip().rpartition(' ')
+                    try:
+                        job.stages.append((name, float(seconds)))
+                    except ValueError:
+                        continue
+                    if job.on_progress is not None:
+                        job.on_progress(job)
+                else:
+                    job.log_tail.append(line.rstrip('\n'))
+            job.returncode = process.wait()
+        if job.returncode != 0:
+            raise RuntimeError(f"{script} exited with status {job.returncode}")
+    return runner
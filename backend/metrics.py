@@ -0,0 +1,267 @@
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+# --- LIGHTWEIGHT METRICS ---
+# Counters and histograms kept in process memory and rendered in the Prometheus text
+# format by app.py's /metrics. Recording is a dict lookup and an add under a lock, so
+# it stays on in production. With METRICS_ENABLED=0 every metric is NULL_METRIC, whose
+# methods do nothing, and app.py doesn't install its per-request hooks at all.
+
+ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+
+# Seconds; spans a ~1ms cached API response up to a multi-minute Reddit scrape
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Where run_analysis.py leaves a JSON summary of its last run; app.py's /metrics reads it
+RUN_SUMMARY_PATH = os.environ.get('RUN_SUMMARY_PATH',
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), 'last_run.json'))
+# Runs kept in the .jsonl history beside it (~6 weeks of hourly runs); older lines are dropped
+RUN_HISTORY_SIZE = int(os.environ.get('RUN_HISTORY_SIZE', 1000))
+
+_NULL_TIMER = nullcontext()
+
+
+class NullMetric:
+    """Stand-in for every metric while metrics are disabled."""
+
+    def inc(self, amount=1, labels=()):
+        pass
+
+    def observe(self, value, labels=()):
+        pass
+
+    def time(self, labels=()):
+        return _NULL_TIMER
+
+
+NULL_METRIC = NullMetric()
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, self.labels)
+        return False
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, labels=()):
+        """Adds amount for one combination of label values (a tuple ordered like labelnames)."""
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, labels, value) for labels, value in self.values.items()]
+
+    def snapshot(self):
+        with self.lock:
+            return {_snapshot_key(labels): value for labels, value in self.values.items()}
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, labels=()):
+        """Context manager that observes how long its block took."""
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self.lock:
+            values = [(labels, list(counts), total, count) for labels, (counts, total, count) in self.values.items()]
+        samples = []
+        for labels, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                samples.append((f'{self.name}_bucket', labels + (le,), cumulative))
+            samples.append((f'{self.name}_sum', labels, total))
+            samples.append((f'{self.name}_count', labels, count))
+        return samples
+
+    def snapshot(self):
+        with self.lock:
+            return {_snapshot_key(labels): {'count': count, 'sum': round(total, 6)}
+                    for labels, (_, total, count) in self.values.items()}
+
+
+class Callback:
+    """A gauge (or a counter kept elsewhere) whose value(s) are read from fn() at scrape time.
+
+    fn returns a number, None for no sample, or a dict of {label-values tuple: number}.
+    """
+
+    def __init__(self, name, help, fn, labelnames=(), kind='gauge'):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+
+    def _values(self):
+        values = self.fn()
+        if values is None:
+            return {}
+        return values if isinstance(values, dict) else {(): values}
+
+    def samples(self):
+        return [(self.name, labels, value) for labels, value in self._values().items()]
+
+    def snapshot(self):
+        return {_snapshot_key(labels): value for labels, value in self._values().items()}
+
+
+class Registry:
+    def __init__(self, enabled=ENABLED):
+        self.enabled = enabled
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _register(self, metric):
+        with self.lock:
+            # Modules can be imported more than once (e.g. app reloads); keep the first
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(name, help, labelnames)) if self.enabled else NULL_METRIC
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets)) if self.enabled else NULL_METRIC
+
+    def callback(self, name, help, fn, labelnames=(), kind='gauge'):
+        return self._register(Callback(name, help, fn, labelnames, kind)) if self.enabled else NULL_METRIC
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            labelnames = metric.labelnames + (('le',) if metric.kind == 'histogram' else ())
+            for sample_name, labels, value in metric.samples():
+                names = labelnames if sample_name.endswith('_bucket') else metric.labelnames
+                label_text = _label_text(names, labels)
+                lines.append(f'{sample_name}{{{label_text}}} {_format_value(value)}' if label_text
+                             else f'{sample_name} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """Plain dict of every metric, for JSON run summaries."""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _snapshot_key(values):
+    return ','.join(str(value) for value in values) or 'total'
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+callback = REGISTRY.callback
+
+# --- SHARED PIPELINE METRICS ---
+# Used by run_analysis.py, worker.py and the modules they call
+STAGE_SECONDS = histogram('analysis_stage_seconds', 'Time spent per analysis pipeline stage.', ('stage',))
+ITEMS = counter('analysis_items_total', 'Items processed by the analysis pipeline.', ('kind',))
+SCORING_SECONDS = histogram('scoring_seconds', 'Time spent per scoring step (clean, vectorize, predict) per batch.',
+                            ('step',))
+
+
+# --- RUN SUMMARIES ---
+
+def write_run_summary(summary, path=RUN_SUMMARY_PATH, history_size=RUN_HISTORY_SIZE):
+    """Replaces path with summary atomically and appends it to the .jsonl history beside it.
+
+    The history keeps the last history_size runs, rewritten atomically once it's full.
+    """
+    line = json.dumps(summary, sort_keys=True) + '\n'
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        f.write(line)
+    os.replace(tmp_path, path)
+    history_path = os.path.splitext(path)[0] + '_history.jsonl'
+    try:
+        with open(history_path) as f:
+            history = deque(f, maxlen=history_size)
+    except FileNotFoundError:
+        history = deque(maxlen=history_size)
+    if len(history) < history_size:
+        with open(history_path, 'a') as f:
+            f.write(line)
+        return
+    history.append(line)
+    tmp_path = f"{history_path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        f.writelines(history)
+    os.replace(tmp_path, history_path)
+
+
+def read_run_summary(path=RUN_SUMMARY_PATH):
+    """The last run's summary, or None if there isn't a readable one."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,260 @@
+import sqlite3
+
+from rollups import rebuild_rollups
+
+# --- VERSIONED SCHEMA MIGRATIONS ---
+# The applied version is stored in SQLite's PRAGMA user_version. Each migration
+# runs in its own transaction together with the version bump, so a crash or a
+# second process starting at the same time can never leave a half-applied step.
+
+
+def create_base_tables(conn):
+    # The tables app.py and run_analysis.py used to create on their own
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ticker_mentions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ticker TEXT,
+            mention_count INTEGER,
+            comments TEXT,
+            sentiment_score REAL,
+            sentiment_label TEXT,
+            timestamp INTEGER
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sentiment_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ticker TEXT NOT NULL,
+            sentiment_score REAL NOT NULL,
+            mention_count INTEGER NOT NULL,
+            timestamp DATETIME NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_favorites (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            ticker TEXT NOT NULL,
+            UNIQUE(user_id, ticker)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_watchlist (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            ticker TEXT NOT NULL,
+            UNIQUE(user_id, ticker)
+        )
+    """)
+
+
+def create_ticker_mentions_indexes(conn):
+    # /api/history filters by ticker and sorts by timestamp; /api/analyze filters by timestamp
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ticker_mentions_ticker_ts ON ticker_mentions (ticker, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ticker_mentions_ts ON ticker_mentions (timestamp)")
+
+
+def create_snapshots(conn):
+    # One row per analysis run, so "latest snapshot" never needs to scan ticker_mentions
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS snapshots (
+            timestamp INTEGER PRIMARY KEY,
+            ticker_count INTEGER NOT NULL
+        )
+    """)
+    conn.execute("""
+        INSERT OR IGNORE INTO snapshots (timestamp, ticker_count)
+        SELECT timestamp, COUNT(*) FROM ticker_mentions
+        WHERE timestamp IS NOT NULL
+        GROUP BY timestamp
+    """)
+
+
+def move_comments_out_of_ticker_mentions(conn):
+    # The JSON comment blobs are only needed for display/re-scoring, so they live in
+    # their own table and scans of ticker_mentions stop reading megabytes of text.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ticker_mention_comments (
+            mention_id INTEGER PRIMARY KEY REFERENCES ticker_mentions (id),
+            comments TEXT NOT NULL
+        )
+    """)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(ticker_mentions)")]
+    if 'comments' not in columns:
+        return
+    conn.execute("""
+        INSERT OR IGNORE INTO ticker_mention_comments (mention_id, comments)
+        SELECT id, comments FROM ticker_mentions WHERE comments IS NOT NULL
+    """)
+    # Rebuild rather than DROP COLUMN so this also works on older SQLite builds
+    conn.execute("""
+        CREATE TABLE ticker_mentions_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ticker TEXT,
+            mention_count INTEGER,
+            sentiment_score REAL,
+            sentiment_label TEXT,
+            timestamp INTEGER
+        )
+    """)
+    conn.execute("""
+        INSERT INTO ticker_mentions_new (id, ticker, mention_count, sentiment_score, sentiment_label, timestamp)
+        SELECT id, ticker, mention_count, sentiment_score, sentiment_label, timestamp FROM ticker_mentions
+    """)
+    conn.execute("DROP TABLE ticker_mentions")
+    conn.execute("ALTER TABLE ticker_mentions_new RENAME TO ticker_mentions")
+    create_ticker_mentions_indexes(conn)
+
+
+def create_incremental_scrape_state(conn):
+    # Seen comment ids and per-post high-water marks for run_analysis.py --incremental
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS seen_comments (
+            id TEXT PRIMARY KEY,
+            post_id TEXT NOT NULL,
+            created_utc REAL NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_seen_comments_created ON seen_comments (created_utc)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS post_watermarks (
+            post_id TEXT PRIMARY KEY,
+            subreddit TEXT,
+            created_utc REAL NOT NULL,
+            num_comments INTEGER,
+            last_comment_utc REAL NOT NULL DEFAULT 0,
+            updated_at INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+
+
+def create_sentiment_rollups(conn):
+    # Hourly/daily/weekly aggregates for /api/history range queries, backfilled from history
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sentiment_rollups (
+            resolution TEXT NOT NULL,
+            ticker TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            score_sum REAL NOT NULL,
+            mention_sum INTEGER NOT NULL,
+            sample_count INTEGER NOT NULL,
+            PRIMARY KEY (resolution, ticker, bucket)
+        ) WITHOUT ROWID
+    """)
+    rebuild_rollups(conn)
+
+
+def unique_ticker_mentions_per_snapshot(conn):
+    # snapshot_writer upserts on (ticker, timestamp), which needs a unique index. Keep the
+    # newest row of any duplicates an older writer left behind, then recount the rollups.
+    duplicates = """
+        SELECT id FROM ticker_mentions
+        WHERE ticker IS NOT NULL AND timestamp IS NOT NULL
+          AND id NOT IN (SELECT MAX(id) FROM ticker_mentions GROUP BY ticker, timestamp)
+    """
+    conn.execute(f"DELETE FROM ticker_mention_comments WHERE mention_id IN ({duplicates})")
+    removed = conn.execute(f"DELETE FROM ticker_mentions WHERE id IN ({duplicates})").rowcount
+    conn.execute("DROP INDEX IF EXISTS idx_ticker_mentions_ticker_ts")
+    conn.execute("CREATE UNIQUE INDEX idx_ticker_mentions_ticker_ts ON ticker_mentions (ticker, timestamp)")
+    if removed:
+        rebuild_rollups(conn)
+
+
+def add_snapshot_duplicate_counts(conn):
+    # How many comments each run dropped as exact / near-duplicates before scoring
+    conn.execute("ALTER TABLE snapshots ADD COLUMN exact_duplicates INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE snapshots ADD COLUMN near_duplicates INTEGER NOT NULL DEFAULT 0")
+
+
+def create_snapshot_generation(conn):
+    # Bumped by every snapshot write, including a replay rewriting an old timestamp, so the
+    # API's caches and /api/stream can tell the data changed when MAX(timestamp) didn't
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS snapshot_generation (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            generation INTEGER NOT NULL
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO snapshot_generation (id, generation) VALUES (1, 0)")
+
+
+def create_jobs(conn):
+    # Analysis job records, shared by every app process so a trigger or a /api/jobs poll
+    # sees the same jobs whichever gunicorn worker handles it
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            key TEXT NOT NULL,
+            args TEXT NOT NULL,
+            status TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            stages TEXT NOT NULL DEFAULT '[]',
+            triggers INTEGER NOT NULL DEFAULT 1,
+            returncode INTEGER,
+            error TEXT,
+            log_tail TEXT NOT NULL DEFAULT '[]',
+            owner TEXT
+        )
+    """)
+    # At most one queued or running job per key
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_key ON jobs(key)
+        WHERE status IN ('queued', 'running')
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs(created_at)")
+
+
+# Append only: never reorder or edit a migration that has shipped.
+MIGRATIONS = [
+    create_base_tables,
+    create_ticker_mentions_indexes,
+    create_snapshots,
+    move_comments_out_of_ticker_mentions,
+    create_incremental_scrape_state,
+    create_sentiment_rollups,
+    unique_ticker_mentions_per_snapshot,
+    add_snapshot_duplicate_counts,
+    create_snapshot_generation,
+    create_jobs,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(db_path):
+    """Brings the database at db_path up to SCHEMA_VERSION and returns the version."""
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+    try:
+        version = get_schema_version(conn)
+        while version < SCHEMA_VERSION:
+            # IMMEDIATE takes the write lock up front; re-read the version in case
+            # another process migrated while we were waiting for it.
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = get_schema_version(conn)
+                if version < SCHEMA_VERSION:
+                    migration = MIGRATIONS[version]
+                    migration(conn)
+                    version += 1
+                    conn.execute(f"PRAGMA user_version = {version}")
+                    print(f"Applied migration {version} ({migration.__name__}) to {db_path}.")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return version
+    finally:
+        conn.close()
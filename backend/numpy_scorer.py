@@ -0,0 +1,258 @@
+"""Scores text with the trained TF-IDF + LogisticRegression model using NumPy only.
+
+sentiment_analysis.train_model() exports the fitted vocabulary, IDF weights,
+coefficients and intercept to sentiment_model.bin next to the pickles. Loading that
+needs neither sklearn nor joblib, and scoring skips sklearn's per-call validation,
+which dominates for the small batches the streaming worker scores.
+
+The file is memory-mapped read-only rather than read into each process, so every
+gunicorn worker (and the streaming worker) shares one copy of the pages through the
+OS page cache. The vocabulary is a sorted array searched with np.searchsorted instead
+of a per-process dict. A new model is published by writing a temp file and
+os.replace()-ing it over the old one; ReloadingScorer notices and switches over.
+
+File layout: MAGIC, a little-endian uint64 header length, a JSON header (settings plus
+dtype/shape/offset of each array), then each array's raw bytes at a 64-byte boundary.
+
+Usage (re-export from existing pickles): python numpy_scorer.py [--out sentiment_model.bin]
+"""
+import argparse
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+
+import numpy as np
+
+from metrics import SCORING_SECONDS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+NUMPY_MODEL_PATH = os.path.join(BASE_DIR, 'sentiment_model.bin')
+MAGIC = b'BULLAIM\x00'
+FORMAT_VERSION = 2
+ALIGNMENT = 64
+# Seconds between checks for a replaced model file
+DEFAULT_RELOAD_INTERVAL = float(os.environ.get('MODEL_RELOAD_INTERVAL', 5))
+
+
+class NumpySentimentModel:
+    """TfidfVectorizer.transform + LogisticRegression.predict_proba[:, 1], in NumPy.
+
+    Supports what train_model and train.py fit: word n-grams from a token pattern,
+    optional lowercasing, raw or sublinear term frequencies, IDF weights, L2 row
+    normalization and a binary classifier.
+    `terms` must be sorted; `columns[i]` is the feature column of `terms[i]`.
+    """
+
+    def __init__(self, terms, columns, idf, coef, intercept, token_pattern, lowercase=True, idf_coef=None,
+                 ngram_range=(1, 1), sublinear_tf=False):
+        self.terms = terms
+        self.columns = columns
+        self.idf = idf
+        self.coef = coef
+        self.intercept = float(intercept)
+        self.token_pattern = token_pattern
+        self.lowercase = lowercase
+        self.ngram_range = tuple(ngram_range)
+        self.sublinear_tf = sublinear_tf
+        # idf * coef per column, so the dot product needs one multiply per term
+        self.idf_coef = idf * coef if idf_coef is None else idf_coef
+        self._tokenize = re.compile(token_pattern).findall
+
+    @classmethod
+    def from_sklearn(cls, model, vectorizer):
+        params = vectorizer.get_params()
+        unsupported = {
+            'analyzer': params['analyzer'] != 'word',
+            'tokenizer': params['tokenizer'] is not None,
+            'preprocessor': params['preprocessor'] is not None,
+            'stop_words': params['stop_words'] is not None,
+            'strip_accents': params['strip_accents'] is not None,
+            'binary': params['binary'],
+            'norm': params['norm'] != 'l2',
+            'use_idf': not params['use_idf'],
+            'classes': list(model.classes_) != [0, 1],
+        }
+        bad = [name for name, is_bad in unsupported.items() if is_bad]
+        if bad:
+            raise ValueError(f"Can't export a model using: {', '.join(bad)}")
+        terms, columns = zip(*sorted(vectorizer.vocabulary_.items()))
+        # One character wider than the longest term: a longer token cast to this width is
+        # cut to max + 1 characters, so it can never equal a term
+        width = max(len(term) for term in terms) + 1
+        return cls(np.array(terms, dtype=f'U{width}'), np.array(columns, dtype=np.int64),
+                   np.asarray(vectorizer.idf_, dtype=np.float64), np.asarray(model.coef_[0], dtype=np.float64),
+                   model.intercept_[0], params['token_pattern'], params['lowercase'],
+                   ngram_range=params['ngram_range'], sublinear_tf=params['sublinear_tf'])
+
+    def save(self, path):
+        """Writes the model to path atomically: readers see the old file or the new one."""
+        arrays = {'terms': self.terms, 'columns': self.columns, 'idf': self.idf, 'coef': self.coef,
+                  'idf_coef': self.idf_coef}
+        header = {'version': FORMAT_VERSION, 'intercept': self.intercept,
+                  'token_pattern': self.token_pattern, 'lowercase': self.lowercase,
+                  'ngram_range': list(self.ngram_range), 'sublinear_tf': self.sublinear_tf, 'arrays': {}}
+        # Offsets depend on the header's length, so lay out with a guess and redo until it fits
+        data_start = 0
+        while True:
+            offset = data_start
+            for name, array in arrays.items():
+                offset = -(-offset // ALIGNMENT) * ALIGNMENT
+                header['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+                offset += array.nbytes
+            header_bytes = json.dumps(header).encode('utf-8')
+            needed = -(-(len(MAGIC) + 8 + len(header_bytes)) // ALIGNMENT) * ALIGNMENT
+            if needed == data_start:
+                break
+            data_start = needed
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC + struct.pack('<Q', len(header_bytes)) + header_bytes)
+            for name, array in arrays.items():
+                f.write(b'\0' * (header['arrays'][name]['offset'] - f.tell()))
+                f.write(np.ascontiguousarray(array).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Memory-maps a saved model read-only; the arrays are views into the shared pages."""
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a NumPy sentiment model")
+            header = json.loads(f.read(struct.unpack('<Q', f.read(8))[0]))
+            if header['version'] != FORMAT_VERSION:
+                raise ValueError(f"{path} has format version {header['version']}, expected {FORMAT_VERSION}")
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        arrays = {}
+        for name, spec in header['arrays'].items():
+            count = int(np.prod(spec['shape']))
+            arrays[name] = np.frombuffer(mapped, dtype=np.dtype(spec['dtype']), count=count,
+                                         offset=spec['offset']).reshape(spec['shape'])
+        return cls(arrays['terms'], arrays['columns'], arrays['idf'], arrays['coef'], header['intercept'],
+                   header['token_pattern'], header['lowercase'], arrays['idf_coef'],
+                   header.get('ngram_range', (1, 1)), header.get('sublinear_tf', False))
+
+    def lookup(self, tokens):
+        """Feature columns of tokens (-1 for out-of-vocabulary ones), by binary search."""
+        terms = self.terms
+        # Comments repeat words a lot, so only each distinct token is searched for
+        distinct = {}
+        ids = [distinct.setdefault(token, len(distinct)) for token in tokens]
+        candidates = np.array(list(distinct), dtype=terms.dtype)
+        positions = np.minimum(np.searchsorted(terms, candidates), len(terms) - 1)
+        columns = np.where(terms[positions] == candidates, self.columns[positions], -1)
+        return columns[np.array(ids, dtype=np.int64)]
+
+    def decision_function(self, texts):
+        """Logits for already-cleaned texts."""
+        started = time.perf_counter()
+        tokenize = self._tokenize
+        lowercase = self.lowercase
+        min_n, max_n = self.ngram_range
+        tokens = []
+        lengths = []
+        for text in texts:
+            found = tokenize(text.lower() if lowercase else text)
+            if max_n > 1:
+                found = word_ngrams(found, min_n, max_n)
+            tokens.extend(found)
+            lengths.append(len(found))
+        n = len(texts)
+        if not tokens:
+            return np.full(n, self.intercept)
+        columns = self.lookup(tokens)
+        rows = np.repeat(np.arange(n, dtype=np.int64), lengths)
+        known = columns >= 0
+        if not known.any():
+            return np.full(n, self.intercept)
+        # Collapse repeated (row, column) pairs into term counts, as CountVectorizer does
+        width = len(self.idf)
+        keys, counts = np.unique(rows[known] * width + columns[known], return_counts=True)
+        rows, columns = np.divmod(keys, width)
+        tf = 1.0 + np.log(counts) if self.sublinear_tf else counts
+        vectorized = time.perf_counter()
+        SCORING_SECONDS.observe(vectorized - started, ('vectorize',))
+        tfidf = tf * self.idf[columns]
+        norms = np.sqrt(np.bincount(rows, weights=tfidf * tfidf, minlength=n))
+        dots = np.bincount(rows, weights=tf * self.idf_coef[columns], minlength=n)
+        # An empty row stays all zeros under L2 normalization, leaving just the intercept
+        with np.errstate(invalid='ignore', divide='ignore'):
+            logits = np.where(norms > 0, dots / norms, 0.0) + self.intercept
+        SCORING_SECONDS.observe(time.perf_counter() - vectorized, ('predict',))
+        return logits
+
+    def predict_positive(self, texts):
+        """P(positive) for already-cleaned texts, matching predict_proba(...)[:, 1]."""
+        return 1.0 / (1.0 + np.exp(-self.decision_function(texts)))
+
+
+def word_ngrams(tokens, min_n, max_n):
+    """The n-grams CountVectorizer builds from a token list, each joined with a space."""
+    ngrams = list(tokens) if min_n == 1 else []
+    for n in range(max(min_n, 2), min(max_n, len(tokens)) + 1):
+        ngrams.extend(' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+    return ngrams
+
+
+class ReloadingScorer:
+    """A NumpySentimentModel that switches to a replaced model file on its own.
+
+    At most every `interval` seconds, scoring stats the file; if it was replaced
+    (new inode, mtime or size), the new file is mapped and used for later calls.
+    Calls already running keep the old mapping, which is released once they finish.
+    """
+
+    def __init__(self, path, interval=DEFAULT_RELOAD_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.signature = self._signature()
+        self.model = NumpySentimentModel.load(path)
+        self.checked = time.monotonic()
+
+    def _signature(self):
+        stat = os.stat(self.path)
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def current(self):
+        now = time.monotonic()
+        if now - self.checked >= self.interval:
+            with self.lock:
+                if now - self.checked >= self.interval:
+                    self.checked = now
+                    try:
+                        signature = self._signature()
+                        if signature != self.signature:
+                            self.model = NumpySentimentModel.load(self.path)
+                            self.signature = signature
+                            print(f"Reloaded sentiment model from {self.path}.")
+                    except (OSError, ValueError) as e:
+                        print(f"Keeping the current model; couldn't reload {self.path}: {e}")
+        return self.model
+
+    def predict_positive(self, texts):
+        return self.current().predict_positive(texts)
+
+
+def export_model(model, vectorizer, path=NUMPY_MODEL_PATH):
+    NumpySentimentModel.from_sklearn(model, vectorizer).save(path)
+    print(f"Exported NumPy model to {path}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the pickled model for NumPy-only scoring.")
+    parser.add_argument('--model', default=os.path.join(BASE_DIR, 'sentiment_model.pkl'))
+    parser.add_argument('--vectorizer', default=os.path.join(BASE_DIR, 'tfidf_vectorizer.pkl'))
+    parser.add_argument('--out', default=NUMPY_MODEL_PATH)
+    args = parser.parse_args()
+    import joblib
+    export_model(joblib.load(args.model), joblib.load(args.vectorizer), args.out)
+
+
+if __name__ == '__main__':
+    main()
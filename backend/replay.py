@@ -0,0 +1,74 @@
+import os
+import time
+from multiprocessing import Pool
+
+from aggregation import MentionAggregator
+from comment_archive import read_chunks
+from dedupe import CommentDeduper
+from scoring import load_scorer
+from snapshot_writer import write_snapshot
+from ticker_extraction import TickerExtractor
+
+# --- ARCHIVE REPLAY ---
+# `run_analysis.py --replay` re-scores archived runs (see comment_archive.py) instead of
+# scraping: each segment goes through the same extract -> dedupe -> aggregate steps as a
+# live run and its snapshot is saved again at the original timestamp, replacing the old
+# one. Segments are independent, so they're scored in a pool of processes (each loading
+# the memory-mapped model once) while this process writes the snapshots in order.
+# Only one chunk per segment is in memory at a time, and results are a row per ticker.
+
+# Set by init_worker in each pool process (or directly when replaying in-process)
+_extractor = None
+_scorer = None
+_dedupe = True
+
+
+def init_worker(tickers, blacklist, model_paths, dedupe=True):
+    global _extractor, _scorer, _dedupe
+    _extractor = TickerExtractor(tickers, blacklist)
+    _scorer = load_scorer(*model_paths)
+    _dedupe = dedupe
+
+
+def rescore_segment(path):
+    """Returns (rows, comments read, exact duplicates, near duplicates) for one segment."""
+    aggregator = MentionAggregator(_scorer)
+    deduper = CommentDeduper() if _dedupe else None
+    comments = 0
+    for chunk in read_chunks(path, ('body',)):
+        bodies = chunk['body']
+        comments += len(bodies)
+        pairs = [(body, mentioned) for body, mentioned in zip(bodies, _extractor.extract_batch(bodies)) if mentioned]
+        if deduper is not None and pairs:
+            verdicts = deduper.check_batch([body for body, _ in pairs], [mentioned for _, mentioned in pairs])
+            pairs = [pair for pair, verdict in zip(pairs, verdicts) if verdict is None]
+        for body, mentioned in pairs:
+            aggregator.add(body, mentioned)
+    exact, near = deduper.take_counts() if deduper is not None else (0, 0)
+    return aggregator.rows(), comments, exact, near
+
+
+def save_results(segments, results, db_path):
+    started = time.perf_counter()
+    snapshots = comments = 0
+    for (timestamp, path), (rows, count, exact, near) in zip(segments, results):
+        # Writes stay in this process: SQLite takes one writer at a time anyway
+        # replace: tickers the old scoring found but this one doesn't must go too
+        write_snapshot(db_path, rows, timestamp, exact_duplicates=exact, near_duplicates=near, replace=True)
+        snapshots += 1
+        comments += count
+        print(f"Replayed {os.path.basename(path)}: {count} comments, {len(rows)} tickers "
+              f"({snapshots}/{len(segments)}, {time.perf_counter() - started:.1f}s).")
+    return snapshots, comments
+
+
+def replay(segments, db_path, tickers, blacklist, model_paths, workers=None, dedupe=True):
+    """Re-scores [(timestamp, path)] segments into db_path; returns (snapshots, comments) replayed."""
+    workers = min(workers or os.cpu_count() or 1, len(segments))
+    init_args = (tickers, blacklist, model_paths, dedupe)
+    paths = [path for _, path in segments]
+    if workers > 1:
+        with Pool(workers, initializer=init_worker, initargs=init_args) as pool:
+            return save_results(segments, pool.imap(rescore_segment, paths), db_path)
+    init_worker(*init_args)
+    return save_results(segments, map(rescore_segment, paths), db_path)
@@ -0,0 +1,56 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+# --- SNAPSHOT-AWARE RESPONSE CACHE ---
+# The API's data only changes when run_analysis.py saves a snapshot, so JSON bodies
+# are built once per snapshot and reused by every visitor. Entries are keyed on the
+# snapshot generation, which every write bumps (a replay rewriting an old snapshot
+# too): once it moves, everything cached for the old one is dropped, which is how a
+# run in another process invalidates this cache.
+
+
+class SnapshotCache:
+    """Bounded LRU of pre-serialized response bodies and their ETags."""
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.snapshot = None
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, snapshot, key, build):
+        """Returns (body, etag) for key at snapshot, calling build() -> bytes on a miss.
+
+        If build() returns None (e.g. an error response) nothing is cached and
+        (None, None) is returned.
+        """
+        with self.lock:
+            if snapshot != self.snapshot:
+                self.entries.clear()
+                self.snapshot = snapshot
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        # Built outside the lock so one slow query doesn't block every other endpoint
+        body = build()
+        if body is None:
+            return None, None
+        etag = f"{snapshot}-{hashlib.blake2b(body, digest_size=8).hexdigest()}"
+        with self.lock:
+            if snapshot == self.snapshot:
+                self.entries[key] = (body, etag)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+        return body, etag
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.snapshot = None
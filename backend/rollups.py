@@ -0,0 +1,86 @@
+# --- TIME-BUCKETED SENTIMENT ROLLUPS ---
+# sentiment_rollups keeps, per ticker and bucket, the sum of scores, sum of mentions
+# and number of snapshots, so a year of history is ~52 weekly rows instead of ~8700
+# hourly ones. Sums (not means) are stored so each new snapshot is a cheap upsert.
+# mention_sum adds snapshots' mention counts, which assumes snapshots don't overlap
+# (see the leaderboard notes in app.py).
+
+# Bucket width in seconds per resolution
+RESOLUTIONS = {
+    'hour': 3600,
+    'day': 86400,
+    'week': 7 * 86400,
+}
+# The epoch fell on a Thursday; shifting by 4 days makes weekly buckets start on Monday (UTC)
+BUCKET_OFFSETS = {
+    'hour': 0,
+    'day': 0,
+    'week': 4 * 86400,
+}
+# resolution=auto picks the finest rollup that keeps a chart under this many points
+MAX_AUTO_POINTS = 500
+
+
+def bucket_start(timestamp, resolution):
+    size = RESOLUTIONS[resolution]
+    offset = BUCKET_OFFSETS[resolution]
+    return timestamp - (timestamp - offset) % size
+
+
+def pick_resolution(start, end):
+    """The finest rollup resolution that covers [start, end] in at most MAX_AUTO_POINTS buckets."""
+    span = max(0, end - start)
+    for resolution, size in RESOLUTIONS.items():
+        if span / size <= MAX_AUTO_POINTS:
+            return resolution
+    return 'week'
+
+
+def update_rollups(conn, rows, timestamp):
+    """Adds one snapshot's (ticker, sentiment_score, mention_count) rows to every rollup."""
+    params = [
+        (resolution, ticker, bucket_start(timestamp, resolution), score, mentions)
+        for resolution in RESOLUTIONS
+        for ticker, score, mentions in rows
+    ]
+    conn.executemany("""
+        INSERT INTO sentiment_rollups (resolution, ticker, bucket, score_sum, mention_sum, sample_count)
+        VALUES (?, ?, ?, ?, ?, 1)
+        ON CONFLICT (resolution, ticker, bucket) DO UPDATE SET
+            score_sum = score_sum + excluded.score_sum,
+            mention_sum = mention_sum + excluded.mention_sum,
+            sample_count = sample_count + 1
+    """, params)
+
+
+def remove_from_rollups(conn, rows, timestamp):
+    """Takes back rows previously added by update_rollups, e.g. before a snapshot's row is overwritten."""
+    params = [
+        (score, mentions, resolution, ticker, bucket_start(timestamp, resolution))
+        for resolution in RESOLUTIONS
+        for ticker, score, mentions in rows
+    ]
+    conn.executemany("""
+        UPDATE sentiment_rollups
+        SET score_sum = score_sum - ?, mention_sum = mention_sum - ?, sample_count = sample_count - 1
+        WHERE resolution = ? AND ticker = ? AND bucket = ?
+    """, params)
+    # A bucket with no snapshots left would divide by zero in /api/history
+    conn.executemany("""
+        DELETE FROM sentiment_rollups WHERE resolution = ? AND ticker = ? AND bucket = ? AND sample_count <= 0
+    """, [row[2:] for row in params])
+
+
+def rebuild_rollups(conn):
+    """Recomputes every rollup from ticker_mentions (used to backfill existing history)."""
+    conn.execute("DELETE FROM sentiment_rollups")
+    for resolution, size in RESOLUTIONS.items():
+        offset = BUCKET_OFFSETS[resolution]
+        conn.execute("""
+            INSERT INTO sentiment_rollups (resolution, ticker, bucket, score_sum, mention_sum, sample_count)
+            SELECT ?, ticker, timestamp - ((timestamp - ?) % ?) AS bucket,
+                   SUM(sentiment_score), SUM(mention_count), COUNT(*)
+            FROM ticker_mentions
+            WHERE ticker IS NOT NULL AND timestamp IS NOT NULL AND sentiment_score IS NOT NULL
+            GROUP BY ticker, bucket
+        """, (resolution, offset, size))
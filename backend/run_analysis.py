@@ -1,136 +1,207 @@
 import praw
-import pandas as pd
+import atexit
 import os
 import time
-import sqlite3
-import json
-import joblib
-from sentiment_analysis import clean_text
+import argparse
+from datetime import datetime, timezone
+from ticker_extraction import BLACKLIST, SUBREDDIT_NAMES, TickerExtractor, load_tickers
+from ingestion import RedditIngestor
+from incremental import IncrementalState, DEFAULT_WINDOW_HOURS
+from scoring import load_scorer
+from aggregation import MentionAggregator
+from dedupe import DEDUPE_BATCH_SIZE, DEDUPE_ENABLED, CommentDeduper
+from comment_archive import ARCHIVE_DIR, ARCHIVE_ENABLED, ArchiveWriter, list_segments
+from replay import replay
+from snapshot_writer import write_snapshot
+from jobs import report_stage
+from metrics import ITEMS, REGISTRY, STAGE_SECONDS, write_run_summary
 from dotenv import load_dotenv
 load_dotenv()
 
-import sys
-
 # Always use absolute paths relative to this script
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, 'sentiment_history.db')
 MODEL_PATH = os.path.join(BASE_DIR, 'sentiment_model.pkl')
 VECTORIZER_PATH = os.path.join(BASE_DIR, 'tfidf_vectorizer.pkl')
+NUMPY_MODEL_PATH = os.path.join(BASE_DIR, 'sentiment_model.bin')
 
-# Load tickers
-def load_tickers_from_csv(filename):
+def parse_time(value):
+    """A Unix timestamp or an ISO date/datetime (UTC unless it says otherwise)."""
     try:
-        abs_path = filename if os.path.isabs(filename) else os.path.join(BASE_DIR, filename)
-        if os.path.exists(abs_path):
-            df = pd.read_csv(abs_path)
-        else:
-            print(f"Error: The file {abs_path} was not found.")
-            return set()
-        tickers = set(df['Symbol'].unique())
-        return tickers
-    except Exception as e:
-        print(f"Error loading tickers: {e}")
-        return set()
-
-# Add extra tickers
-tickers = load_tickers_from_csv('sp500_companies.csv')
-extra_tickers = {"GME", "AMC", "BTC", "ETH", "SOL", "DOGE", "CRCL", "XRP", "SUI"}
-tickers.update(extra_tickers)
-
-# Load model and vectorizer
-model = joblib.load(MODEL_PATH)
-vectorizer = joblib.load(VECTORIZER_PATH)
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        return (parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)).timestamp()
 
 # Reddit API setup
-reddit = praw.Reddit(
-    client_id=os.environ.get('CLIENT_ID'),
-    client_secret=os.environ.get('CLIENT_SECRET'),
-    user_agent=os.environ.get('USER_AGENT'),
-)
-
-subreddit_names = ["stocks", "stockmarket", "investing", "wallstreetbets",
-                  "cryptocurrency", "ethereum"]
-
-one_hour_ago = time.time() - 3600
-stock_data = {}
-
-stopwords = {
-    "A", "I", "IT", "AND", "THE", "TO", "OF", "IN", "ON", "FOR", "IS", "AT", "BY", "AN", "OR", "AS", "BE", "ARE", "WITH", "FROM", "THIS", "THAT", "BUT", "NOT", "SO", "DO", "IF", "NO", "YES", "ALL", "ANY", "CAN", "WAS", "HAS", "HAVE", "WILL", "JUST", "ABOUT", "OUT", "UP", "DOWN", "OVER", "UNDER", "MORE", "LESS", "THAN", "THEN", "NOW", "ONE", "TWO", "THREE", "FOUR", "FIVE", "SIX", "SEVEN", "EIGHT", "NINE", "TEN", "WELL", "DAY"
-}
-
-for subreddit_name in subreddit_names:
-    print(f"Processing subreddit: {subreddit_name}")
-    subreddit = reddit.subreddit(subreddit_name)
-    for post in subreddit.new(limit=50):
-        post.comments.replace_more(limit=0)
-        for comment in post.comments.list():
-            comment_text = comment.body
-            words = comment_text.upper().split()
-            for word in words:
-                cleaned_word = word.strip('.,?!-$')
-                if cleaned_word in tickers and cleaned_word not in stopwords:
-                    if cleaned_word not in stock_data:
-                        stock_data[cleaned_word] = {
-                            "mention_count": 0,
-                            "comments": []
-                        }
-                    stock_data[cleaned_word]["mention_count"] += 1
-                    stock_data[cleaned_word]["comments"].append(comment_text)
+def make_reddit():
+    # Called once per ingestion thread, since PRAW clients aren't thread-safe
+    return praw.Reddit(
+        client_id=os.environ.get('CLIENT_ID'),
+        client_secret=os.environ.get('CLIENT_SECRET'),
+        user_agent=os.environ.get('USER_AGENT'),
+    )
+
+# --- RUN SUMMARY ---
+# Written when the process exits, so a failed run is recorded too
+def record_run_summary(run):
+    @atexit.register
+    def save_run_summary():
+        run['finished_at'] = time.time()
+        run['seconds'] = round(run['finished_at'] - run['started_at'], 3)
+        run['metrics'] = REGISTRY.snapshot()
+        try:
+            write_run_summary(run)
+        except OSError as e:
+            print(f"Couldn't write the run summary: {e}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scrape Reddit, score ticker sentiment and save a snapshot.")
+    parser.add_argument('--incremental', action='store_true', default=os.environ.get('INCREMENTAL_SCRAPE') == '1',
+                        help="only count comments not seen by a previous run (or set INCREMENTAL_SCRAPE=1)")
+    parser.add_argument('--window-hours', type=float, default=DEFAULT_WINDOW_HOURS,
+                        help="with --incremental, ignore posts and comments older than this")
+    parser.add_argument('--no-dedupe', action='store_true', default=not DEDUPE_ENABLED,
+                        help="score and count duplicate / bot-spam comments too (or set DEDUPE=0)")
+    parser.add_argument('--no-archive', action='store_true', default=not ARCHIVE_ENABLED,
+                        help="don't save this run's raw comments to the archive (or set COMMENT_ARCHIVE=0)")
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR, help="where raw comment segments are kept")
+    parser.add_argument('--replay', action='store_true',
+                        help="re-score archived runs instead of scraping, replacing their snapshots")
+    parser.add_argument('--since', type=parse_time, help="with --replay, only runs at or after this time")
+    parser.add_argument('--until', type=parse_time, help="with --replay, only runs at or before this time")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="with --replay, processes scoring runs in parallel")
+    return parser.parse_args()
+
+
+# --- REPLAY MODE ---
+# Re-scores archived runs (e.g. after retraining the model) without touching Reddit
+def replay_archive(args, run, tickers):
+    segments = list_segments(args.archive_dir, args.since, args.until)
+    print(f"Replaying {len(segments)} archived runs from {args.archive_dir} with {args.workers} workers.")
+    with report_stage('replay'):
+        snapshots, comment_count = replay(segments, DB_PATH, tickers, BLACKLIST,
+                                          (MODEL_PATH, VECTORIZER_PATH, NUMPY_MODEL_PATH),
+                                          workers=args.workers, dedupe=not args.no_dedupe)
+    ITEMS.inc(comment_count, ('comments_processed',))
+    run['comments'] = comment_count
+    run['snapshots'] = snapshots
+    run['status'] = 'succeeded'
+    print("Replay complete and saved.")
+
 
 # Sentiment analysis and DB save
-def save_to_db(data, db_path):
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS ticker_mentions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            ticker TEXT,
-            mention_count INTEGER,
-            comments TEXT,
-            sentiment_score REAL,
-            sentiment_label TEXT,
-            timestamp INTEGER
-        )
-    """)
+def save_to_db(data, db_path, exact_duplicates=0, near_duplicates=0):
+    """Returns the new snapshot's timestamp, or None if there was nothing to save."""
     now = int(time.time())
-    for ticker, info in data.items():
-        comments = info["comments"]
-        if not comments:
-            continue
-        cleaned_comments = [clean_text(c) for c in comments]
-        X_new = vectorizer.transform(cleaned_comments)
-        probabilities = model.predict_proba(X_new)
-        positive_probabilities = probabilities[:, 1]
-        sentiment_score_raw = float(positive_probabilities.mean())
-        # Normalize sentiment score: 0.55 -> 0, 0.8 -> 1
-        if sentiment_score_raw >= 0.8:
-            sentiment_score = 1.0
-        elif sentiment_score_raw <= 0.55:
-            sentiment_score = 0.0
-        else:
-            sentiment_score = (sentiment_score_raw - 0.55) / (0.8 - 0.55)
-        sentiment_score = max(0.0, min(1.0, sentiment_score))  # Clamp to [0,1]
-        # Map min/max to .03/.97
-        if sentiment_score == 0.0:
-            sentiment_score = 0.03
-        elif sentiment_score == 1.0:
-            sentiment_score = 0.97
-        if sentiment_score > 0.6:
-            sentiment_label = "BUY"
-            box_color = "linear-gradient(90deg, #a21caf 0%, #43ff7b 100%)"  # half purple, half bright green
-        elif sentiment_score < 0.3:
-            sentiment_label = "SELL"
-            box_color = "linear-gradient(90deg, #a21caf 0%, #ff2e2e 100%)"  # half purple, half bright red
-        else:
-            sentiment_label = "HOLD"
-            box_color = "linear-gradient(90deg, #a21caf 0%, #ffe600 100%)"  # half purple, half bright yellow
-        c.execute("""
-            INSERT INTO ticker_mentions (ticker, mention_count, comments, sentiment_score, sentiment_label, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (ticker, info["mention_count"], json.dumps(comments), sentiment_score, sentiment_label, now))
-    conn.commit()
-    conn.close()
-    print(f"Saved tickers to DB.")
-
-save_to_db(stock_data, DB_PATH)
-print("Analysis complete and saved.")
+    written = write_snapshot(db_path, data.rows(), now,
+                             exact_duplicates=exact_duplicates, near_duplicates=near_duplicates)
+    if not written:
+        # e.g. an incremental run where every comment was already counted
+        print("No ticker mentions to save; keeping the previous snapshot.")
+        return None
+    print(f"Saved {written} tickers to DB.")
+    return now
+
+
+def analyze(args, run, tickers):
+    extractor = TickerExtractor(tickers, BLACKLIST)
+
+    # Load model and vectorizer
+    with report_stage('load_model'):
+        scorer = load_scorer(MODEL_PATH, VECTORIZER_PATH, NUMPY_MODEL_PATH)
+
+    # Posts are fetched concurrently; comments stream in as each post finishes loading
+    state = IncrementalState(DB_PATH, args.window_hours) if args.incremental else None
+    # Per-ticker counts, running sentiment sums and a sample of comments; see aggregation.py
+    stock_data = MentionAggregator(scorer)
+    # Repeated and near-identical comments are dropped before they're scored or counted
+    deduper = None if args.no_dedupe else CommentDeduper()
+    dedupe_seconds = 0.0
+    # Every scraped comment, with or without a ticker, so a later model or ticker list can re-score it
+    archive = None if args.no_archive else ArchiveWriter(args.archive_dir)
+    if archive is not None:
+        # Removes the unfinished segment if the run dies before its snapshot is saved
+        atexit.register(archive.discard)
+
+    def add_unique(batch):
+        """Adds the (comment, tickers) pairs in batch that aren't duplicates to stock_data."""
+        nonlocal dedupe_seconds
+        started = time.perf_counter()
+        verdicts = deduper.check_batch([text for text, _ in batch], [mentioned for _, mentioned in batch])
+        dedupe_seconds += time.perf_counter() - started
+        for (text, mentioned), verdict in zip(batch, verdicts):
+            if verdict is None:
+                # Also scores a batch of comments every SCORE_BATCH_SIZE new ones
+                stock_data.add(text, mentioned)
+
+    with report_stage('ingest'):
+        ingestor = RedditIngestor(make_reddit, post_limit=50, state=state)
+        # Extraction and dedupe run between fetches, so their share of the stage is summed separately
+        extract_seconds = 0.0
+        comment_count = 0
+        # Comments with tickers waiting for the duplicate filter, which checks them in batches
+        unchecked = []
+        for comment in ingestor.iter_comments(SUBREDDIT_NAMES):
+            comment_text = comment.body
+            comment_count += 1
+            if archive is not None:
+                archive.append(comment)
+            started = time.perf_counter()
+            mentioned = extractor.extract(comment_text)
+            extract_seconds += time.perf_counter() - started
+            # Comments without a ticker are never scored, so they skip the filter too
+            if not mentioned:
+                continue
+            if deduper is None:
+                stock_data.add(comment_text, mentioned)
+                continue
+            unchecked.append((comment_text, mentioned))
+            if len(unchecked) >= DEDUPE_BATCH_SIZE:
+                add_unique(unchecked)
+                unchecked = []
+        if unchecked:
+            add_unique(unchecked)
+        STAGE_SECONDS.observe(extract_seconds, ('extract',))
+        if deduper is not None:
+            STAGE_SECONDS.observe(dedupe_seconds, ('dedupe',))
+        ITEMS.inc(comment_count, ('comments_processed',))
+    run['comments'] = comment_count
+    run['unique_comments'] = len(stock_data.comment_index)
+    run['tickers'] = len(stock_data)
+    exact_duplicates, near_duplicates = deduper.take_counts() if deduper is not None else (0, 0)
+    run['duplicates'] = {'exact': exact_duplicates, 'near': near_duplicates}
+
+    with report_stage('score_and_save'):
+        snapshot_timestamp = save_to_db(stock_data, DB_PATH, exact_duplicates, near_duplicates)
+    if archive is not None and snapshot_timestamp is None:
+        # No snapshot to name the segment after, and replaying it would create one
+        archive.discard()
+    elif archive is not None:
+        # Named after the snapshot, so --replay can save it back to the same timestamp
+        run['archive'] = archive.commit(snapshot_timestamp)
+        run['archive_bytes'] = archive.bytes_written
+    if state is not None:
+        # Only mark comments as seen once their snapshot is safely saved
+        with report_stage('commit_state'):
+            state.commit()
+    run['status'] = 'succeeded'
+    print("Analysis complete and saved.")
+
+
+def main():
+    args = parse_args()
+    run = {'started_at': time.time(), 'status': 'failed', 'incremental': args.incremental, 'replay': args.replay}
+    record_run_summary(run)
+    tickers = load_tickers()
+    if args.replay:
+        replay_archive(args, run, tickers)
+    else:
+        analyze(args, run, tickers)
+
+
+# Under spawn/forkserver, replay's pool processes import this module, so nothing may run at import time
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+import os
+
+from metrics import ITEMS, SCORING_SECONDS
+from sentiment_analysis import clean_texts
+
+# --- SENTIMENT SCORING ---
+# Shared by run_analysis.py (batch runs) and worker.py (streaming), so both turn model
+# probabilities into the same 0-1 score and BUY/HOLD/SELL label.
+
+
+class SklearnScorer:
+    """Scores cleaned texts with the pickled vectorizer and classifier."""
+
+    def __init__(self, model, vectorizer):
+        self.model = model
+        self.vectorizer = vectorizer
+
+    def predict_positive(self, texts):
+        # One sparse matrix and one predict_proba call for the whole batch
+        with SCORING_SECONDS.time(('vectorize',)):
+            features = self.vectorizer.transform(texts)
+        with SCORING_SECONDS.time(('predict',)):
+            return self.model.predict_proba(features)[:, 1]
+
+
+def load_model(model_path, vectorizer_path):
+    """Loads the trained classifier and TF-IDF vectorizer saved by sentiment_analysis.train_model."""
+    import joblib
+    return joblib.load(model_path), joblib.load(vectorizer_path)
+
+
+def load_scorer(model_path, vectorizer_path, numpy_model_path=None, reload=False):
+    """The NumPy-only scorer when its exported artifact exists, else the sklearn pickles.
+
+    The NumPy model is memory-mapped, so processes loading it share its pages. With
+    reload=True (long-running processes) it also picks up a replaced model file.
+    Set SENTIMENT_SCORER=sklearn to always use the pickles.
+    """
+    if (numpy_model_path and os.path.exists(numpy_model_path)
+            and os.environ.get('SENTIMENT_SCORER', 'numpy') != 'sklearn'):
+        from numpy_scorer import NumpySentimentModel, ReloadingScorer
+        if reload:
+            return ReloadingScorer(numpy_model_path)
+        return NumpySentimentModel.load(numpy_model_path)
+    return SklearnScorer(*load_model(model_path, vectorizer_path))
+
+
+def positive_probabilities(texts, scorer):
+    """Cleans and scores texts, returning P(positive) for each."""
+    with SCORING_SECONDS.time(('clean',)):
+        cleaned = clean_texts(texts)
+    ITEMS.inc(len(cleaned), ('texts_scored',))
+    return scorer.predict_positive(cleaned)
+
+
+def normalize_score(sentiment_score_raw):
+    """Maps a mean positive probability to the (score, label) shown on the site."""
+    # Normalize sentiment score: 0.55 -> 0, 0.8 -> 1
+    if sentiment_score_raw >= 0.8:
+        sentiment_score = 1.0
+    elif sentiment_score_raw <= 0.55:
+        sentiment_score = 0.0
+    else:
+        sentiment_score = (sentiment_score_raw - 0.55) / (0.8 - 0.55)
+    sentiment_score = max(0.0, min(1.0, sentiment_score))  # Clamp to [0,1]
+    # Map min/max to .03/.97
+    if sentiment_score == 0.0:
+        sentiment_score = 0.03
+    elif sentiment_score == 1.0:
+        sentiment_score = 0.97
+    if sentiment_score > 0.6:
+        sentiment_label = "BUY"
+    elif sentiment_score < 0.3:
+        sentiment_label = "SELL"
+    else:
+        sentiment_label = "HOLD"
+    return sentiment_score, sentiment_label
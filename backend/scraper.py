@@ -2,11 +2,14 @@ import praw
 import config
 import pandas as pd
 import os
+from ticker_extraction import TickerExtractor
+from aggregation import COMMENT_SAMPLE_SIZE, ReservoirSample
 
 
 # A dictionary to store aggregated data
 # The key will be the stock ticker (e.g., "TSLA")
-# The value will be another dictionary holding the mention count and a list of all comments
+# The value will be another dictionary holding the mention count and a fixed-size
+# random sample of its comments (every comment would grow without bound on busy days)
 stock_data = {}
 
 ticker_blacklist = {
@@ -41,6 +44,7 @@ def load_tickers_from_csv(filename):
 tickers = load_tickers_from_csv('sp500_companies.csv')
 extra_tickers = {"GME", "AMC", "BTC", "ETH", "SOL", "DOGE", "CRCL", "XRP", "SUI"}
 tickers.update(extra_tickers)
+extractor = TickerExtractor(tickers, ticker_blacklist)
 
 reddit = praw.Reddit(
     client_id=config.CLIENT_ID,
@@ -68,23 +72,18 @@ for subreddit_name in subreddit_names:
         print("  --- COMMENTS ---")
         for comment in post.comments.list():
             comment_text = comment.body
-            words = comment_text.upper().split()
-
-            for word in words:
-                # Remove punctuation from the word
-                cleaned_word = word.strip('.,?!-$')
-                if cleaned_word in tickers and cleaned_word not in ticker_blacklist:
-                    # This is a ticker we are tracking!
-
-                    # If we've never seen this ticker before, add it to our dictionary
-                    if cleaned_word not in stock_data:
-                        stock_data[cleaned_word] = {
-                            "mention_count": 0,
-                            "comments": []
-                        }
-
-                    # Now, update the data for this ticker
-                    stock_data[cleaned_word]["mention_count"] += 1
-                    stock_data[cleaned_word]["comments"].append(comment_text)
+
+            # Every ticker we are tracking that this comment mentions
+            for ticker in extractor.extract(comment_text):
+                # If we've never seen this ticker before, add it to our dictionary
+                if ticker not in stock_data:
+                    stock_data[ticker] = {
+                        "mention_count": 0,
+                        "comments": ReservoirSample(COMMENT_SAMPLE_SIZE)
+                    }
+
+                # Now, update the data for this ticker
+                stock_data[ticker]["mention_count"] += 1
+                stock_data[ticker]["comments"].add(comment_text)
 
 
@@ -1,41 +1,84 @@
-import pandas as pd
+import os
 import re
-from nltk.corpus import stopwords
-from nltk.stem import PorterStemmer
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import accuracy_score
-import joblib # Used to save model
+from functools import lru_cache
+
+# nltk, pandas and sklearn are imported where they're used, so importing clean_text
+# (e.g. from the API or the streaming worker) doesn't pull in the training stack.
 
 
 #Step 1: Data Cleaning
 # This function will clean text data by:
 # Removing special characters, converting to lowercase, tokenizing, removing stopwords, and stemming.
 
-def clean_text(text):
-    # Remove special characters and numbers
-    text = re.sub(r'[^a-zA-Z\s]', '', text, re.I|re.A)
+# Precompiled once instead of on every comment.
+NON_ALPHA_RE = re.compile(r'[^a-zA-Z\s]')
+# The original cleaner passed `re.I|re.A` positionally, which re.sub treats as
+# `count`, so only the first 258 special characters get removed. We keep that
+# behaviour so cleaned text (and therefore model scores) stays identical.
+NON_ALPHA_MAX_SUBS = re.I | re.A
+
+# Reddit vocabulary is very repetitive, so a bounded memo of token -> stem
+# skips most of the PorterStemmer work.
+STEM_CACHE_SIZE = 50000
+
+# Part of train.py's cleaned-corpus cache key: bump it whenever clean() output changes.
+CLEANER_VERSION = 1
+
+
+class TextCleaner:
+    """Holds the stopword set, stemmer and stem memo so they are built once."""
+
+    def __init__(self, stem_cache_size=STEM_CACHE_SIZE):
+        from nltk.corpus import stopwords
+        from nltk.stem import PorterStemmer
+
+        self.stop_words = frozenset(stopwords.words('english'))
+        self.stemmer = PorterStemmer()
+        self.stem = lru_cache(maxsize=stem_cache_size)(self.stemmer.stem)
+
+    def clean(self, text):
+        text = NON_ALPHA_RE.sub('', text, NON_ALPHA_MAX_SUBS)
+        stop_words = self.stop_words
+        stem = self.stem
+        return " ".join([stem(w) for w in text.lower().split() if w not in stop_words])
+
+    def clean_batch(self, texts):
+        """Cleans a list or iterator of texts, returning a list in the same order."""
+        clean = self.clean
+        return [clean(t) for t in texts]
 
-    #convert to lowercase
-    text = text.lower()
 
-    #tokenize text
-    words = text.split()
+_default_cleaner = None
 
-    # Remove stopwords (common words like 'the', 'is', etc.)
-    stop_words = set(stopwords.words('english'))
-    words = [w for w in words if not w in stop_words]
-    # Stemming (reducing words to their root form, e.g., 'running' -> 'run')
-    stemmer = PorterStemmer()
-    words = [stemmer.stem(w) for w in words]
-    # Join words back into a single string
-    return " ".join(words)
+def get_cleaner():
+    # Built lazily so importing this module doesn't need the nltk corpus yet.
+    global _default_cleaner
+    if _default_cleaner is None:
+        _default_cleaner = TextCleaner()
+    return _default_cleaner
+
+
+def clean_text(text):
+    # Remove special characters and numbers, lowercase, tokenize,
+    # remove stopwords (common words like 'the', 'is', etc.) and stem
+    # (e.g., 'running' -> 'run'), then join words back into a single string.
+    return get_cleaner().clean(text)
+
+
+def clean_texts(texts):
+    """Batch version of clean_text for a list or iterator of texts."""
+    return get_cleaner().clean_batch(texts)
 
 
 # Training a Sentiment Analysis Model
 
 def train_model():
+    import pandas as pd
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.model_selection import train_test_split
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import accuracy_score
+
     #load dataset
     df = pd.read_csv('data.csv', encoding='latin-1', names=['text', 'sentiment'])
 
@@ -43,7 +86,7 @@ def train_model():
     df = df[df.sentiment.isin(['positive', 'negative'])]
 
     #apply cleaning function to the df
-    df['cleaned_text'] = df['text'].apply(clean_text)
+    df['cleaned_text'] = clean_texts(df['text'])
 
     #Convert positive and negative sentiments to binary values
     df['sentiment'] = df['sentiment'].map({'positive': 1, 'negative': 0})
@@ -70,11 +113,19 @@ def train_model():
     # --- 5. Saving the Model and Vectorizer ---
     # We save both the model and the vectorizer so we can use them later
     # on new, unseen data from our scraper.
-    print("Saving model and vectorizer...")
-    joblib.dump(model, 'sentiment_model.pkl')
-    joblib.dump(vectorizer, 'tfidf_vectorizer.pkl')
+    save_model(model, vectorizer)
     print("Training complete and model saved!")
 
+
+def save_model(model, vectorizer, directory='.'):
+    """Writes the pickles and the NumPy-only copy (see numpy_scorer.py) into directory."""
+    import joblib
+    from numpy_scorer import export_model
+    print("Saving model and vectorizer...")
+    joblib.dump(model, os.path.join(directory, 'sentiment_model.pkl'))
+    joblib.dump(vectorizer, os.path.join(directory, 'tfidf_vectorizer.pkl'))
+    export_model(model, vectorizer, os.path.join(directory, 'sentiment_model.bin'))
+
 # This part allows you to run the training directly from the terminal
 if __name__ == '__main__':
     # You might need to download nltk data
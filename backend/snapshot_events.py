@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+
+from metrics import callback, counter
+
+# --- SNAPSHOT PUSH CHANNEL ---
+# Dashboards used to re-fetch /api/analyze on a timer even though the data only changes
+# when an analysis run saves a snapshot. One watcher per app process now polls the
+# snapshot generation (a one-row lookup, bumped by every write including replays) and,
+# when it moves, builds the Server-Sent Events payloads once: the full snapshot and a
+# delta against the previous one. Event ids are generations, not timestamps, so a
+# snapshot rewritten in place still reaches clients that had the old version. Every
+# connected client is handed the same pre-encoded bytes, so fan-out costs one query and
+# one json.dumps per snapshot, not per client.
+#
+# Subscribers wait on a shared Condition rather than a queue each. Under gunicorn's
+# gevent worker (see the Dockerfile) that wait is a greenlet, so thousands of idle
+# connections don't hold an OS thread apiece.
+
+POLL_INTERVAL = float(os.environ.get('STREAM_POLL_SECONDS', 2))
+# Idle connections get a comment line this often, so proxies don't time them out
+HEARTBEAT_INTERVAL = float(os.environ.get('STREAM_HEARTBEAT_SECONDS', 15))
+MAX_SUBSCRIBERS = int(os.environ.get('STREAM_MAX_CLIENTS', 1000))
+# Browsers wait this long (ms) before reconnecting a dropped EventSource
+RETRY_MS = 5000
+
+EVENTS_SENT = counter('stream_events_total', 'Events sent to /api/stream clients, by type.', ('type',))
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+def format_event(event, data, event_id=None):
+    """One SSE message: optional id, event name and a single-line JSON data field."""
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+
+class SnapshotVersion:
+    """The latest snapshot and its two encodings, built once and shared by every client."""
+
+    def __init__(self, generation, timestamp, tickers, previous=None):
+        self.generation = generation
+        self.timestamp = timestamp
+        self.tickers = tickers
+        self.previous_generation = previous.generation if previous is not None else None
+        self.full = format_event('snapshot', {'timestamp': timestamp, 'tickers': tickers}, generation)
+        self.delta = None
+        if previous is not None:
+            changed = {ticker: info for ticker, info in tickers.items() if previous.tickers.get(ticker) != info}
+            removed = [ticker for ticker in previous.tickers if ticker not in tickers]
+            self.delta = format_event('delta', {'timestamp': timestamp, 'previous': previous.timestamp,
+                                                'changed': changed, 'removed': removed}, generation)
+
+    def event_for(self, seen):
+        """The bytes a client holding generation `seen` needs to catch up, or None if it's current."""
+        if seen == self.generation:
+            return None
+        if self.delta is not None and seen == self.previous_generation:
+            EVENTS_SENT.inc(labels=('delta',))
+            return self.delta
+        EVENTS_SENT.inc(labels=('snapshot',))
+        return self.full
+
+
+class SnapshotBroadcaster:
+    """Watches for new snapshots and streams them to any number of subscribers.
+
+    latest_version() returns (snapshot generation, newest snapshot's timestamp), the
+    timestamp None when there are no snapshots, and load_snapshot(timestamp) its
+    {ticker: {...}} payload; both are called from the watcher thread only. The watcher
+    starts with the first subscriber.
+    """
+
+    def __init__(self, latest_version, load_snapshot, poll_interval=POLL_INTERVAL,
+                 heartbeat_interval=HEARTBEAT_INTERVAL, max_subscribers=MAX_SUBSCRIBERS):
+        self.latest_version = latest_version
+        self.load_snapshot = load_snapshot
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.max_subscribers = max_subscribers
+        self.current = None
+        self.checked_generation = None
+        self.subscribers = 0
+        self.check_lock = threading.Lock()
+        self.changed = threading.Condition()
+        self.wakeup = threading.Event()
+        self.thread = None
+        callback('stream_subscribers', 'Clients connected to /api/stream.', lambda: self.subscribers)
+
+    def _ensure_watcher(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._watch, name='snapshot-watcher', daemon=True)
+            self.thread.start()
+
+    def check(self):
+        """Publishes the latest snapshot if the generation moved and its data changed; returns whether it did."""
+        with self.check_lock:
+            generation, timestamp = self.latest_version()
+            if timestamp is None or generation == self.checked_generation:
+                return False
+            self.checked_generation = generation
+            tickers = self.load_snapshot(timestamp)
+            current = self.current
+            # e.g. a replay rewrote an older snapshot: nothing for clients to do
+            if current is not None and current.timestamp == timestamp and current.tickers == tickers:
+                return False
+            version = SnapshotVersion(generation, timestamp, tickers, current)
+            with self.changed:
+                self.current = version
+                self.changed.notify_all()
+            return True
+
+    def poke(self):
+        """Checks for a new snapshot now instead of at the next poll (e.g. after a job finishes)."""
+        self.wakeup.set()
+
+    def _watch(self):
+        while True:
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Snapshot watcher failed to check for a new snapshot: {e}")
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+
+    def subscribe(self, last_event_id=None):
+        """Returns a generator of SSE bytes for one client. Raises TooManySubscribers when full.
+
+        A client reconnecting with Last-Event-ID gets only what it missed: nothing, a
+        delta from the snapshot it had, or the full latest snapshot.
+        """
+        if self.subscribers >= self.max_subscribers:
+            raise TooManySubscribers(f"{self.subscribers} clients already connected")
+        self._ensure_watcher()
+        try:
+            seen = int(last_event_id) if last_event_id else None
+        except ValueError:
+            seen = None
+        return self._stream(seen)
+
+    def _stream(self, seen):
+        # Counted from the first chunk on, since a generator that never starts never runs its finally
+        with self.changed:
+            self.subscribers += 1
+        try:
+            yield f"retry: {RETRY_MS}\n\n".encode('utf-8')
+            while True:
+                with self.changed:
+                    version = self.current
+                    if version is None or version.generation == seen:
+                        self.changed.wait(self.heartbeat_interval)
+                        version = self.current
+                event = version.event_for(seen) if version is not None else None
+                if event is None:
+                    yield b": keepalive\n\n"
+                    continue
+                seen = version.generation
+                yield event
+        finally:
+            with self.changed:
+                self.subscribers -= 1
+
@@ -0,0 +1,138 @@
+import json
+from itertools import islice
+
+from db import connect
+from metrics import ITEMS, STAGE_SECONDS
+from migrations import migrate
+from rollups import remove_from_rollups, update_rollups
+
+# --- SNAPSHOT WRITER ---
+# Persists one analysis snapshot: a ticker_mentions row per ticker, its comments, the
+# snapshots row the API reads "latest" from, and the rollup buckets, in one transaction.
+# Rows are scored and their comment JSON encoded before the transaction starts, and are
+# then written with a handful of executemany() calls, so the write lock is held for the
+# inserts alone. Writing the same (ticker, timestamp) again updates that row in place;
+# with replace=True the snapshot's old rows are dropped first, as a replay needs.
+# Every write bumps snapshot_generation, which the API's caches are keyed on.
+
+# Tickers encoded and written per batch in streaming mode
+STREAM_CHUNK_SIZE = 200
+
+UPSERT_MENTIONS = """
+    INSERT INTO ticker_mentions (ticker, mention_count, sentiment_score, sentiment_label, timestamp)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (ticker, timestamp) DO UPDATE SET
+        mention_count = excluded.mention_count,
+        sentiment_score = excluded.sentiment_score,
+        sentiment_label = excluded.sentiment_label
+"""
+# Looks the mention id up through the (ticker, timestamp) index, since executemany can't
+# hand back lastrowid for each row
+UPSERT_COMMENTS = """
+    INSERT INTO ticker_mention_comments (mention_id, comments)
+    SELECT id, ? FROM ticker_mentions WHERE ticker = ? AND timestamp = ?
+    ON CONFLICT (mention_id) DO UPDATE SET comments = excluded.comments
+"""
+BUMP_GENERATION = "UPDATE snapshot_generation SET generation = generation + 1"
+
+
+def encode_rows(rows, timestamp):
+    """Turns snapshot rows into (ticker, mention_count, score, label, timestamp, comments JSON) tuples."""
+    return [(ticker, mention_count, sentiment_score, sentiment_label, timestamp, json.dumps(list(comments)))
+            for ticker, mention_count, sentiment_score, sentiment_label, comments in rows]
+
+
+def _chunks(rows, timestamp, size):
+    rows = iter(rows)
+    while True:
+        chunk = encode_rows(islice(rows, size), timestamp)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _write_chunk(c, chunk, timestamp, previous):
+    # Rows being overwritten come out of the rollups before their new values go in
+    replaced = [previous[row[0]] for row in chunk if row[0] in previous]
+    if replaced:
+        remove_from_rollups(c, replaced, timestamp)
+    c.executemany(UPSERT_MENTIONS, [row[:5] for row in chunk])
+    c.executemany(UPSERT_COMMENTS, [(payload, ticker, timestamp) for ticker, *_, payload in chunk])
+    update_rollups(c, [(ticker, score, mentions) for ticker, mentions, score, *_ in chunk], timestamp)
+
+
+def _delete_snapshot(c, timestamp, previous):
+    """Removes every row of the snapshot at timestamp, taking its rows out of the rollups.
+
+    Returns how many ticker_mentions and snapshots rows went.
+    """
+    if previous:
+        remove_from_rollups(c, list(previous.values()), timestamp)
+    c.execute("""
+        DELETE FROM ticker_mention_comments
+        WHERE mention_id IN (SELECT id FROM ticker_mentions WHERE timestamp = ?)
+    """, (timestamp,))
+    mentions = c.execute("DELETE FROM ticker_mentions WHERE timestamp = ?", (timestamp,)).rowcount
+    return mentions + c.execute("DELETE FROM snapshots WHERE timestamp = ?", (timestamp,)).rowcount
+
+
+def write_snapshot(db_path, rows, timestamp, stream=False, chunk_size=STREAM_CHUNK_SIZE,
+                   exact_duplicates=0, near_duplicates=0, replace=False):
+    """Saves rows of (ticker, mention_count, sentiment_score, sentiment_label, comments).
+
+    exact_duplicates and near_duplicates are the comments the run dropped before
+    scoring (see dedupe.py), recorded on the snapshots row.
+
+    Returns the number of tickers written. Nothing is recorded for an empty snapshot,
+    so the API keeps showing the previous one.
+
+    With replace=True any snapshot already saved at timestamp is deleted first (rows,
+    comments and rollup contributions), so tickers missing from rows don't linger; an
+    empty replacement just deletes it.
+
+    By default every row's comment JSON is encoded up front, which keeps the
+    transaction as short as possible. With stream=True, rows may be any iterable
+    (e.g. a generator reading comments from disk) and are encoded and written
+    chunk_size at a time inside the transaction, so only one chunk's payloads are in
+    memory at once; the lock is held longer in exchange.
+    """
+    migrate(db_path)
+    if stream:
+        chunks = _chunks(rows, timestamp, chunk_size)
+    else:
+        encoded = encode_rows(rows, timestamp)
+        if not encoded and not replace:
+            return 0
+        chunks = [encoded] if encoded else []
+    written = 0
+    # WAL + busy_timeout, so API readers keep working while this run writes
+    conn = connect(db_path)
+    try:
+        with STAGE_SECONDS.time(('db_write',)), conn:
+            # Take the write lock before reading the rows this snapshot may overwrite
+            conn.execute("BEGIN IMMEDIATE")
+            c = conn.cursor()
+            previous = {ticker: (ticker, score, mentions) for ticker, score, mentions in c.execute(
+                "SELECT ticker, sentiment_score, mention_count FROM ticker_mentions WHERE timestamp = ?",
+                (timestamp,))}
+            deleted = 0
+            if replace:
+                deleted = _delete_snapshot(c, timestamp, previous)
+                previous = {}
+            for chunk in chunks:
+                _write_chunk(c, chunk, timestamp, previous)
+                written += len(chunk)
+            if written:
+                # One row per run; the API looks up the latest snapshot here
+                ticker_count = c.execute("SELECT COUNT(*) FROM ticker_mentions WHERE timestamp = ?",
+                                         (timestamp,)).fetchone()[0]
+                c.execute("""
+                    INSERT OR REPLACE INTO snapshots (timestamp, ticker_count, exact_duplicates, near_duplicates)
+                    VALUES (?, ?, ?, ?)
+                """, (timestamp, ticker_count, exact_duplicates, near_duplicates))
+            if written or deleted:
+                c.execute(BUMP_GENERATION)
+    finally:
+        conn.close()
+    ITEMS.inc(written, ('tickers_saved',))
+    return written
@@ -0,0 +1,92 @@
+import csv
+import os
+
+# --- SHARED TICKER CONFIGURATION ---
+# The ticker universe, blacklist and subreddits used by run_analysis.py, worker.py, the
+# archive replay and the bench scripts. They live here, next to the extractor, so the
+# batch and streaming paths always count the same mentions.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TICKERS_PATH = os.path.join(BASE_DIR, 'sp500_companies.csv')
+
+SUBREDDIT_NAMES = ["stocks", "stockmarket", "investing", "wallstreetbets",
+                   "cryptocurrency", "ethereum"]
+EXTRA_TICKERS = {"GME", "AMC", "BTC", "ETH", "SOL", "DOGE", "CRCL", "XRP", "SUI"}
+# Common words that are also tickers ("A", "IT", "ALL", ...)
+BLACKLIST = {"A", "I", "IT", "AND", "THE", "TO", "OF", "IN", "ON", "FOR", "IS", "AT", "BY", "AN", "OR", "AS", "BE", "ARE", "WITH", "FROM", "THIS", "THAT", "BUT", "NOT", "SO", "DO", "IF", "NO", "YES", "ALL", "ANY", "CAN", "WAS", "HAS", "HAVE", "WILL", "JUST", "ABOUT", "OUT", "UP", "DOWN", "OVER", "UNDER", "MORE", "LESS", "THAN", "THEN", "NOW", "ONE", "TWO", "THREE", "FOUR", "FIVE", "SIX", "SEVEN", "EIGHT", "NINE", "TEN", "WELL", "DAY"}
+
+
+def load_tickers(path=TICKERS_PATH):
+    """The Symbol column of path (the S&P 500 list) plus EXTRA_TICKERS."""
+    try:
+        with open(path, newline='') as f:
+            tickers = {row['Symbol'] for row in csv.DictReader(f)}
+    except Exception as e:
+        print(f"Error loading tickers: {e}")
+        tickers = set()
+    return tickers | EXTRA_TICKERS
+
+
+# Characters the original loop stripped off each word with word.strip('.,?!-$')
+STRIP_CHARS = '.,?!-$'
+
+
+class TickerExtractor:
+    """Finds ticker mentions in comments, shared by scraper.py, run_analysis.py and worker.py.
+
+    A mention is a whitespace-separated word that equals a ticker once
+    STRIP_CHARS are removed from both ends, which is exactly what the old
+    upper().split() + strip() loop matched. The blacklist is subtracted from
+    the ticker universe once up front, so each word costs a single set lookup.
+
+    With cashtags=True, a word written as $TICKER also counts when the ticker
+    is blacklisted (e.g. "$A" or "$IT"), since the dollar sign makes the
+    intent clear.
+    """
+
+    def __init__(self, tickers, blacklist=(), cashtags=False):
+        tickers = set(tickers)
+        blacklist = set(blacklist)
+        self.tickers = frozenset(tickers - blacklist)
+        self.cashtag_only = frozenset(tickers & blacklist) if cashtags else frozenset()
+
+    def extract(self, text, dedupe=False):
+        """Returns the tickers mentioned in text, in order of appearance.
+
+        Repeated mentions are kept unless dedupe is True, in which case
+        each ticker appears once per comment.
+        """
+        tickers = self.tickers
+        if self.cashtag_only:
+            hits = self._extract_with_cashtags(text)
+        else:
+            hits = [t for w in text.upper().split() if (t := w.strip(STRIP_CHARS)) in tickers]
+        if dedupe and len(hits) > 1:
+            return list(dict.fromkeys(hits))
+        return hits
+
+    def _extract_with_cashtags(self, text):
+        tickers = self.tickers
+        cashtag_only = self.cashtag_only
+        hits = []
+        for word in text.upper().split():
+            t = word.strip(STRIP_CHARS)
+            if t in tickers or (t in cashtag_only and '$' in word[:word.find(t)]):
+                hits.append(t)
+        return hits
+
+    def extract_batch(self, texts, dedupe=False):
+        """Runs extract over a list or iterator of comments."""
+        if self.cashtag_only or dedupe:
+            extract = self.extract
+            return [extract(text, dedupe) for text in texts]
+        # Common case inlined to skip a method call per comment
+        tickers = self.tickers
+        return [[t for w in text.upper().split() if (t := w.strip(STRIP_CHARS)) in tickers]
+                for text in texts]
+
+    def iter_mentions(self, texts, dedupe=False):
+        """Yields (comment, ticker) pairs for every mention in texts."""
+        extract = self.extract
+        for text in texts:
+            for ticker in extract(text, dedupe):
+                yield text, ticker
@@ -0,0 +1,225 @@
+"""Trains the sentiment model with parallel, cached cleaning and a cross-validated sweep.
+
+Usage:
+    python train.py                          # grid search and print the results table
+    python train.py --search random --n-iter 30
+    python train.py --no-search              # only the default TF-IDF(5000) + LogisticRegression
+    python train.py --save                   # also replace the model files with the best candidate
+
+Cleaned texts are cached by content hash in .train_cache/, so retraining after adding
+rows to data.csv only cleans the new rows, and fitted vectorizers are cached too, so
+candidates that differ only in C reuse the same TF-IDF fit.
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from sentiment_analysis import CLEANER_VERSION, clean_texts, get_cleaner, save_model
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(BASE_DIR, 'data.csv')
+CACHE_DIR = os.path.join(BASE_DIR, '.train_cache')
+# Texts per task sent to a cleaning process
+CLEAN_CHUNK_SIZE = 2000
+
+# What sentiment_analysis.train_model has always fit; reported as the baseline
+DEFAULT_PARAMS = {'tfidf__max_features': 5000, 'tfidf__ngram_range': (1, 1), 'tfidf__sublinear_tf': False,
+                  'tfidf__min_df': 1, 'clf__C': 1.0}
+PARAM_GRID = {
+    'tfidf__max_features': [2000, 5000, 10000, None],
+    'tfidf__ngram_range': [(1, 1), (1, 2)],
+    'tfidf__sublinear_tf': [False, True],
+    'clf__C': [0.3, 1.0, 3.0, 10.0],
+}
+
+
+# --- CLEANED CORPUS CACHE ---
+
+class CleanCache:
+    """SQLite map from hash(CLEANER_VERSION, raw text) to cleaned text."""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS cleaned (key TEXT PRIMARY KEY, text TEXT NOT NULL) WITHOUT ROWID")
+
+    @staticmethod
+    def key(text):
+        return hashlib.blake2b(f"{CLEANER_VERSION}\0{text}".encode('utf-8'), digest_size=16).hexdigest()
+
+    def get_many(self, keys):
+        found = {}
+        keys = list(keys)
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            found.update(self.conn.execute(
+                f"SELECT key, text FROM cleaned WHERE key IN ({','.join('?' * len(chunk))})", chunk))
+        return found
+
+    def put_many(self, items):
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO cleaned (key, text) VALUES (?, ?)", items)
+
+    def close(self):
+        self.conn.close()
+
+
+def clean_corpus(texts, jobs, cache=None):
+    """clean_texts(texts), reusing cached results and cleaning the rest across processes."""
+    keys = [CleanCache.key(text) for text in texts]
+    cleaned = cache.get_many(set(keys)) if cache is not None else {}
+    cached = len(cleaned)
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in cleaned:
+            missing.setdefault(key, text)
+    if missing:
+        pending = list(missing.values())
+        if jobs > 1 and len(pending) > CLEAN_CHUNK_SIZE:
+            chunks = [pending[i:i + CLEAN_CHUNK_SIZE] for i in range(0, len(pending), CLEAN_CHUNK_SIZE)]
+            # Load nltk before the pool starts, so forked workers don't each import it again
+            get_cleaner()
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                results = [text for chunk in pool.map(clean_texts, chunks) for text in chunk]
+        else:
+            results = clean_texts(pending)
+        new = dict(zip(missing, results))
+        if cache is not None:
+            cache.put_many(new.items())
+        cleaned.update(new)
+    print(f"Cleaned {len(missing)} distinct texts, {cached} found in the cache.")
+    return [cleaned[key] for key in keys]
+
+
+# --- DATA AND SEARCH ---
+
+def load_labeled(path):
+    """(texts, labels) for the positive/negative rows, read the way train_model reads them."""
+    import pandas as pd
+    df = pd.read_csv(path, encoding='latin-1', names=['text', 'sentiment'])
+    df = df[df.sentiment.isin(['positive', 'negative'])]
+    return df['text'].tolist(), df['sentiment'].map({'positive': 1, 'negative': 0}).to_numpy()
+
+
+def make_pipeline(memory=None):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import Pipeline
+    return Pipeline([('tfidf', TfidfVectorizer()), ('clf', LogisticRegression(max_iter=1000))], memory=memory)
+
+
+def random_space():
+    from scipy.stats import loguniform
+    return {
+        'tfidf__max_features': [1000, 2000, 5000, 10000, 20000, None],
+        'tfidf__ngram_range': [(1, 1), (1, 2), (1, 3)],
+        'tfidf__sublinear_tf': [False, True],
+        'tfidf__min_df': [1, 2, 3],
+        'clf__C': loguniform(1e-2, 1e2),
+    }
+
+
+def describe(params):
+    short = {'tfidf__max_features': 'features', 'tfidf__ngram_range': 'ngrams', 'tfidf__sublinear_tf': 'sublinear',
+             'tfidf__min_df': 'min_df', 'clf__C': 'C'}
+    parts = []
+    for name, value in sorted(params.items()):
+        if name == 'clf__C':
+            value = f"{value:.3g}"
+        elif name == 'tfidf__ngram_range':
+            value = f"{value[0]}-{value[1]}"
+        parts.append(f"{short.get(name, name)}={value}")
+    return ' '.join(parts)
+
+
+def results_table(search, fold_size):
+    """Rows of (accuracy, std, µs per comment, pareto, params), best accuracy first.
+
+    Inference cost is the CV scoring time (transform + predict) per held-out comment.
+    A row is on the Pareto front when no other candidate is both more accurate and cheaper.
+    """
+    cv = search.cv_results_
+    rows = [(cv['mean_test_score'][i], cv['std_test_score'][i], cv['mean_score_time'][i] / fold_size * 1e6,
+             cv['params'][i]) for i in range(len(cv['params']))]
+    rows.sort(key=lambda row: (-row[0], row[2]))
+    table = []
+    cheapest = float('inf')
+    # Sorted by accuracy, a row is Pareto-optimal iff it's cheaper than everything above it
+    for accuracy, std, cost, params in rows:
+        pareto = cost < cheapest
+        cheapest = min(cheapest, cost)
+        table.append((accuracy, std, cost, pareto, params))
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='processes for cleaning and the sweep')
+    parser.add_argument('--search', choices=['grid', 'random'], default='grid')
+    parser.add_argument('--n-iter', type=int, default=30, help='candidates to try with --search random')
+    parser.add_argument('--no-search', action='store_true', help='only fit the default parameters')
+    parser.add_argument('--cv', type=int, default=5, help='cross-validation folds')
+    parser.add_argument('--top', type=int, default=15, help='rows of the results table to print')
+    parser.add_argument('--results', metavar='CSV', help='write every candidate to this CSV')
+    parser.add_argument('--no-cache', action='store_true', help="don't read or write .train_cache/")
+    parser.add_argument('--save', action='store_true', help='replace the model files with the best candidate')
+    args = parser.parse_args()
+
+    from joblib import Memory
+    from sklearn.model_selection import GridSearchCV, RandomizedSearchCV, StratifiedKFold, train_test_split
+
+    started = time.perf_counter()
+    texts, labels = load_labeled(args.data)
+    cache = None if args.no_cache else CleanCache(os.path.join(CACHE_DIR, 'cleaned.db'))
+    try:
+        cleaned = clean_corpus(texts, args.jobs, cache)
+    finally:
+        if cache is not None:
+            cache.close()
+    print(f"Loaded and cleaned {len(cleaned)} labeled texts in {time.perf_counter() - started:.1f}s.")
+
+    # Same held-out split as train_model, so test accuracy is comparable with the current model
+    X_train, X_test, y_train, y_test = train_test_split(cleaned, labels, test_size=0.2, random_state=42)
+    memory = None if args.no_cache else Memory(os.path.join(CACHE_DIR, 'pipeline'), verbose=0)
+    folds = StratifiedKFold(n_splits=args.cv, shuffle=True, random_state=42)
+    grid = {name: [value] for name, value in DEFAULT_PARAMS.items()} if args.no_search else PARAM_GRID
+    if args.search == 'random' and not args.no_search:
+        search = RandomizedSearchCV(make_pipeline(memory), random_space(), n_iter=args.n_iter, cv=folds,
+                                    scoring='accuracy', n_jobs=args.jobs, random_state=42)
+    else:
+        search = GridSearchCV(make_pipeline(memory), grid, cv=folds, scoring='accuracy', n_jobs=args.jobs)
+    started = time.perf_counter()
+    search.fit(X_train, y_train)
+    candidates = len(search.cv_results_['params'])
+    print(f"Cross-validated {candidates} candidates x {args.cv} folds in {time.perf_counter() - started:.1f}s.\n")
+
+    table = results_table(search, len(X_train) / args.cv)
+    print(f"{'cv accuracy':>16} {'us/comment':>10}  params (* = Pareto front: nothing is both more accurate and cheaper)")
+    for accuracy, std, cost, pareto, params in table[:args.top]:
+        print(f"{accuracy:.4f} +/- {std:.4f} {cost:>10.2f} {'*' if pareto else ' '} {describe(params)}")
+    if args.results:
+        import pandas as pd
+        pd.DataFrame([{'cv_accuracy': accuracy, 'cv_std': std, 'us_per_comment': cost, 'pareto': pareto,
+                       **{name: str(value) for name, value in params.items()}}
+                      for accuracy, std, cost, pareto, params in table]).to_csv(args.results, index=False)
+        print(f"\nWrote {len(table)} rows to {args.results}.")
+
+    best = search.best_estimator_
+    test_accuracy = best.score(X_test, y_test)
+    baseline = make_pipeline().set_params(**DEFAULT_PARAMS).fit(X_train, y_train)
+    print(f"\nBest: {describe(search.best_params_)}")
+    print(f"Held-out accuracy: best {test_accuracy:.4f}, default parameters {baseline.score(X_test, y_test):.4f}")
+
+    if args.save:
+        save_model(best.named_steps['clf'], best.named_steps['tfidf'], BASE_DIR)
+    else:
+        print("Run with --save to replace the model files with the best candidate.")
+
+
+if __name__ == '__main__':
+    main()
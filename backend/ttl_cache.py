@@ -0,0 +1,63 @@
+import threading
+import time
+from collections import OrderedDict
+
+# --- BOUNDED TTL CACHE ---
+# For per-user data the snapshot cache can't key on: session users and their
+# favorites/watchlist. Entries expire after `ttl` seconds, so a change made through
+# another gunicorn worker shows up here within that time; changes made through this
+# process invalidate their entries directly.
+
+
+class TTLCache:
+    """Thread-safe LRU of at most maxsize entries, each living at most ttl seconds."""
+
+    def __init__(self, maxsize=1024, ttl=60.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Bumped by every invalidation, so a load that raced one isn't stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key, load):
+        """Returns the cached value for key, calling load() on a miss or after expiry.
+
+        None is cached like any other value (e.g. a user id with no row).
+        """
+        now = self.clock()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self.generation
+        # Loaded outside the lock, so one slow query doesn't block every other lookup
+        value = load()
+        self.put(key, value, generation)
+        return value
+
+    def put(self, key, value, generation=None):
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.entries[key] = (self.clock() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, *keys):
+        with self.lock:
+            self.generation += 1
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
@@ -0,0 +1,286 @@
+import argparse
+import json
+import os
+import time
+from collections import deque
+from itertools import islice
+
+from dotenv import load_dotenv
+
+from aggregation import COMMENT_SAMPLE_SIZE
+from dedupe import DEDUPE_ENABLED, CommentDeduper
+from fake_reddit import FakeComment
+from scoring import load_scorer, positive_probabilities, normalize_score
+from snapshot_writer import write_snapshot
+from ticker_extraction import BLACKLIST, SUBREDDIT_NAMES, TickerExtractor, load_tickers
+
+load_dotenv()
+
+# --- STREAMING ANALYSIS WORKER ---
+# A long-running alternative to launching run_analysis.py per batch: the model, tickers
+# and Reddit client are loaded once, new comments are scored as they arrive, and every
+# --window-minutes each ticker's sentiment since the previous snapshot is flushed as a
+# new snapshot. Snapshots land in the same tables, so the API is unchanged.
+#
+# Windows never overlap: the rollups and /api/trending?window= add mention_count across
+# snapshots (see app.py), so a comment must be counted in exactly one of them. Flushing
+# a trailing 60-minute window every minute counted each comment ~60 times.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.path.join(BASE_DIR, 'sentiment_history.db')
+MODEL_PATH = os.path.join(BASE_DIR, 'sentiment_model.pkl')
+VECTORIZER_PATH = os.path.join(BASE_DIR, 'tfidf_vectorizer.pkl')
+NUMPY_MODEL_PATH = os.path.join(BASE_DIR, 'sentiment_model.bin')
+
+# Also the snapshot interval
+DEFAULT_WINDOW_MINUTES = float(os.environ.get('WORKER_WINDOW_MINUTES', 60))
+# Comments are scored in micro-batches so each predict_proba call covers many of them
+DEFAULT_BATCH_SIZE = 256
+
+# --- COMMENT SOURCES ---
+# A source is an iterable of comments. A live source may also yield None when there is
+# nothing new, so the worker can still flush on time during quiet periods.
+
+class PrawCommentStream:
+    """New comments from several subreddits via PRAW's comment stream, reconnecting on errors."""
+
+    def __init__(self, reddit_factory, subreddit_names, max_backoff=60):
+        self.reddit_factory = reddit_factory
+        self.subreddit_names = subreddit_names
+        self.max_backoff = max_backoff
+
+    def __iter__(self):
+        backoff = 1
+        while True:
+            try:
+                reddit = self.reddit_factory()
+                subreddit = reddit.subreddit('+'.join(self.subreddit_names))
+                # pause_after=0 yields None whenever a poll finds nothing new
+                for comment in subreddit.stream.comments(pause_after=0, skip_existing=True):
+                    backoff = 1
+                    yield comment
+            except Exception as e:
+                print(f"Comment stream error: {e}. Reconnecting in {backoff}s.")
+                yield None
+                time.sleep(backoff)
+                backoff = min(self.max_backoff, backoff * 2)
+
+
+class ReplaySource:
+    """Replays the comments of a fake_reddit fixture in created_utc order.
+
+    With speed set, gaps between comments are slept through speed times faster than
+    real time; by default the replay runs as fast as it can be scored.
+    """
+
+    def __init__(self, fixture, speed=None):
+        self.speed = speed
+        self.comments = sorted(
+            (FakeComment(c['id'], c['body'], c.get('created_utc', 0.0), post['id'], name)
+             for name, posts in fixture['subreddits'].items()
+             for post in posts
+             for c in post.get('comments', ())),
+            key=lambda comment: comment.created_utc)
+
+    @classmethod
+    def from_file(cls, path, speed=None):
+        with open(path) as f:
+            return cls(json.load(f), speed)
+
+    def __iter__(self):
+        previous = None
+        for comment in self.comments:
+            if self.speed and previous is not None:
+                time.sleep(max(0.0, comment.created_utc - previous) / self.speed)
+            previous = comment.created_utc
+            yield comment
+
+
+# --- SNAPSHOT WINDOW ---
+
+class SnapshotWindow:
+    """Per-ticker mentions since the previous snapshot, with a running probability sum.
+
+    Each mention is a (created_utc, probability, comment) entry in a per-ticker deque, so
+    adding is O(1) and eviction only touches expired entries. A mention is evicted once
+    it's older than window_seconds or was covered by the previous snapshot, so
+    consecutive snapshots never share a comment. Comments are assumed to arrive roughly
+    in time order, which both sources guarantee.
+    """
+
+    def __init__(self, window_seconds, sample_size=COMMENT_SAMPLE_SIZE):
+        self.window_seconds = window_seconds
+        self.sample_size = sample_size
+        self.mentions = {}
+        self.sums = {}
+        # created_utc up to which comments were in a snapshot already
+        self.flushed_until = None
+
+    def add(self, ticker, created_utc, probability, comment):
+        entries = self.mentions.get(ticker)
+        if entries is None:
+            entries = self.mentions[ticker] = deque()
+            self.sums[ticker] = 0.0
+        entries.append((created_utc, probability, comment))
+        self.sums[ticker] += probability
+
+    def evict(self, now):
+        cutoff = now - self.window_seconds
+        flushed = self.flushed_until if self.flushed_until is not None else float('-inf')
+        for ticker in list(self.mentions):
+            entries = self.mentions[ticker]
+            while entries and (entries[0][0] < cutoff or entries[0][0] <= flushed):
+                self.sums[ticker] -= entries.popleft()[1]
+            if not entries:
+                # Dropped rather than reset so the running sum can't accumulate float error
+                del self.mentions[ticker]
+                del self.sums[ticker]
+
+    def rows(self, now):
+        """Snapshot rows of (ticker, mention_count, sentiment_score, sentiment_label, comments).
+
+        Covers the mentions after the previous rows() call, up to now, which the next
+        call then leaves out. Only each ticker's newest sample_size comments are saved
+        (COMMENT_SAMPLE_SIZE, as in run_analysis.py).
+        """
+        self.evict(now)
+        rows = []
+        for ticker, entries in self.mentions.items():
+            sentiment_score, sentiment_label = normalize_score(self.sums[ticker] / len(entries))
+            newest = islice(entries, max(len(entries) - self.sample_size, 0), None)
+            rows.append((ticker, len(entries), sentiment_score, sentiment_label,
+                         [comment for _, _, comment in newest]))
+        self.flushed_until = now
+        return rows
+
+
+# --- WORKER ---
+
+class StreamingWorker:
+    """Scores a comment source in micro-batches and flushes a snapshot every window_seconds.
+
+    Time is taken from the comments themselves (created_utc), so a replay produces the
+    same snapshots as the live run it was recorded from. Idle ticks from a live source
+    advance the clock to wall time so the window still drains when Reddit goes quiet.
+    """
+
+    def __init__(self, source, extractor, scorer, db_path,
+                 window_seconds=DEFAULT_WINDOW_MINUTES * 60, batch_size=DEFAULT_BATCH_SIZE,
+                 clock=time.time, deduper=None):
+        self.source = source
+        self.extractor = extractor
+        self.scorer = scorer
+        self.db_path = db_path
+        self.window = SnapshotWindow(window_seconds)
+        # Flushing once per window keeps snapshots from overlapping
+        self.flush_interval = window_seconds
+        self.batch_size = batch_size
+        self.clock = clock
+        self.deduper = deduper
+        self.now = None
+        self.next_flush = None
+        self.pending = []
+        self.comments_seen = 0
+        self.flushes = 0
+
+    def score_pending(self):
+        """Drops duplicates from the pending (created_utc, comment, tickers) mentions and adds the rest to the window."""
+        pending = self.pending
+        if pending and self.deduper is not None:
+            verdicts = self.deduper.check_batch([text for _, text, _ in pending], [tickers for *_, tickers in pending])
+            pending = [mention for mention, verdict in zip(pending, verdicts) if verdict is None]
+        self.pending = []
+        if not pending:
+            return
+        corpus_index = {}
+        indices = [corpus_index.setdefault(text, len(corpus_index)) for _, text, _ in pending]
+        probabilities = positive_probabilities(list(corpus_index), self.scorer)
+        add = self.window.add
+        for (created_utc, text, tickers), index in zip(pending, indices):
+            probability = float(probabilities[index])
+            for ticker in tickers:
+                add(ticker, created_utc, probability, text)
+
+    def flush(self):
+        self.score_pending()
+        timestamp = int(self.now)
+        rows = self.window.rows(self.now)
+        # Duplicates dropped since the previous snapshot
+        exact, near = self.deduper.take_counts() if self.deduper is not None else (0, 0)
+        written = write_snapshot(self.db_path, rows, timestamp, exact_duplicates=exact, near_duplicates=near)
+        self.flushes += 1
+        print(f"Flushed {written} tickers at {timestamp} ({self.comments_seen} comments so far).")
+
+    def advance(self, now):
+        if self.now is None or now > self.now:
+            self.now = now
+        if self.next_flush is None:
+            self.next_flush = self.now + self.flush_interval
+        elif self.now >= self.next_flush:
+            self.flush()
+            # Skip missed intervals instead of flushing the same window repeatedly
+            while self.next_flush <= self.now:
+                self.next_flush += self.flush_interval
+
+    def run(self):
+        try:
+            for comment in self.source:
+                if comment is None:
+                    self.score_pending()
+                    if self.now is not None:
+                        self.advance(self.clock())
+                    continue
+                self.comments_seen += 1
+                text = comment.body
+                tickers = self.extractor.extract(text)
+                if tickers:
+                    self.pending.append((comment.created_utc, text, tickers))
+                    if len(self.pending) >= self.batch_size:
+                        self.score_pending()
+                self.advance(comment.created_utc)
+        except KeyboardInterrupt:
+            print("Stopping worker.")
+        # A finite source (replay) or Ctrl-C still saves what's in the window
+        if self.now is not None:
+            self.flush()
+
+
+def make_reddit():
+    import praw
+    return praw.Reddit(
+        client_id=os.environ.get('CLIENT_ID'),
+        client_secret=os.environ.get('CLIENT_SECRET'),
+        user_agent=os.environ.get('USER_AGENT'),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Continuously score new Reddit comments and save sentiment snapshots.")
+    parser.add_argument('--window-minutes', type=float, default=DEFAULT_WINDOW_MINUTES,
+                        help="minutes between snapshots; each covers the comments since the previous one")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help="comments scored per model call")
+    parser.add_argument('--replay', metavar='FIXTURE',
+                        help="replay a fake_reddit fixture instead of streaming from Reddit")
+    parser.add_argument('--replay-speed', type=float, default=None,
+                        help="with --replay, play back this many times faster than real time")
+    parser.add_argument('--no-dedupe', action='store_true', default=not DEDUPE_ENABLED,
+                        help="score and count duplicate / bot-spam comments too (or set DEDUPE=0)")
+    parser.add_argument('--db', default=DB_PATH)
+    args = parser.parse_args()
+
+    scorer = load_scorer(MODEL_PATH, VECTORIZER_PATH, NUMPY_MODEL_PATH, reload=True)
+    extractor = TickerExtractor(load_tickers(), BLACKLIST)
+    if args.replay:
+        source = ReplaySource.from_file(args.replay, args.replay_speed)
+    else:
+        source = PrawCommentStream(make_reddit, SUBREDDIT_NAMES)
+    worker = StreamingWorker(source, extractor, scorer, args.db,
+                             window_seconds=args.window_minutes * 60,
+                             batch_size=args.batch_size,
+                             deduper=None if args.no_dedupe else CommentDeduper())
+    worker.run()
+
+
+if __name__ == '__main__':
+    main()